@@ -15,19 +15,91 @@ and embeds all necessary data, including the Jera logo and cost
 premises.  Run it with ``streamlit run jera_onboarding.py``.
 """
 
+import atexit
 import base64
+import copy
+import hashlib
+import json
+import logging
 import math
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+import warnings
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from io import BytesIO
-from typing import Dict, List, Tuple
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
 import requests
-import streamlit as st
+import xlsxwriter
 
 from premises import PREMISES
 
+try:  # SciPy is only needed for the Sobol variance-reduction mode
+    from scipy.special import ndtri
+    from scipy.stats import qmc
+except ImportError:  # pragma: no cover - optional dependency
+    ndtri = qmc = None
+
+# -----------------------------------------------------------------------------
+# Process-wide resources
+#
+# ``streamlit run`` executes this file again on every rerun, so module globals
+# (caches, pools, compiled tables) would be rebuilt for every interaction.
+# Anything meant to live for the whole process is obtained through
+# shared_resource(), which keeps it in ``st.cache_resource`` under a Streamlit
+# runtime and in a plain module dict otherwise (HTTP service, benchmarks).
+#
+# Importing this module has no side effects: Streamlit and Plotly are only
+# imported by the app itself (main() and its helpers), and the resources are
+# built on first use.
+# -----------------------------------------------------------------------------
+
+_RESOURCES: Dict[str, object] = {}
+_RESOURCES_LOCK = threading.Lock()
+
+
+def _process_resource(nome: str, _fabrica):
+    return _fabrica()
+
+
+def _release_resource(recurso) -> None:
+    """Close a resource evicted from ``st.cache_resource`` (pools, HTTP sessions)."""
+    fechar = getattr(recurso, "close", None)
+    if callable(fechar):
+        fechar()
+
+
+def shared_resource(nome: str, fabrica):
+    """Process-wide object called ``nome``, built by ``fabrica()`` on first use.
+
+    The factory is not part of the key: every caller asking for ``nome`` gets
+    the same object for the lifetime of the process, across Streamlit reruns.
+    Objects with a ``close()`` method are closed when Streamlit drops them
+    (e.g. ``st.cache_resource.clear()``).
+    """
+    st = sys.modules.get("streamlit")
+    if st is not None and st.runtime.exists():
+        # cache_resource keys on the function's code, not on this wrapper
+        try:
+            cached = st.cache_resource(show_spinner=False, on_release=_release_resource)(_process_resource)
+        except TypeError:  # Streamlit without on_release
+            cached = st.cache_resource(show_spinner=False)(_process_resource)
+        return cached(nome, fabrica)
+    with _RESOURCES_LOCK:
+        if nome not in _RESOURCES:
+            _RESOURCES[nome] = fabrica()
+        return _RESOURCES[nome]
+
 # -----------------------------------------------------------------------------
 # Extend the list of schools for education cost projections
 #
@@ -123,6 +195,44 @@ def format_usd_value(x: float) -> str:
     except Exception:
         return f"$ {x}"
 
+
+# Scalar formatter of each currency symbol accepted by format_currency_array.
+_FORMATADORES = {"R$": format_brl_value, "$": format_usd_value}
+
+
+def format_currency_array(values, simbolo: str = "R$") -> np.ndarray:
+    """:func:`format_brl_value` / :func:`format_usd_value` over an array or Series.
+
+    Only the few small tables that are still shown as text go through here,
+    so each value is simply handed to the scalar formatter.
+
+    Parameters
+    ----------
+    values : array-like
+        Numeric values of any shape.
+    simbolo : str
+        Currency symbol, ``"R$"`` or ``"$"``.
+
+    Returns
+    -------
+    numpy.ndarray
+        Formatted strings with the shape of ``values``.
+    """
+    x = np.asarray(values, dtype=float)
+    return np.array([_FORMATADORES[simbolo](v) for v in x.ravel()], dtype=str).reshape(x.shape)
+
+
+def currency_column_config(columns: Sequence[str]) -> Dict[str, object]:
+    """Streamlit column config showing currency ``columns`` as numbers.
+
+    The table is sent to the browser as numeric columns and formatted there
+    with two decimals in the viewer's locale (``1.234,56`` for pt-BR); the
+    currency is given by the row or column labels.
+    """
+    import streamlit as st
+
+    return {col: st.column_config.NumberColumn(format="localized", step=0.01) for col in columns}
+
 # -----------------------------------------------------------------------------
 # Embedded assets and constants
 # -----------------------------------------------------------------------------
@@ -382,30 +492,322 @@ PORTFOLIOS: Dict[str, Dict[str, Dict[str, object]]] = {
     },
 }
 
+# Capital market assumptions per asset class (annual, in the segment's currency)
+# used by the class-level Monte Carlo.  "tipo" selects the correlation between
+# classes in ASSET_CLASS_CORRELATIONS; classes of different segments have that
+# correlation multiplied by CROSS_SEGMENT_CORRELATION_FACTOR.
+ASSET_CLASSES: Dict[str, Dict[str, object]] = {
+    "Liquidez CDI": {"segmento": "dom", "tipo": "caixa", "expected_return": 0.150, "vol": 0.005},
+    "RF BR Crédito Pós-Fixado": {"segmento": "dom", "tipo": "credito", "expected_return": 0.165, "vol": 0.020},
+    "RF BR Pré-Fixado": {"segmento": "dom", "tipo": "renda_fixa", "expected_return": 0.160, "vol": 0.060},
+    "RF BR Inflação": {"segmento": "dom", "tipo": "renda_fixa", "expected_return": 0.165, "vol": 0.070},
+    "Retorno Absoluto BR": {"segmento": "dom", "tipo": "retorno_absoluto", "expected_return": 0.175, "vol": 0.060},
+    "Renda Variável BR": {"segmento": "dom", "tipo": "acoes", "expected_return": 0.200, "vol": 0.220},
+    "Private Equity BR": {"segmento": "dom", "tipo": "private_equity", "expected_return": 0.230, "vol": 0.250},
+    "Real Estate BR": {"segmento": "dom", "tipo": "imobiliario", "expected_return": 0.170, "vol": 0.150},
+    "Cash Equivalent": {"segmento": "intl", "tipo": "caixa", "expected_return": 0.045, "vol": 0.005},
+    "RF Intl Pré-Fixado": {"segmento": "intl", "tipo": "renda_fixa", "expected_return": 0.050, "vol": 0.060},
+    "RF Intl Inflação": {"segmento": "intl", "tipo": "renda_fixa", "expected_return": 0.050, "vol": 0.060},
+    "RF Intl Crédito Privado": {"segmento": "intl", "tipo": "credito", "expected_return": 0.060, "vol": 0.070},
+    "Retorno Absoluto Intl": {"segmento": "intl", "tipo": "retorno_absoluto", "expected_return": 0.065, "vol": 0.060},
+    "Renda Variável Intl": {"segmento": "intl", "tipo": "acoes", "expected_return": 0.085, "vol": 0.160},
+    "Private Equity Intl": {"segmento": "intl", "tipo": "private_equity", "expected_return": 0.110, "vol": 0.220},
+    "Real Estate Intl": {"segmento": "intl", "tipo": "imobiliario", "expected_return": 0.070, "vol": 0.150},
+    "Commodities": {"segmento": "intl", "tipo": "commodities", "expected_return": 0.050, "vol": 0.180},
+}
+
+# Correlation between asset-class types (pairs not listed are uncorrelated;
+# distinct classes of the same type use the entry of the type with itself).
+ASSET_CLASS_CORRELATIONS: Dict[Tuple[str, str], float] = {
+    ("caixa", "credito"): 0.10,
+    ("caixa", "renda_fixa"): 0.10,
+    ("credito", "renda_fixa"): 0.50,
+    ("credito", "retorno_absoluto"): 0.30,
+    ("credito", "acoes"): 0.30,
+    ("credito", "private_equity"): 0.20,
+    ("credito", "imobiliario"): 0.30,
+    ("credito", "commodities"): 0.10,
+    ("renda_fixa", "renda_fixa"): 0.70,
+    ("renda_fixa", "retorno_absoluto"): 0.20,
+    ("renda_fixa", "acoes"): 0.30,
+    ("renda_fixa", "private_equity"): 0.20,
+    ("renda_fixa", "imobiliario"): 0.40,
+    ("retorno_absoluto", "acoes"): 0.50,
+    ("retorno_absoluto", "private_equity"): 0.40,
+    ("retorno_absoluto", "imobiliario"): 0.30,
+    ("retorno_absoluto", "commodities"): 0.20,
+    ("acoes", "private_equity"): 0.70,
+    ("acoes", "imobiliario"): 0.60,
+    ("acoes", "commodities"): 0.30,
+    ("private_equity", "imobiliario"): 0.50,
+    ("private_equity", "commodities"): 0.20,
+    ("imobiliario", "commodities"): 0.20,
+}
+CROSS_SEGMENT_CORRELATION_FACTOR = 0.5
+
+
+# n8n webhook that estimates the annual salary for a (cargo, setor, empresa) triple.
+SALARY_WEBHOOK_URL = "http://localhost:5678/webhook-test/estimar-salário"
+# Salary cache file, next to this module so it does not depend on the working directory;
+# JERA_SALARY_CACHE overrides it.
+SALARY_CACHE_PATH = os.environ.get(
+    "JERA_SALARY_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".salary_cache.json")
+)
+SALARY_LOGGER = logging.getLogger("jera.salary")
+
+
+def _parse_salary(html: str) -> float:
+    """Extract the salary embedded in a ``srcdoc="..."`` attribute, or NaN."""
+    m = re.search(r'srcdoc="([\d\.]+)"', html)
+    if not m:
+        return float("nan")
+    return float(m.group(1))
+
+
+class SalaryEstimator:
+    """Client for the salary webhook with connection pooling, caching and background calls.
+
+    Requests go through a single pooled ``requests.Session``.  Successful
+    estimates are cached per (cargo, setor, empresa) for ``ttl_seconds``
+    and persisted as JSON in ``cache_path`` so they survive restarts
+    (``cache_path=None`` keeps the cache in memory only).  Failed calls
+    are remembered for ``failure_ttl_seconds`` so reruns do not hammer the
+    webhook while it is down.  :meth:`submit`
+    runs the call on a background thread and returns a ``Future``, so the
+    Streamlit script can start the estimate as soon as the fields are
+    filled and only wait for it when the user moves on.  Point ``url`` at
+    a local stub to exercise it without n8n.
+    """
+
+    def __init__(
+        self,
+        url: str = SALARY_WEBHOOK_URL,
+        timeout: float = 10.0,
+        ttl_seconds: float = 7 * 24 * 3600,
+        cache_path: str | None = SALARY_CACHE_PATH,
+        max_workers: int = 4,
+        failure_ttl_seconds: float = 60.0,
+    ) -> None:
+        self.url = url
+        self.timeout = timeout
+        self.ttl_seconds = ttl_seconds
+        self.failure_ttl_seconds = failure_ttl_seconds
+        self.cache_path = cache_path
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="salary")
+        self._lock = threading.Lock()
+        # Keyed like the cache, so equivalent triples share one call
+        self._pending: Dict[str, Future] = {}
+        # Monotonic time of the last failed call per key, kept in memory only
+        self._failures: Dict[str, float] = {}
+        self._cache: Dict[str, Dict[str, float]] = self._load_cache()
+
+    @staticmethod
+    def _cache_key(key: Tuple[str, str, str]) -> str:
+        return json.dumps([k.strip().lower() for k in key], ensure_ascii=False)
+
+    def _load_cache(self) -> Dict[str, Dict[str, float]]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self) -> None:
+        """Write the cache to ``cache_path`` atomically (temporary file + ``os.replace``)."""
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        with self._lock:
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as fh:
+                    json.dump(self._cache, fh, ensure_ascii=False)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                os.replace(tmp_path, self.cache_path)
+            except OSError as exc:
+                SALARY_LOGGER.warning("could not write the salary cache to %s: %s", self.cache_path, exc)
+
+    def cached(self, cargo: str, setor: str, empresa: str) -> float | None:
+        """Return a non-expired cached estimate, or None."""
+        with self._lock:
+            entry = self._cache.get(self._cache_key((cargo, setor, empresa)))
+        if entry and time.time() - entry.get("ts", 0.0) <= self.ttl_seconds:
+            return float(entry["salario"])
+        return None
+
+    def _request(self, cargo: str, setor: str, empresa: str, timeout: float) -> float:
+        """One webhook round trip; raises ``requests.RequestException`` on transport/HTTP errors."""
+        resp = self._session.post(
+            self.url,
+            json={"cargo": cargo, "setor": setor, "empresa": empresa},
+            timeout=timeout,
+        )
+        resp.raise_for_status()
+        return _parse_salary(resp.text)
+
+    def _store(self, key: Tuple[str, str, str], salario: float) -> bool:
+        """Cache ``salario`` in memory (a NaN is remembered as a failure); returns whether it was stored."""
+        ckey = self._cache_key(key)
+        with self._lock:
+            if math.isnan(salario):
+                self._failures[ckey] = time.monotonic()
+                return False
+            self._failures.pop(ckey, None)
+            self._cache[ckey] = {"salario": salario, "ts": time.time()}
+        return True
+
+    def _recently_failed(self, ckey: str) -> bool:
+        with self._lock:
+            falha = self._failures.get(ckey)
+        return falha is not None and time.monotonic() - falha <= self.failure_ttl_seconds
+
+    def _fetch(self, cargo: str, setor: str, empresa: str) -> float:
+        try:
+            salario = self._request(cargo, setor, empresa, self.timeout)
+        except Exception:
+            salario = float("nan")
+        if self._store((cargo, setor, empresa), salario):
+            self._save_cache()
+        return salario
+
+    def _fetch_with_retry(
+        self, key: Tuple[str, str, str], deadline: float, retries: int, backoff: float
+    ) -> float:
+        """Call the webhook until it answers, ``retries`` is exhausted or ``deadline`` (s) elapses.
+
+        Transport errors and HTTP errors are retried with exponential backoff
+        (``backoff``, 2×``backoff``, ...); a well-formed answer without a
+        salary is final.  Each attempt's timeout is capped by the time left.
+        """
+        limite = time.monotonic() + deadline
+        for tentativa in range(retries + 1):
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                salario = self._request(*key, timeout=min(self.timeout, restante))
+            except requests.RequestException:
+                espera = backoff * (2 ** tentativa)
+                if tentativa == retries or time.monotonic() + espera >= limite:
+                    break
+                time.sleep(espera)
+                continue
+            self._store(key, salario)
+            return salario
+        self._store(key, float("nan"))
+        return float("nan")
+
+    def estimate_many(
+        self,
+        triples: Sequence[Tuple[str, str, str]],
+        max_concurrency: int = 8,
+        deadline: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+    ) -> np.ndarray:
+        """Estimate salaries for many (cargo, setor, empresa) triples, e.g. a CRM import.
+
+        Identical triples (ignoring case and surrounding spaces) are sent
+        once, cached triples are not sent at all, and at most
+        ``max_concurrency`` requests are in flight.  Each distinct triple
+        gets ``deadline`` seconds including retries.  New estimates are
+        written to ``cache_path`` once, after the last answer.  Returns an
+        array aligned with ``triples``, NaN where no salary could be obtained.
+        """
+        salarios = np.full(len(triples), np.nan)
+        grupos: Dict[str, List[int]] = {}
+        representantes: Dict[str, Tuple[str, str, str]] = {}
+        for idx, triple in enumerate(triples):
+            key = tuple(str(v or "") for v in triple)
+            ckey = self._cache_key(key)
+            grupos.setdefault(ckey, []).append(idx)
+            representantes.setdefault(ckey, key)
+        pendentes = {}
+        for ckey, key in representantes.items():
+            salario = self.cached(*key)
+            if salario is not None:
+                salarios[grupos[ckey]] = salario
+            else:
+                pendentes[ckey] = key
+        if pendentes:
+            with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="salary-bulk") as pool:
+                futuros = {
+                    ckey: pool.submit(self._fetch_with_retry, key, deadline, retries, backoff)
+                    for ckey, key in pendentes.items()
+                }
+                for ckey, fut in futuros.items():
+                    salarios[grupos[ckey]] = fut.result()
+            self._save_cache()
+        return salarios
+
+    def submit(self, cargo: str, setor: str, empresa: str) -> Future:
+        """Start (or join) a background estimate and return its Future.
+
+        Triples equal up to case and surrounding spaces join the same call.
+        A triple that failed within ``failure_ttl_seconds`` resolves to NaN
+        without calling the webhook again.
+        """
+        key = (cargo, setor, empresa)
+        ckey = self._cache_key(key)
+        salario = self.cached(*key)
+        if salario is None and self._recently_failed(ckey):
+            salario = float("nan")
+        if salario is not None:
+            done: Future = Future()
+            done.set_result(salario)
+            return done
+        with self._lock:
+            fut = self._pending.get(ckey)
+            if fut is None or fut.done():
+                fut = self._executor.submit(self._fetch, *key)
+                self._pending[ckey] = fut
+            return fut
+
+    def estimate(self, cargo: str, setor: str, empresa: str) -> float:
+        """Blocking estimate (NaN on failure), served from the cache when possible."""
+        try:
+            return self.submit(cargo, setor, empresa).result(timeout=self.timeout + 1)
+        except Exception:
+            return float("nan")
+
+    def close(self) -> None:
+        """Stop the background threads and release the pooled connections."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
+
+
+def _build_salary_estimator() -> SalaryEstimator:
+    estimator = SalaryEstimator()
+    atexit.register(estimator.close)
+    return estimator
+
+
+def salary_estimator() -> SalaryEstimator:
+    """Process-wide :class:`SalaryEstimator` shared by all sessions, built on first use."""
+    return shared_resource("salary_estimator", _build_salary_estimator)
+
 
 def estimate_salary(cargo: str, setor: str, empresa: str) -> float:
     """Estimate annual salary using an external n8n webhook.
 
     Returns NaN if the call fails or no salary is found.  Timeout is set
     to avoid hanging.  The webhook should return HTML with the salary
-    embedded in a ``srcdoc="..."`` attribute.
+    embedded in a ``srcdoc="..."`` attribute.  Delegates to
+    :func:`salary_estimator`, so repeated triples are answered from its cache.
     """
-    try:
-        payload = {"cargo": cargo, "setor": setor, "empresa": empresa}
-        resp = requests.post(
-            "http://localhost:5678/webhook-test/estimar-salário",
-            json=payload,
-            timeout=10,
-        )
-        resp.raise_for_status()
-        import re
+    return salary_estimator().estimate(cargo, setor, empresa)
 
-        m = re.search(r'srcdoc="([\d\.]+)"', resp.text)
-        if not m:
-            return float("nan")
-        return float(m.group(1))
-    except Exception:
-        return float("nan")
+
+def estimate_salaries(triples: Sequence[Tuple[str, str, str]], **kwargs) -> np.ndarray:
+    """Bulk version of :func:`estimate_salary`; see :meth:`SalaryEstimator.estimate_many`."""
+    return salary_estimator().estimate_many(triples, **kwargs)
 
 
 def risk_assessment(answers: List[int]) -> int:
@@ -429,213 +831,1119 @@ def profile_from_risk_number(number: int) -> str:
         return "arrojado"
 
 
-def simular_monte_carlo(
-    endowment_inicial: float,
-    carteira: Dict[str, Dict[str, float]],
+# Seed of the Monte Carlo charts in the results stage, so reruns show the same paths.
+MC_SEED = 42
+
+class MonteCarloPools:
+    """Process pools of the Monte Carlo runs, one per worker count, created on demand."""
+
+    def __init__(self) -> None:
+        self._pools: Dict[int, ProcessPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def get(self, workers: int) -> ProcessPoolExecutor:
+        with self._lock:
+            pool = self._pools.get(workers)
+            if pool is None:
+                pool = self._pools[workers] = ProcessPoolExecutor(max_workers=workers)
+            return pool
+
+    def close(self) -> None:
+        """Shut every pool down, cancelling queued shards."""
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _build_monte_carlo_pools() -> MonteCarloPools:
+    pools = MonteCarloPools()
+    atexit.register(pools.close)
+    return pools
+
+
+def monte_carlo_pools() -> MonteCarloPools:
+    """Process-wide :class:`MonteCarloPools`, closed at exit or when Streamlit releases it."""
+    return shared_resource("mc_pools", _build_monte_carlo_pools)
+
+
+def _monte_carlo_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool shared by every Monte Carlo run with ``workers`` processes."""
+    return monte_carlo_pools().get(workers)
+
+
+# Floating-point precisions accepted by the Monte Carlo engines.
+MC_PRECISIONS = {"float64": np.float64, "float32": np.float32}
+# Memory a single Monte Carlo request may use (bytes); JERA_MC_MEMORY_BUDGET overrides it.
+MC_MEMORY_BUDGET = int(os.environ.get("JERA_MC_MEMORY_BUDGET", 256 * 2**20))
+
+
+class MonteCarloBudgetError(MemoryError):
+    """Raised when a Monte Carlo request cannot fit in the memory budget."""
+
+
+# Arrays counted by _mc_memory_terms, named after what they hold.  Endowment:
+# one value per path kept across years, and the (chunk × 12) monthly blocks.
+_MC_ENDOWMENT_PATH_ARRAYS = ("valores", "copia_percentil")
+_MC_ENDOWMENT_MONTH_ARRAYS = ("sorteios", "um_mais_sorteios", "produto_mensal")
+# Patrimony: float64 values per path (state, the year's total and its
+# np.percentile copy, temporaries of _patrimony_step) and boolean flags.
+_MC_PATRIMONIO_PATH_ARRAYS = (
+    "capital_guard", "endowment", "retornos", "total_ano", "copia_percentil",
+    "matured_cap", "matured_end", "investible", "req_cap", "end_rebalanceado",
+)
+_MC_PATRIMONIO_FLAG_ARRAYS = ("arruinado", "esgotado")
+# Macro: (paths × years) matrices kept per request, and per chunk path the
+# shocks and MacroPath series plus the float64 arrays of the expense engine.
+_MC_MACRO_PATH_MATRICES = ("gastos", "fluxo", "copia_percentil")
+_MC_MACRO_YEAR_SERIES = (
+    "choque_brl", "choque_usd", "choque_fx", "fator_brl", "fator_usd", "cotacoes", "deflator", "fator_fx_display",
+)
+_MC_MACRO_ENGINE_ARRAYS = 30
+
+
+def _mc_memory_terms(
+    engine: str, n_sim: int, anos: int, workers: int, precision: str, n_classes: int = 2
+) -> Tuple[int, int]:
+    """(bytes independent of the chunk size, bytes per path of a chunk) of a Monte Carlo request."""
+    s = np.dtype(MC_PRECISIONS[precision]).itemsize
+    n_sim, anos = int(n_sim), int(anos)
+    if engine == "endowment_mensal":
+        fixo = len(_MC_ENDOWMENT_PATH_ARRAYS) * n_sim * s
+        if max(1, int(workers)) > 1:
+            # per-year values of every shard and their concatenation
+            fixo += 2 * n_sim * anos * s
+        # per chunk path: the monthly blocks and the year's reduction of them
+        return fixo, (len(_MC_ENDOWMENT_MONTH_ARRAYS) * 12 + 1) * s
+    if engine == "patrimonio":
+        fixo = n_sim * (len(_MC_PATRIMONIO_PATH_ARRAYS) * 8 + len(_MC_PATRIMONIO_FLAG_ARRAYS))
+        if max(1, int(workers)) > 1:
+            # per-year quantile sketch of every shard
+            fixo += int(workers) * len(MC_SKETCH_PERCENTIS) * anos * 8
+        # per chunk path: one draw per class (or dom/intl) and their blend
+        return fixo, (2 * int(n_classes) + 2) * s
+    if engine == "despesas_macro":
+        fixo = len(_MC_MACRO_PATH_MATRICES) * n_sim * anos * s
+        if max(1, int(workers)) > 1:
+            fixo += 2 * n_sim * anos * s
+        return fixo, anos * (len(_MC_MACRO_YEAR_SERIES) * s + _MC_MACRO_ENGINE_ARRAYS * 8)
+    raise ValueError(f"Motor de Monte Carlo desconhecido: {engine!r}")
+
+
+def estimate_monte_carlo_memory(
+    engine: str,
+    n_sim: int,
     anos: int,
-    n_sim: int = 1000,
-    seed: int = 42,
-) -> List[float]:
-    """Simulate the endowment growth using Monte Carlo and return median values."""
-    np.random.seed(seed)
-    weights = np.array([v["peso"] for v in carteira.values()])
-    means = np.array([v["media"] for v in carteira.values()])
-    vols = np.array([v["vol"] for v in carteira.values()])
-    returns = np.random.normal(means, vols, size=(n_sim, anos, len(weights)))
-    weighted = np.sum(returns * weights, axis=2)
-    values = np.full((n_sim,), endowment_inicial, dtype=float)
-    medians = []
-    for year in range(anos):
-        values = values * (1 + weighted[:, year])
-        medians.append(float(np.median(values)))
-    return medians
-
-
-def health_cost_for_age(age: int) -> float:
-    """Return healthcare cost for a given age from PREMISES; extrapolate for older ages."""
-    ranges = PREMISES.get("saude", {}).get("gastoAnualPorFaixa", [])
-    if not ranges:
-        return 0.0
+    chunk_size: int | None = None,
+    workers: int = 1,
+    precision: str = "float64",
+    n_classes: int = 2,
+) -> int:
+    """Approximate peak bytes of a Monte Carlo request, before running it.
 
-    last_cost = ranges[-1].get("gasto", 0)
+    ``engine`` is ``"endowment_mensal"`` (:func:`simular_endowment_mensal`),
+    ``"patrimonio"`` (:func:`simular_patrimonio_monte_carlo`) or
+    ``"despesas_macro"`` (:func:`simular_despesas_macro`);
+    ``chunk_size`` is the number of paths drawn at once (all of them when
+    None) and ``n_classes`` the number of return series drawn per year (2
+    for dom/intl, the class count with ``return_model="classes"``).
+    """
+    fixo, por_caminho = _mc_memory_terms(engine, n_sim, anos, workers, precision, n_classes)
+    return fixo + por_caminho * min(int(chunk_size or n_sim), max(int(n_sim), 1))
 
-    for entry in ranges:
-        faixa = entry.get("faixa", "")
-        gasto = entry.get("gasto", 0)
 
-        try:
-            if "–" in faixa:
-                min_age, max_age = faixa.split("–")
-                min_age = int(min_age.strip())
-                max_age = int(max_age.strip())
-            elif "+" in faixa:
-                min_age = int(faixa.replace("+", "").strip())
-                max_age = 200
-            else:
-                min_age = max_age = int(faixa.strip())
+def fit_monte_carlo_chunk(
+    engine: str,
+    n_sim: int,
+    anos: int,
+    chunk_size: int | None = None,
+    workers: int = 1,
+    precision: str = "float64",
+    memory_budget: int | None = None,
+    on_budget: str = "chunk",
+    n_classes: int = 2,
+) -> int:
+    """Chunk size that keeps a Monte Carlo request within ``memory_budget``.
 
-            if min_age <= age <= max_age:
-                return float(gasto)
-        except (ValueError, AttributeError):
-            continue
+    Returns ``chunk_size`` (or ``n_sim``) when the request fits.  Otherwise,
+    with ``on_budget="chunk"`` the chunk is shrunk until it fits; with
+    ``"refuse"``, or when even one path per chunk does not fit, raises
+    :class:`MonteCarloBudgetError`.
+    """
+    if precision not in MC_PRECISIONS:
+        raise ValueError(f"Precisão desconhecida: {precision!r}")
+    budget = MC_MEMORY_BUDGET if memory_budget is None else int(memory_budget)
+    chunk = max(1, min(int(chunk_size or n_sim), max(int(n_sim), 1)))
+    estimativa = estimate_monte_carlo_memory(engine, n_sim, anos, chunk, workers, precision, n_classes)
+    if estimativa <= budget:
+        return chunk
+    fixo, por_caminho = _mc_memory_terms(engine, n_sim, anos, workers, precision, n_classes)
+    maximo = (budget - fixo) // por_caminho
+    if on_budget != "chunk" or maximo < 1:
+        raise MonteCarloBudgetError(
+            f"Simulação requer ~{estimativa / 2**20:.0f} MiB, acima do limite de {budget / 2**20:.0f} MiB."
+        )
+    return int(maximo)
 
-    return float(last_cost)
 
+def run_monte_carlo_shards(shard, n_sim: int, seed: int | None, workers: int, *args, **kwargs) -> list:
+    """Split ``n_sim`` paths into ``workers`` shards and run ``shard`` on each.
 
-def compute_costs_and_incomes(
-    idade_cliente: int,
-    idade_conjuge: int,
-    idades_filhos: List[int],
-    escolas_filhos: List[str],
-    estudam_fora: List[bool],
-    bairro: str,
-    metragem: float,
-    n_carros: int,
-    estilo_vida: int,
-    n_viagens: int,
-    n_funcionarios: int,
-    luxo_mensal: float,
-    # Monthly cost of second residence (BRL).  Added as a separate
-    # recurring expense similar to luxury spending.  This parameter
-    # must precede all parameters with defaults; it is provided
-    # explicitly when the function is called.
-    segunda_resid_mensal: float,
-    # New income parameters
-    aluguel_mensal_brl: float,
-    aluguel_growth_brl: float,
-    aluguel_mensal_usd: float,
-    aluguel_growth_usd: float,
-    dividendos_brl: float,
-    divid_growth_brl: float,
-    dividendos_usd: float,
-    divid_growth_usd: float,
-    # Old extra parameters removed: renda_extra_mensal, dividendos_anuais, taxa_crescimento_dividendo
-    patrimonio_inicial: float,
-    filantropia_anual: float,
-    anos_proj: int,
-    infl_brl_pct: float,
-    infl_usd_pct: float,
-    cotacao_usd: float,
-    salario_anual0: float,
-    idade_aposentadoria: int,
-    # When True, indicates the user has no spouse.  Spouse age is
-    # ignored in projections and only one adult is counted for base
-    # expenses.  Default is False (assume spouse present when age > 0).
-    no_conjuge: bool = False,
-    scales: Dict[str, float] | None = None,
-) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, float]:
-    """Compute projected expenses (BRL & USD) and incomes.
+    ``shard(n, seed_seq, *args, **kwargs)`` simulates ``n`` paths from its own
+    ``SeedSequence`` child stream; the shard sizes and streams depend only
+    on ``seed`` and ``workers``, and results come back in shard order, so a
+    run is bit-for-bit reproducible for a given seed and worker count
+    regardless of scheduling.  With more than one worker the shards run
+    on a process pool (``shard`` and ``args`` must be picklable).
+    """
+    workers = max(1, min(int(workers), max(int(n_sim), 1)))
+    tamanhos = [len(parte) for parte in np.array_split(np.arange(int(n_sim)), workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    if workers == 1:
+        return [shard(tamanhos[0], seeds[0], *args, **kwargs)]
+    pool = _monte_carlo_pool(workers)
+    futures = [pool.submit(shard, n, s, *args, **kwargs) for n, s in zip(tamanhos, seeds)]
+    return [f.result() for f in futures]
 
-    Returns
-    -------
-    df_brl : DataFrame
-        Expenses in BRL by category and total.
-    df_usd : DataFrame
-        Expenses in USD by category and total.
-    df_incomes : DataFrame
-        Incomes (salary, dividends, extras, total) by year.
-    capital_guard : float
-        Amount allocated to the capital guard (sum of first 4 years of expenses minus first year's income).
+
+# Variance-reduction modes accepted by the Monte Carlo engines.
+VARIANCE_REDUCTION_MODES = ("none", "antithetic", "sobol", "moment_matching")
+
+
+def standard_normal_draws(
+    rng: np.random.Generator,
+    n: int,
+    shape: Tuple[int, ...],
+    mode: str = "none",
+    dtype: type = np.float64,
+    engines: Dict[Tuple[int, int], object] | None = None,
+    bloco: int = 0,
+) -> np.ndarray:
+    """Standard normal draws of shape (n, *shape), one row per path.
+
+    ``mode`` selects the variance reduction applied across the ``n`` paths:
+
+    * ``"none"``: plain pseudo-random draws;
+    * ``"antithetic"``: the second half of the paths mirrors the first (-z);
+    * ``"sobol"``: scrambled Sobol points mapped through the normal inverse
+      CDF, one dimension per element of ``shape`` (requires SciPy);
+    * ``"moment_matching"``: draws re-centred and re-scaled so every
+      dimension has exactly mean 0 and standard deviation 1 across paths.
+
+    Engines that draw block by block (per year or per chunk) get the same
+    pairing/matching within each block.  For ``"sobol"`` a shard passes one
+    ``engines`` dict to all its calls: each ``bloco`` (e.g. the year) is
+    scrambled once and successive chunks take the next points of its
+    sequence.  ``dtype`` is the precision of the returned draws.
     """
-    infl_brl = 1 + infl_brl_pct / 100.0
-    infl_usd = 1 + infl_usd_pct / 100.0
+    shape = tuple(int(s) for s in shape)
+    if mode == "none":
+        return rng.standard_normal((n,) + shape, dtype=dtype)
+    if mode == "antithetic":
+        z = rng.standard_normal(((n + 1) // 2,) + shape, dtype=dtype)
+        return np.concatenate([z, -z])[:n]
+    if mode == "sobol":
+        if qmc is None:
+            raise ImportError("O modo 'sobol' requer o pacote scipy.")
+        d = int(np.prod(shape))
+        if engines is None:
+            engines = {}
+        engine = engines.get((bloco, d))
+        if engine is None:
+            engine = engines[(bloco, d)] = qmc.Sobol(d, scramble=True, seed=rng)
+        with warnings.catch_warnings():
+            # Sobol balance warnings for path counts that are not powers of two
+            warnings.simplefilter("ignore", UserWarning)
+            u = engine.random(n)
+        return ndtri(np.clip(u, 1e-12, 1 - 1e-12)).reshape((n,) + shape).astype(dtype, copy=False)
+    if mode == "moment_matching":
+        z = rng.standard_normal((n,) + shape, dtype=dtype)
+        if n < 2:
+            return z
+        z -= z.mean(axis=0)
+        desvio = z.std(axis=0)
+        return z / np.where(desvio > 0, desvio, 1.0)
+    raise ValueError(f"Modo de redução de variância desconhecido: {mode!r}")
 
-    # Precompute annual USD/BRL exchange rates.  The initial rate comes
-    # from user input and each subsequent year is adjusted by the
-    # relative inflation: BRL inflation divided by USD inflation.  This
-    # mirrors the requested formula: nova_cotacao = cotacao_anterior *
-    # (1 + infl_brl) / (1 + infl_usd).
-    cotacoes: List[float] = [cotacao_usd]
-    for _ in range(anos_proj - 1):
-        cotacoes.append(cotacoes[-1] * (infl_brl) / (infl_usd))
 
-    anos = list(range(anos_proj))
+class AssetClassModel:
+    """Correlated class-level return model of one risk profile.
 
-    # Validações e carregamento de dados de moradia
-    try:
-        bairros = {b["nome"]: b["precoM2"] for b in PREMISES.get("moradia", {}).get("bairros", [])
-                   if "nome" in b and "precoM2" in b}
-    except (KeyError, TypeError):
-        bairros = {}
-    preco_m2 = bairros.get(bairro, 0)
+    Holds the classes of the profile's dom and intl segments, their expected
+    returns, the covariance matrix built from ``ASSET_CLASSES`` and
+    ``ASSET_CLASS_CORRELATIONS`` and its Cholesky factor.  With ``calibrar``
+    the class returns and volatilities of each segment are shifted/scaled
+    so that the segment portfolio keeps the profile's ``expected_return``
+    and ``vol`` from PORTFOLIOS; only the correlations (including the one
+    between dom and intl) then come from the class model.  ``correlacao``
+    replaces the assumed class correlations (K × K, in the order of
+    :attr:`classes`) and must be a valid correlation matrix.
+    """
 
-    func_por_m2 = PREMISES.get("moradia", {}).get("funcionariosPor1000m2", 0) / 1000.0
-    base_func = max(1, math.ceil(metragem * func_por_m2))
-    custo_func = PREMISES.get("moradia", {}).get("custoFuncionario", 0)
-    custo_base_pessoa = PREMISES.get("moradia", {}).get("custoBasePorPessoa", 0)
+    SEGMENTOS = ("dom", "intl")
 
-    # Validações e carregamento de dados de educação
-    escolas_map: Dict[str, List[Tuple[int, int, float]]] = {}
-    try:
-        for esc in PREMISES.get("educacao", {}).get("escolas", []):
-            if all(k in esc for k in ["nome", "idadeMin", "idadeMax", "precoAnual"]):
-                escolas_map.setdefault(esc["nome"], []).append(
-                    (int(esc["idadeMin"]), int(esc["idadeMax"]), float(esc["precoAnual"]))
+    def __init__(self, risk_profile: str, calibrar: bool = True, correlacao: np.ndarray | None = None):
+        profile = PORTFOLIOS.get(risk_profile, PORTFOLIOS["moderado"])
+        self.classes: List[str] = []
+        pesos = []
+        for s, segmento in enumerate(self.SEGMENTOS):
+            for nome, peso in profile[segmento]["classes"].items():
+                if nome in ASSET_CLASSES and float(peso) > 0:
+                    self.classes.append(nome)
+                    linha = np.zeros(len(self.SEGMENTOS))
+                    linha[s] = float(peso)
+                    pesos.append(linha)
+        # Class weights within each segment (K × segments), columns sum to 1
+        self.pesos_segmento = np.array(pesos).reshape(len(self.classes), len(self.SEGMENTOS))
+        self.pesos_segmento /= np.where(self.pesos_segmento.sum(axis=0) > 0, self.pesos_segmento.sum(axis=0), 1.0)
+        info = [ASSET_CLASSES[nome] for nome in self.classes]
+        mu = np.array([float(c["expected_return"]) for c in info])
+        vol = np.array([float(c["vol"]) for c in info])
+        corr = np.eye(len(info))
+        for i, a in enumerate(info):
+            for j in range(i):
+                b = info[j]
+                rho = ASSET_CLASS_CORRELATIONS.get(
+                    (a["tipo"], b["tipo"]), ASSET_CLASS_CORRELATIONS.get((b["tipo"], a["tipo"]), 0.0)
                 )
-    except (KeyError, ValueError, TypeError):
-        pass
+                if a["segmento"] != b["segmento"]:
+                    rho *= CROSS_SEGMENT_CORRELATION_FACTOR
+                corr[i, j] = corr[j, i] = rho
+        if correlacao is None:
+            corr = self._nearest_correlation(corr)
+        else:
+            corr = self._checked_correlation(correlacao, len(info))
+        if calibrar:
+            for s, segmento in enumerate(self.SEGMENTOS):
+                w = self.pesos_segmento[:, s]
+                membros = w > 0
+                if not membros.any():
+                    continue
+                mu[membros] += profile[segmento]["expected_return"] - w @ mu
+                vol_seg = math.sqrt(w @ (np.outer(vol, vol) * corr) @ w)
+                if vol_seg > 0:
+                    vol[membros] *= profile[segmento]["vol"] / vol_seg
+        self.expected_returns = mu
+        self.covariance = np.outer(vol, vol) * corr
+        self.cholesky = np.linalg.cholesky(self.covariance + 1e-12 * np.eye(len(mu)))
+        # Segment returns are mu_seg + z @ B, one matmul of the class draws
+        self.media_segmento = mu @ self.pesos_segmento
+        self.carga_segmento = self.cholesky.T @ self.pesos_segmento
 
-    faculdade_br = PREMISES.get("educacao", {}).get("faculdade", {}).get("brasil", 0)
-    faculdade_ext = PREMISES.get("educacao", {}).get("faculdade", {}).get("exteriorUSD", 0)
+    @staticmethod
+    def _checked_correlation(corr, dimensao: int) -> np.ndarray:
+        """``corr`` as an array; ValueError unless it is a positive definite ``dimensao``-square correlation matrix."""
+        corr = np.array(corr, dtype=float)
+        if corr.shape != (dimensao, dimensao):
+            raise ValueError(f"A matriz de correlação deve ser {dimensao}×{dimensao}, recebida {corr.shape}.")
+        if not np.allclose(corr, corr.T) or not np.allclose(np.diag(corr), 1.0) or np.abs(corr).max() > 1 + 1e-12:
+            raise ValueError("A matriz de correlação deve ser simétrica, com diagonal 1 e entradas em [-1, 1].")
+        if np.linalg.eigvalsh(corr).min() <= 1e-10:
+            raise ValueError("A matriz de correlação não é positiva definida.")
+        return corr
 
-    # Validações e carregamento de dados de lifestyle
-    viagem_custos = PREMISES.get("lifestyle", {}).get("viagensInternacionais", {}).get("custoUSD", {})
-    if not isinstance(viagem_custos, dict):
-        viagem_custos = {"casal": 10000.0, "filho0a6": 2000.0, "filho7a12": 3000.0, "filho13mais": 5000.0}
+    @staticmethod
+    def _nearest_correlation(corr: np.ndarray) -> np.ndarray:
+        """Clip negative eigenvalues so the assumed correlations form a valid matrix."""
+        valores, vetores = np.linalg.eigh(corr)
+        if valores.min() > 1e-10:
+            return corr
+        ajustada = vetores @ np.diag(np.maximum(valores, 1e-10)) @ vetores.T
+        d = np.sqrt(np.diag(ajustada))
+        return ajustada / np.outer(d, d)
 
-    estilos = PREMISES.get("lifestyle", {}).get("estilosDeVida", {})
-    if not estilos:
-        estilos = {1: {"casal": 20000.0, "porFilho": 5000.0},
-                   2: {"casal": 50000.0, "porFilho": 12000.0},
-                   3: {"casal": 100000.0, "porFilho": 25000.0}}
+    def class_returns(
+        self, rng: np.random.Generator, n: int, anos: int, variance_reduction: str = "none", dtype: type = np.float64
+    ) -> np.ndarray:
+        """Correlated annual returns of every class, shape (n × anos × classes)."""
+        z = standard_normal_draws(rng, n, (anos, len(self.classes)), variance_reduction, dtype)
+        return self.expected_returns.astype(dtype) + z @ self.cholesky.T.astype(dtype)
 
-    # Pega estilo configurado ou usa moderado (2) como padrão
-    estilo_cfg = estilos.get(estilo_vida, estilos.get(2, estilos.get(1, {})))
+    def segment_returns(
+        self,
+        rng: np.random.Generator,
+        n: int,
+        anos: int,
+        variance_reduction: str = "none",
+        dtype: type = np.float64,
+        engines: Dict[Tuple[int, int], object] | None = None,
+        bloco: int = 0,
+    ) -> np.ndarray:
+        """Annual dom/intl portfolio returns aggregated by class weight, shape (n × anos × 2)."""
+        z = standard_normal_draws(rng, n, (anos, len(self.classes)), variance_reduction, dtype, engines, bloco)
+        return self.media_segmento.astype(dtype) + z @ self.carga_segmento.astype(dtype)
 
 
-    brl_rows = []
-    # We'll store only USD denominated expenses: overseas education and international trips.
-    usd_only_rows = []
-    incomes_rows = []
+_ASSET_CLASS_MODELS: Dict[Tuple[str, bool], Tuple[str, AssetClassModel]] = shared_resource("asset_class_models", dict)
 
-    salario = salario_anual0
 
-    # Rastreia veículos adicionais para cada filho ao longo dos anos. Cada filho recebe
-    # um carro ao completar 18 anos (com custo de compra de 200k) e mantém o carro
-    # até completar 26 anos. Após 26, o carro é removido da contagem. O número de
-    # carros informado inicialmente em `n_carros` refere‑se aos veículos do casal.
-    veiculos_adicionais = [0] * len(idades_filhos)
-    for ano in anos:
-        infl_factor_brl = infl_brl ** ano
-        infl_factor_usd = infl_usd ** ano
-        # Determine current exchange rate for this year
-        cot_curr = cotacoes[ano] if ano < len(cotacoes) else cotacoes[-1]
-        idade_cli = idade_cliente + ano
-        # Compute spouse age for this year.  If the user has indicated
-        # no spouse, use zero to avoid adding health costs and extra base
-        # expenses.  Otherwise increment the provided age.
-        idade_conj = (idade_conjuge + ano) if not no_conjuge else 0
-        idades_f = [age + ano for age in idades_filhos]
-        # Moradia
-        valor_imovel = preco_m2 * metragem
-        custo_manut = valor_imovel * 0.02 * infl_factor_brl
-        # Combine cost of base employees and user-specified employees (each extra costs 48k/year)
-        custo_empregados = (base_func * custo_func + n_funcionarios * 48000) * infl_factor_brl
-        # Compute number of occupants: one adult client plus spouse (if present) plus children.
-        occupants = 1 + (0 if no_conjuge else 1) + len(idades_filhos)
-        custo_base = occupants * custo_base_pessoa * infl_factor_brl
-        custo_moradia_brl = custo_manut + custo_empregados + custo_base
-        # Educação & mesadas
-        custo_educ_brl = 0.0
-        custo_educ_usd = 0.0
-        custo_mesadas_brl = 0.0
-        for idx, idade_f in enumerate(idades_f):
-            esc_name = escolas_filhos[idx]
-            if idade_f <= 17 and esc_name:
-                for idadeMin, idadeMax, preco in escolas_map.get(esc_name, []):
-                    if idadeMin <= idade_f <= idadeMax:
-                        custo_educ_brl += preco * infl_factor_brl
-                        break
+def asset_class_model(risk_profile: str, calibrar: bool = True) -> AssetClassModel:
+    """Cached :class:`AssetClassModel` (and Cholesky factor) of ``risk_profile``.
+
+    Rebuilt when PORTFOLIOS or the asset-class assumptions change.
+    """
+    fingerprint = json.dumps(
+        [PORTFOLIOS.get(risk_profile), ASSET_CLASSES, sorted(ASSET_CLASS_CORRELATIONS.items()), CROSS_SEGMENT_CORRELATION_FACTOR],
+        sort_keys=True,
+    )
+    chave = (risk_profile, bool(calibrar))
+    cached = _ASSET_CLASS_MODELS.get(chave)
+    if cached is None or cached[0] != fingerprint:
+        cached = _ASSET_CLASS_MODELS[chave] = (fingerprint, AssetClassModel(risk_profile, calibrar))
+    return cached[1]
+
+
+def _carteira_shard(
+    n: int,
+    seed_seq: np.random.SeedSequence,
+    endowment_inicial: float,
+    carteira: Dict[str, Dict[str, float]],
+    anos: int,
+    variance_reduction: str = "none",
+) -> np.ndarray:
+    rng = np.random.default_rng(seed_seq)
+    weights = np.array([v["peso"] for v in carteira.values()])
+    means = np.array([v["media"] for v in carteira.values()])
+    vols = np.array([v["vol"] for v in carteira.values()])
+    if variance_reduction == "none":
+        returns = rng.normal(means, vols, size=(n, anos, len(weights)))
+    else:
+        returns = means + vols * standard_normal_draws(rng, n, (anos, len(weights)), variance_reduction)
+    weighted = returns @ weights
+    return endowment_inicial * np.cumprod(1 + weighted, axis=1)
+
+
+def simular_monte_carlo(
+    endowment_inicial: float,
+    carteira: Dict[str, Dict[str, float]],
+    anos: int,
+    n_sim: int = 1000,
+    seed: int = 42,
+    workers: int = 1,
+    variance_reduction: str = "none",
+) -> List[float]:
+    """Simulate the endowment growth using Monte Carlo and return median values.
+
+    Paths are split across ``workers`` processes (see
+    :func:`run_monte_carlo_shards`); the global NumPy random state is not
+    touched.  ``variance_reduction`` is one of ``VARIANCE_REDUCTION_MODES``
+    (see :func:`standard_normal_draws`).
+    """
+    shards = run_monte_carlo_shards(
+        _carteira_shard, n_sim, seed, workers, float(endowment_inicial), carteira, int(anos), variance_reduction
+    )
+    return [float(v) for v in np.median(np.concatenate(shards), axis=0)]
+
+
+def _endowment_mensal_shard(
+    n: int,
+    seed_seq: np.random.SeedSequence,
+    valor_inicial: float,
+    retorno_anual: float,
+    vol_anual: float,
+    anos: int,
+    percentis: Sequence[float] | None = None,
+    variance_reduction: str = "none",
+    precision: str = "float64",
+    log_space: bool = False,
+    chunk_size: int | None = None,
+) -> np.ndarray:
+    """Paths of :func:`simular_endowment_mensal`; per-year values (n × anos), or their ``percentis``."""
+    rng = np.random.default_rng(seed_seq)
+    dtype = MC_PRECISIONS[precision]
+    mu_mensal = retorno_anual / 12.0
+    sigma_mensal = vol_anual / np.sqrt(12.0)
+    chunk = max(1, int(chunk_size or n))
+    engines: Dict[Tuple[int, int], object] = {}
+    # Running value of each path, or its log growth when accumulating in log space
+    valores = np.zeros(n, dtype=dtype) if log_space else np.full(n, valor_inicial, dtype=dtype)
+    if percentis is None:
+        saida = np.empty((n, anos), dtype=dtype)
+    else:
+        saida = np.empty((len(percentis), anos))
+    for ano in range(anos):
+        for inicio in range(0, n, chunk):
+            m = min(chunk, n - inicio)
+            if variance_reduction == "none" and dtype is np.float64:
+                bloco = rng.normal(loc=mu_mensal, scale=sigma_mensal, size=(m, 12))
+            else:
+                bloco = dtype(mu_mensal) + dtype(sigma_mensal) * standard_normal_draws(
+                    rng, m, (12,), variance_reduction, dtype, engines, ano
+                )
+            if log_space:
+                valores[inicio : inicio + m] += np.log1p(np.maximum(bloco, dtype(-1 + 1e-6))).sum(axis=1)
+            else:
+                valores[inicio : inicio + m] *= np.prod(1 + bloco, axis=1)
+        atuais = valor_inicial * np.exp(valores) if log_space else valores
+        if percentis is None:
+            saida[:, ano] = atuais
+        else:
+            saida[:, ano] = np.percentile(atuais, percentis)
+    return saida
+
+
+def simular_endowment_mensal(
+    valor_inicial: float,
+    retorno_anual: float,
+    vol_anual: float,
+    anos: int,
+    n_sim: int = 10000,
+    seed: int | None = None,
+    workers: int = 1,
+    variance_reduction: str = "none",
+    precision: str = "float64",
+    log_space: bool = False,
+    memory_budget: int | None = None,
+    on_budget: str = "chunk",
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Monthly Monte Carlo of an endowment segment with streaming percentiles.
+
+    Monthly returns are normal with mean ``retorno_anual / 12`` and
+    volatility ``vol_anual / sqrt(12)``, drawn a year at a time as in
+    :func:`simular_patrimonio_monte_carlo`, whose ``workers``,
+    ``variance_reduction``, ``precision`` and budget options this shares;
+    ``log_space`` accumulates ``log1p`` of the returns instead of
+    multiplying values.  Returns the P10, P50 and P90 arrays of the value
+    at the end of each year.
+    """
+    chunk = fit_monte_carlo_chunk(
+        "endowment_mensal", n_sim, anos, None, workers, precision, memory_budget, on_budget
+    )
+    args = (float(valor_inicial), float(retorno_anual), float(vol_anual), int(anos))
+    opcoes = dict(
+        variance_reduction=variance_reduction,
+        precision=precision,
+        log_space=log_space,
+        chunk_size=chunk if chunk < int(n_sim) else None,
+    )
+    if max(1, int(workers)) == 1:
+        percentis = run_monte_carlo_shards(_endowment_mensal_shard, n_sim, seed, 1, *args, [10, 50, 90], **opcoes)[0]
+    else:
+        shards = run_monte_carlo_shards(_endowment_mensal_shard, n_sim, seed, workers, *args, None, **opcoes)
+        percentis = np.percentile(np.concatenate(shards), [10, 50, 90], axis=0)
+    return percentis[0], percentis[1], percentis[2]
+
+
+# Offline table of monthly-endowment growth-factor percentiles per (profile, segment, year);
+# see scripts/build_mc_quantiles.py.  Bump the version whenever the engine changes.
+GROWTH_QUANTILE_TABLE_VERSION = 1
+GROWTH_QUANTILE_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "mc_growth_quantiles.json")
+GROWTH_QUANTILE_KEYS = ("p10", "p50", "p90")
+
+_GROWTH_QUANTILE_TABLE: Dict[str, object] = shared_resource(
+    "growth_quantile_table", lambda: {"carregada": False, "tabela": None}
+)
+
+
+def build_growth_quantile_table(
+    anos: int = 80, n_sim: int = 200_000, seed: int = MC_SEED, workers: int = 1
+) -> Dict[str, object]:
+    """Simulate the growth-factor percentiles of every profile/segment for the shipped table.
+
+    Each entry records the ``expected_return`` and ``vol`` it was simulated
+    with, so that lookups can detect customized portfolios.
+    """
+    perfis: Dict[str, Dict[str, object]] = {}
+    for nome, profile in PORTFOLIOS.items():
+        perfis[nome] = {}
+        for s, segmento in enumerate(("dom", "intl")):
+            mu = float(profile[segmento]["expected_return"])
+            vol = float(profile[segmento]["vol"])
+            p10, p50, p90 = simular_endowment_mensal(1.0, mu, vol, anos, n_sim=n_sim, seed=[seed, s], workers=workers)
+            perfis[nome][segmento] = {
+                "expected_return": mu,
+                "vol": vol,
+                "p10": p10.tolist(),
+                "p50": p50.tolist(),
+                "p90": p90.tolist(),
+            }
+    return {"version": GROWTH_QUANTILE_TABLE_VERSION, "anos": int(anos), "n_sim": int(n_sim), "seed": seed, "perfis": perfis}
+
+
+def _growth_quantile_table_ok(tabela: object) -> bool:
+    """Whether ``tabela`` has this engine's version and ``anos`` values in every percentile series."""
+    if not isinstance(tabela, dict) or tabela.get("version") != GROWTH_QUANTILE_TABLE_VERSION:
+        return False
+    anos, perfis = tabela.get("anos"), tabela.get("perfis")
+    if not isinstance(anos, int) or not isinstance(perfis, dict):
+        return False
+    return all(
+        isinstance(entrada, dict) and all(len(entrada.get(k) or ()) == anos for k in GROWTH_QUANTILE_KEYS)
+        for segmentos in perfis.values()
+        for entrada in (segmentos.values() if isinstance(segmentos, dict) else [None])
+    )
+
+
+def growth_quantile_table() -> Dict[str, object] | None:
+    """The shipped growth-factor table, or None if it is missing, unreadable, of another version or malformed."""
+    if not _GROWTH_QUANTILE_TABLE["carregada"]:
+        tabela = None
+        try:
+            with open(GROWTH_QUANTILE_TABLE_PATH, "r", encoding="utf-8") as fh:
+                tabela = json.load(fh)
+        except (OSError, ValueError):
+            pass
+        if not _growth_quantile_table_ok(tabela):
+            tabela = None
+        _GROWTH_QUANTILE_TABLE.update(carregada=True, tabela=tabela)
+    return _GROWTH_QUANTILE_TABLE["tabela"]
+
+
+def endowment_percentiles(
+    valor_inicial: float,
+    risk_profile: str,
+    segmento: str,
+    anos: int,
+    n_sim: int = 10000,
+    seed: int | None = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """P10/P50/P90 per year of a dom or intl endowment segment.
+
+    The percentiles of :func:`simular_endowment_mensal` scale linearly with
+    the starting value, so they are read from the shipped growth-factor
+    table and multiplied by ``valor_inicial``.  When the table is missing,
+    does not cover ``anos`` or the profile's ``expected_return``/``vol``
+    differ from the ones it was built with (customized premises), the
+    segment is simulated live with ``n_sim`` paths and ``seed``.
+    """
+    nome = risk_profile if risk_profile in PORTFOLIOS else "moderado"
+    mu = float(PORTFOLIOS[nome][segmento]["expected_return"])
+    vol = float(PORTFOLIOS[nome][segmento]["vol"])
+    tabela = growth_quantile_table()
+    entrada = (tabela or {}).get("perfis", {}).get(nome, {}).get(segmento)
+    if (
+        entrada is not None
+        and entrada.get("expected_return") == mu
+        and entrada.get("vol") == vol
+        and int(anos) <= int(tabela.get("anos", 0))
+    ):
+        return tuple(float(valor_inicial) * np.asarray(entrada[k][: int(anos)], dtype=float) for k in GROWTH_QUANTILE_KEYS)
+    if seed is None:
+        return simular_endowment_mensal(valor_inicial, mu, vol, anos, n_sim=n_sim, seed=seed)
+    # Seeded live runs are cached as growth factors, so a rerun with the same
+    # horizon and premises only rescales them.
+    fatores = MONTE_CARLO_CACHE.get_or_compute(
+        {"segmento": segmento, "expected_return": mu, "vol": vol, "anos": int(anos), "n_sim": int(n_sim), "seed": seed},
+        lambda chave: simular_endowment_mensal(1.0, mu, vol, int(anos), n_sim=int(n_sim), seed=seed),
+    )
+    return tuple(float(valor_inicial) * f for f in fatores)
+
+
+def monte_carlo_convergence(
+    target_se_pct: float = 1.0,
+    path_counts: Sequence[int] = (256, 512, 1024, 2048, 4096, 8192, 16384),
+    modes: Sequence[str] = VARIANCE_REDUCTION_MODES,
+    n_reps: int = 20,
+    valor_inicial: float = 1_000_000.0,
+    retorno_anual: float = 0.10,
+    vol_anual: float = 0.15,
+    anos: int = 20,
+    seed: int = 0,
+) -> Tuple[pd.DataFrame, Dict[str, int | None]]:
+    """Convergence benchmark of the variance-reduction modes.
+
+    For every mode and path count, :func:`simular_endowment_mensal` is run
+    ``n_reps`` times with independent seeds and the standard error of the
+    final-year P10/P50/P90 is measured across runs, as a percentage of the
+    mean.  Returns the table of standard errors (with the mean CPU time per
+    run) and, per mode, the smallest path count whose worst percentile
+    error is within ``target_se_pct`` (None if no tested count reaches it).
+    The Sobol mode is skipped when SciPy is not installed.
+    """
+    linhas = []
+    necessarios: Dict[str, int | None] = {}
+    for modo in modes:
+        if modo == "sobol" and qmc is None:
+            continue
+        necessarios[modo] = None
+        for n in path_counts:
+            finais = np.empty((n_reps, 3))
+            inicio = time.process_time()
+            for rep in range(n_reps):
+                p10, p50, p90 = simular_endowment_mensal(
+                    valor_inicial, retorno_anual, vol_anual, anos, n_sim=n, seed=[seed, rep], variance_reduction=modo
+                )
+                finais[rep] = p10[-1], p50[-1], p90[-1]
+            tempo_ms = (time.process_time() - inicio) / n_reps * 1000.0
+            ep = finais.std(axis=0, ddof=1) / finais.mean(axis=0) * 100.0
+            linhas.append(
+                {"Modo": modo, "Caminhos": n, "EP P10 (%)": ep[0], "EP P50 (%)": ep[1], "EP P90 (%)": ep[2], "Tempo (ms)": tempo_ms}
+            )
+            if necessarios[modo] is None and ep.max() <= target_se_pct:
+                necessarios[modo] = n
+    return pd.DataFrame(linhas), necessarios
+
+
+HEALTH_MAX_AGE = 120
+
+
+def _parse_faixa(faixa: str) -> Tuple[int, int]:
+    """Parse a saúde age band ("0–18", "66+", "40") into inclusive (min, max)."""
+    if "–" in faixa:
+        min_age, max_age = faixa.split("–")
+        return int(min_age.strip()), int(max_age.strip())
+    if "+" in faixa:
+        return int(faixa.replace("+", "").strip()), 200
+    age = int(faixa.strip())
+    return age, age
+
+
+def _compile_health_table(ranges: Sequence[dict]) -> Tuple[np.ndarray, float]:
+    """Compile the saúde bands into a cost per age 0..HEALTH_MAX_AGE.
+
+    The first matching band wins and ages outside every band get the last
+    band's cost, as ``health_cost_for_age`` always did.  Returns the table
+    and the cost used for ages outside it (negative ages).
+    """
+    last_cost = float(ranges[-1].get("gasto", 0)) if ranges else 0.0
+    table = np.full(HEALTH_MAX_AGE + 1, last_cost)
+    filled = np.zeros(HEALTH_MAX_AGE + 1, dtype=bool)
+    for entry in ranges:
+        try:
+            min_age, max_age = _parse_faixa(entry.get("faixa", ""))
+        except (ValueError, AttributeError):
+            continue
+        band = np.zeros_like(filled)
+        band[max(min_age, 0):max(min(max_age, HEALTH_MAX_AGE) + 1, 0)] = True
+        band &= ~filled
+        table[band] = float(entry.get("gasto", 0))
+        filled |= band
+    table.setflags(write=False)
+    return table, last_cost
+
+
+_HEALTH_TABLE: Dict[str, object] = shared_resource(
+    "health_table", lambda: {"fingerprint": None, "table": None, "fallback": 0.0}
+)
+
+
+def health_table() -> Tuple[np.ndarray, float]:
+    """Return the compiled saúde table and fallback, recompiling them if PREMISES["saude"] changed.
+
+    Checking the premises costs a pass over the bands, so engines fetch the
+    table once per projection and pass it to :func:`health_cost_for_age` /
+    :func:`health_costs_for_ages`.
+    """
+    ranges = PREMISES.get("saude", {}).get("gastoAnualPorFaixa", [])
+    fingerprint = tuple((entry.get("faixa"), entry.get("gasto")) for entry in ranges)
+    if fingerprint != _HEALTH_TABLE["fingerprint"]:
+        table, fallback = _compile_health_table(ranges)
+        _HEALTH_TABLE.update(fingerprint=fingerprint, table=table, fallback=fallback)
+    return _HEALTH_TABLE["table"], _HEALTH_TABLE["fallback"]
+
+
+def health_costs_for_ages(ages, tabela: Tuple[np.ndarray, float] | None = None) -> np.ndarray:
+    """Vectorized ``health_cost_for_age`` over an array of ages (any shape)."""
+    table, fallback = tabela if tabela is not None else health_table()
+    ages = np.asarray(ages, dtype=int)
+    costs = table[np.clip(ages, 0, HEALTH_MAX_AGE)]
+    return np.where(ages < 0, fallback, costs)
+
+
+def health_cost_for_age(age: int, tabela: Tuple[np.ndarray, float] | None = None) -> float:
+    """Return healthcare cost for a given age from PREMISES; extrapolate for older ages.
+
+    ``tabela`` is the result of :func:`health_table`; pass it when pricing
+    many ages so the premises are checked only once.
+    """
+    table, fallback = tabela if tabela is not None else health_table()
+    age = int(age)
+    if age < 0:
+        return fallback
+    return float(table[min(age, HEALTH_MAX_AGE)])
+
+
+# Number of years of expenses (current year included) the capital guard must cover.
+CAPITAL_GUARD_YEARS = 4
+
+
+def capital_guard_requirements(
+    expense_totals: Sequence[float] | np.ndarray,
+    income_totals: Sequence[float] | np.ndarray,
+    anos: int = CAPITAL_GUARD_YEARS,
+) -> np.ndarray:
+    """Expenses of the next ``anos`` years minus the current year's income, per year.
+
+    Works along the last axis, so ``expense_totals`` may be one series or
+    a (clients × years) matrix, with ``anos`` then either shared or one
+    window per client.  Windows are taken from a single cumulative sum, so
+    the cost does not depend on ``anos``; windows running past the last
+    year are truncated.  Years beyond ``income_totals`` have no income.
+    """
+    gastos = np.asarray(expense_totals, dtype=float)
+    rendas = np.asarray(income_totals, dtype=float)
+    n_anos = gastos.shape[-1]
+    if rendas.shape[-1] < n_anos:
+        pad = [(0, 0)] * (rendas.ndim - 1) + [(0, n_anos - rendas.shape[-1])]
+        rendas = np.pad(rendas, pad)
+    cum = np.concatenate([np.zeros(gastos.shape[:-1] + (1,)), np.cumsum(gastos, axis=-1)], axis=-1)
+    janela = np.maximum(np.asarray(anos, dtype=int), 0)
+    fim = np.minimum(np.arange(n_anos) + janela[..., None], n_anos)
+    soma = cum[..., fim] if fim.ndim == 1 else np.take_along_axis(cum, fim, axis=-1)
+    return soma - cum[..., :n_anos] - rendas[..., :n_anos]
+
+
+SCHOOL_MAX_AGE = 17
+
+
+class SchoolPriceIndex:
+    """Immutable school × age → annual price (BRL) table built from PREMISES.
+
+    Row 0 stands for "no school" (price 0); each school name gets a row
+    with its price for ages 0..SCHOOL_MAX_AGE, the first matching
+    idadeMin/idadeMax range winning as in the original per-year scan.
+    """
+
+    def __init__(self, escolas: Sequence[dict]):
+        ranges: Dict[str, List[Tuple[int, int, float]]] = {}
+        try:
+            for esc in escolas:
+                if all(k in esc for k in ["nome", "idadeMin", "idadeMax", "precoAnual"]):
+                    ranges.setdefault(esc["nome"], []).append(
+                        (int(esc["idadeMin"]), int(esc["idadeMax"]), float(esc["precoAnual"]))
+                    )
+        except (KeyError, ValueError, TypeError):
+            pass
+        self._ids = MappingProxyType({nome: row for row, nome in enumerate(sorted(ranges), start=1)})
+        prices = np.zeros((len(self._ids) + 1, SCHOOL_MAX_AGE + 1))
+        idades = np.arange(SCHOOL_MAX_AGE + 1)
+        for nome, row in self._ids.items():
+            livre = np.ones(SCHOOL_MAX_AGE + 1, dtype=bool)
+            for idadeMin, idadeMax, preco in ranges[nome]:
+                faixa = livre & (idades >= idadeMin) & (idades <= idadeMax)
+                prices[row, faixa] = preco
+                livre &= ~faixa
+        prices.setflags(write=False)
+        self.prices = prices
+
+    def school_id(self, nome: str) -> int:
+        """Row of ``nome`` in :attr:`prices`; 0 for empty or unknown schools."""
+        return self._ids.get(nome or "", 0)
+
+    def school_ids(self, nomes) -> np.ndarray:
+        """Vectorized :meth:`school_id` over an array of names (any shape)."""
+        nomes = np.asarray(nomes, dtype=object)
+        return np.array([self._ids.get(n or "", 0) for n in nomes.ravel()], dtype=int).reshape(nomes.shape)
+
+    def price(self, nome: str, idade: int) -> float:
+        """Annual price of ``nome`` at ``idade``; 0 outside 0..SCHOOL_MAX_AGE."""
+        if not 0 <= idade <= SCHOOL_MAX_AGE:
+            return 0.0
+        return float(self.prices[self.school_id(nome), idade])
+
+    def prices_for(self, ids: np.ndarray, idades: np.ndarray) -> np.ndarray:
+        """Prices for broadcastable arrays of school ids and ages."""
+        idades = np.asarray(idades)
+        em_idade = (idades >= 0) & (idades <= SCHOOL_MAX_AGE)
+        return np.where(em_idade, self.prices[ids, np.clip(idades, 0, SCHOOL_MAX_AGE)], 0.0)
+
+
+_SCHOOL_INDEX: Dict[str, object] = shared_resource("school_index", lambda: {"fingerprint": None, "index": None})
+
+
+def school_price_index() -> SchoolPriceIndex:
+    """Return the shared :class:`SchoolPriceIndex`, rebuilding it if the escolas premises changed."""
+    escolas = PREMISES.get("educacao", {}).get("escolas", [])
+    fingerprint = tuple(
+        (e.get("nome"), e.get("idadeMin"), e.get("idadeMax"), e.get("precoAnual")) for e in escolas
+    )
+    if fingerprint != _SCHOOL_INDEX["fingerprint"]:
+        _SCHOOL_INDEX.update(fingerprint=fingerprint, index=SchoolPriceIndex(escolas))
+    return _SCHOOL_INDEX["index"]
+
+
+class MacroPath:
+    """Deterministic inflation and FX series of one projection.
+
+    Built once per (BRL inflation, USD inflation, USD/BRL rate, horizon) and
+    shared by the expense engines, the patrimony projection and the charts.
+    Every series is a read-only array indexed by year (0 .. anos-1):
+
+    ``fator_brl`` / ``fator_usd``
+        Cumulative inflation factors, ``(1 + infl) ** ano``.
+    ``cotacoes``
+        USD/BRL path, ``cotacao * ((1 + infl_brl) / (1 + infl_usd)) ** ano``.
+    ``deflator``
+        ``1 / fator_brl``, turns nominal BRL into values of year 0.
+    ``fator_fx_display``
+        ``0.7 + 0.3 * fx_ratio ** ano``, the FX revaluation of a 70/30
+        endowment shown in BRL.
+    """
+
+    SERIES = ("fator_brl", "fator_usd", "cotacoes", "deflator", "fator_fx_display")
+
+    def __init__(self, infl_brl_pct: float, infl_usd_pct: float, cotacao_usd: float, anos: int):
+        self.infl_brl_pct = float(infl_brl_pct)
+        self.infl_usd_pct = float(infl_usd_pct)
+        self.cotacao_usd = float(cotacao_usd)
+        self.anos = int(anos)
+        infl_brl = 1 + self.infl_brl_pct / 100.0
+        infl_usd = 1 + self.infl_usd_pct / 100.0
+        self.fx_ratio = infl_brl / infl_usd if infl_usd != 0 else 1.0
+        t = np.arange(self.anos)
+        self.fator_brl = infl_brl ** t
+        self.fator_usd = infl_usd ** t
+        fx_ratio_t = self.fx_ratio ** t
+        self.cotacoes = self.cotacao_usd * fx_ratio_t
+        self.deflator = 1.0 / self.fator_brl
+        self.fator_fx_display = 0.7 + 0.3 * fx_ratio_t
+        for nome in self.SERIES:
+            getattr(self, nome).setflags(write=False)
+
+
+_MACRO_PATHS: "OrderedDict[Tuple[float, float, float, int], MacroPath]" = shared_resource("macro_paths", OrderedDict)
+_MACRO_PATHS_MAX = 256
+_MACRO_PATHS_LOCK = shared_resource("macro_paths_lock", threading.Lock)
+
+
+def macro_path(infl_brl_pct: float, infl_usd_pct: float, cotacao_usd: float, anos: int) -> MacroPath:
+    """Shared :class:`MacroPath` for the given premises (small LRU cache)."""
+    chave = (float(infl_brl_pct), float(infl_usd_pct), float(cotacao_usd), int(anos))
+    with _MACRO_PATHS_LOCK:
+        caminho = _MACRO_PATHS.get(chave)
+        if caminho is None:
+            caminho = _MACRO_PATHS[chave] = MacroPath(*chave)
+            while len(_MACRO_PATHS) > _MACRO_PATHS_MAX:
+                _MACRO_PATHS.popitem(last=False)
+        else:
+            _MACRO_PATHS.move_to_end(chave)
+    return caminho
+
+
+def macro_path_arrays(infl_brl_pct, infl_usd_pct, cotacao_usd, anos: int) -> Dict[str, np.ndarray]:
+    """Row-wise :class:`MacroPath` series, shape (N, anos), for arrays of premises.
+
+    Each distinct premise triple is looked up once in :func:`macro_path`.
+    """
+    chaves = np.column_stack(np.broadcast_arrays(
+        np.asarray(infl_brl_pct, dtype=float), np.asarray(infl_usd_pct, dtype=float), np.asarray(cotacao_usd, dtype=float)
+    ))
+    unicas, inversa = np.unique(chaves, axis=0, return_inverse=True)
+    caminhos = [macro_path(b, u, c, anos) for b, u, c in unicas]
+    return {nome: np.stack([getattr(p, nome) for p in caminhos])[inversa.ravel()] for nome in MacroPath.SERIES}
+
+
+# Assumptions of the stochastic macro scenarios (see MacroScenarioModel).  Vols of
+# inflation are in percentage points per year and the FX vol is that of the yearly
+# log change of USD/BRL; ``correlacao`` orders the shocks as (BRL inflation, USD
+# inflation, USD/BRL).
+MACRO_SCENARIO_PARAMS: Dict[str, object] = {
+    "vol_infl_brl": 2.0,
+    "vol_infl_usd": 1.0,
+    "vol_cambio": 0.12,
+    "persistencia": 0.6,
+    "correlacao": ((1.0, 0.3, 0.4), (0.3, 1.0, -0.1), (0.4, -0.1, 1.0)),
+}
+
+
+class MacroScenarioModel:
+    """Correlated stochastic paths of BRL inflation, USD inflation and USD/BRL.
+
+    Yearly inflation deviates from the premise (``infl_brl_pct`` /
+    ``infl_usd_pct``) by an AR(1) with coefficient ``persistencia``; the
+    USD/BRL rate moves with the inflation differential (as in
+    :class:`MacroPath`) times a mean-one lognormal shock.  The three yearly
+    shocks are correlated through the Cholesky factor of ``correlacao``
+    (ValueError if it is not positive definite).
+    With zero vols every path equals the deterministic :class:`MacroPath`.
+    Year 0 holds today's prices and rate; shocks start in year 1.
+    """
+
+    def __init__(
+        self,
+        infl_brl_pct: float,
+        infl_usd_pct: float,
+        cotacao_usd: float,
+        anos: int,
+        params: Dict[str, object] | None = None,
+    ):
+        params = {**MACRO_SCENARIO_PARAMS, **(params or {})}
+        self.anos = int(anos)
+        self.cotacao_usd = float(cotacao_usd)
+        self.media = np.array([float(infl_brl_pct), float(infl_usd_pct)]) / 100.0
+        self.vol_infl = np.array([float(params["vol_infl_brl"]), float(params["vol_infl_usd"])]) / 100.0
+        self.vol_cambio = float(params["vol_cambio"])
+        self.persistencia = float(params["persistencia"])
+        corr = AssetClassModel._checked_correlation(params["correlacao"], 3)
+        self.cholesky = np.linalg.cholesky(corr)
+
+    def scenarios(
+        self,
+        rng: np.random.Generator,
+        n: int,
+        variance_reduction: str = "none",
+        engines: Dict[Tuple[int, int], object] | None = None,
+    ) -> Dict[str, np.ndarray]:
+        """``n`` paths of every :attr:`MacroPath.SERIES`, each of shape (n × anos)."""
+        anos = self.anos
+        z = standard_normal_draws(rng, n, (max(anos - 1, 0), 3), variance_reduction, engines=engines) @ self.cholesky.T
+        taxas = np.empty((n, max(anos - 1, 0), 2))
+        desvio = np.zeros((n, 2))
+        for ano in range(anos - 1):
+            desvio = self.persistencia * desvio + self.vol_infl * z[:, ano, :2]
+            taxas[:, ano] = self.media + desvio
+        # Inflation is floored at -99% a year so price levels stay positive
+        crescimento = np.maximum(1 + taxas, 0.01)
+        choque_fx = np.exp(self.vol_cambio * z[:, :, 2] - 0.5 * self.vol_cambio**2)
+        um = np.ones((n, 1))
+        fator_brl = np.cumprod(np.concatenate([um, crescimento[:, :, 0]], axis=1), axis=1)
+        fator_usd = np.cumprod(np.concatenate([um, crescimento[:, :, 1]], axis=1), axis=1)
+        fx_ratio = np.cumprod(
+            np.concatenate([um, crescimento[:, :, 0] / crescimento[:, :, 1] * choque_fx], axis=1), axis=1
+        )
+        return {
+            "fator_brl": fator_brl,
+            "fator_usd": fator_usd,
+            "cotacoes": self.cotacao_usd * fx_ratio,
+            "deflator": 1.0 / fator_brl,
+            "fator_fx_display": 0.7 + 0.3 * fx_ratio,
+        }
+
+
+def compute_costs_and_incomes(
+    idade_cliente: int,
+    idade_conjuge: int,
+    idades_filhos: List[int],
+    escolas_filhos: List[str],
+    estudam_fora: List[bool],
+    bairro: str,
+    metragem: float,
+    n_carros: int,
+    estilo_vida: int,
+    n_viagens: int,
+    n_funcionarios: int,
+    luxo_mensal: float,
+    # Monthly cost of second residence (BRL).  Added as a separate
+    # recurring expense similar to luxury spending.  This parameter
+    # must precede all parameters with defaults; it is provided
+    # explicitly when the function is called.
+    segunda_resid_mensal: float,
+    # New income parameters
+    aluguel_mensal_brl: float,
+    aluguel_growth_brl: float,
+    aluguel_mensal_usd: float,
+    aluguel_growth_usd: float,
+    dividendos_brl: float,
+    divid_growth_brl: float,
+    dividendos_usd: float,
+    divid_growth_usd: float,
+    # Old extra parameters removed: renda_extra_mensal, dividendos_anuais, taxa_crescimento_dividendo
+    patrimonio_inicial: float,
+    filantropia_anual: float,
+    anos_proj: int,
+    infl_brl_pct: float,
+    infl_usd_pct: float,
+    cotacao_usd: float,
+    salario_anual0: float,
+    idade_aposentadoria: int,
+    # When True, indicates the user has no spouse.  Spouse age is
+    # ignored in projections and only one adult is counted for base
+    # expenses.  Default is False (assume spouse present when age > 0).
+    no_conjuge: bool = False,
+    scales: Dict[str, float] | None = None,
+    capital_guard_anos: int = CAPITAL_GUARD_YEARS,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, float]:
+    """Compute projected expenses (BRL & USD) and incomes.
+
+    Returns
+    -------
+    df_brl : DataFrame
+        Expenses in BRL by category and total.
+    df_usd : DataFrame
+        Expenses in USD by category and total.
+    df_incomes : DataFrame
+        Incomes (salary, dividends, extras, total) by year.
+    capital_guard : float
+        Amount allocated to the capital guard (sum of the first ``capital_guard_anos`` years of
+        expenses minus first year's income).
+    """
+    infl_brl = 1 + infl_brl_pct / 100.0
+
+    # Annual inflation factors and USD/BRL exchange rates.  The initial rate
+    # comes from user input and each subsequent year is adjusted by the
+    # relative inflation: BRL inflation divided by USD inflation.  This
+    # mirrors the requested formula: nova_cotacao = cotacao_anterior *
+    # (1 + infl_brl) / (1 + infl_usd).
+    macro = macro_path(infl_brl_pct, infl_usd_pct, cotacao_usd, anos_proj)
+    cotacoes = macro.cotacoes
+
+    anos = list(range(anos_proj))
+
+    # Validações e carregamento de dados de moradia
+    try:
+        bairros = {b["nome"]: b["precoM2"] for b in PREMISES.get("moradia", {}).get("bairros", [])
+                   if "nome" in b and "precoM2" in b}
+    except (KeyError, TypeError):
+        bairros = {}
+    preco_m2 = bairros.get(bairro, 0)
+
+    func_por_m2 = PREMISES.get("moradia", {}).get("funcionariosPor1000m2", 0) / 1000.0
+    base_func = max(1, math.ceil(metragem * func_por_m2))
+    custo_func = PREMISES.get("moradia", {}).get("custoFuncionario", 0)
+    custo_base_pessoa = PREMISES.get("moradia", {}).get("custoBasePorPessoa", 0)
+
+    # Validações e carregamento de dados de educação
+    escolas = school_price_index()
+    saude = health_table()
+
+    faculdade_br = PREMISES.get("educacao", {}).get("faculdade", {}).get("brasil", 0)
+    faculdade_ext = PREMISES.get("educacao", {}).get("faculdade", {}).get("exteriorUSD", 0)
+
+    # Validações e carregamento de dados de lifestyle
+    viagem_custos = PREMISES.get("lifestyle", {}).get("viagensInternacionais", {}).get("custoUSD", {})
+    if not isinstance(viagem_custos, dict):
+        viagem_custos = {"casal": 10000.0, "filho0a6": 2000.0, "filho7a12": 3000.0, "filho13mais": 5000.0}
+
+    estilos = PREMISES.get("lifestyle", {}).get("estilosDeVida", {})
+    if not estilos:
+        estilos = {1: {"casal": 20000.0, "porFilho": 5000.0},
+                   2: {"casal": 50000.0, "porFilho": 12000.0},
+                   3: {"casal": 100000.0, "porFilho": 25000.0}}
+
+    # Pega estilo configurado ou usa moderado (2) como padrão
+    estilo_cfg = estilos.get(estilo_vida, estilos.get(2, estilos.get(1, {})))
+
+
+    brl_rows = []
+    # We'll store only USD denominated expenses: overseas education and international trips.
+    usd_only_rows = []
+    incomes_rows = []
+
+    salario = salario_anual0
+
+    # Rastreia veículos adicionais para cada filho ao longo dos anos. Cada filho recebe
+    # um carro ao completar 18 anos (com custo de compra de 200k) e mantém o carro
+    # até completar 26 anos. Após 26, o carro é removido da contagem. O número de
+    # carros informado inicialmente em `n_carros` refere‑se aos veículos do casal.
+    veiculos_adicionais = [0] * len(idades_filhos)
+    for ano in anos:
+        infl_factor_brl = macro.fator_brl[ano]
+        infl_factor_usd = macro.fator_usd[ano]
+        # Determine current exchange rate for this year
+        cot_curr = cotacoes[ano]
+        idade_cli = idade_cliente + ano
+        # Compute spouse age for this year.  If the user has indicated
+        # no spouse, use zero to avoid adding health costs and extra base
+        # expenses.  Otherwise increment the provided age.
+        idade_conj = (idade_conjuge + ano) if not no_conjuge else 0
+        idades_f = [age + ano for age in idades_filhos]
+        # Moradia
+        valor_imovel = preco_m2 * metragem
+        custo_manut = valor_imovel * 0.02 * infl_factor_brl
+        # Combine cost of base employees and user-specified employees (each extra costs 48k/year)
+        custo_empregados = (base_func * custo_func + n_funcionarios * 48000) * infl_factor_brl
+        # Compute number of occupants: one adult client plus spouse (if present) plus children.
+        occupants = 1 + (0 if no_conjuge else 1) + len(idades_filhos)
+        custo_base = occupants * custo_base_pessoa * infl_factor_brl
+        custo_moradia_brl = custo_manut + custo_empregados + custo_base
+        # Educação & mesadas
+        custo_educ_brl = 0.0
+        custo_educ_usd = 0.0
+        custo_mesadas_brl = 0.0
+        for idx, idade_f in enumerate(idades_f):
+            esc_name = escolas_filhos[idx]
+            if idade_f <= 17 and esc_name:
+                custo_educ_brl += escolas.price(esc_name, idade_f) * infl_factor_brl
             if 18 <= idade_f <= 21:
                 if estudam_fora[idx]:
                     custo_educ_usd += faculdade_ext * infl_factor_usd
@@ -649,9 +1957,9 @@ def compute_costs_and_incomes(
                 custo_mesadas_brl += 2500 * 12 * infl_factor_brl
         # Saúde
         custo_saude_brl = (
-            health_cost_for_age(idade_cli)
-            + (0 if no_conjuge else health_cost_for_age(idade_conj))
-            + sum(health_cost_for_age(age) for age in idades_f if age < 26)
+            health_cost_for_age(idade_cli, saude)
+            + (0 if no_conjuge else health_cost_for_age(idade_conj, saude))
+            + sum(health_cost_for_age(age, saude) for age in idades_f if age < 26)
         ) * infl_factor_brl
         # Base health insurance cost of 10k per person per year.  Adjust number of people
         # according to presence of spouse.
@@ -781,37 +2089,500 @@ def compute_costs_and_incomes(
             "Total (R$)",
         ],
     )
-    # Only include USD categories for expenses actually denominated in USD: travel and overseas education
-    # Build USD DataFrame from the collected usd_only_rows
-    df_usd = pd.DataFrame(
-        usd_only_rows,
-        columns=["Ano", "Educação Exterior ($)", "Viagens Internacionais ($)", "Total ($)"],
+    # Only include USD categories for expenses actually denominated in USD: travel and overseas education
+    # Build USD DataFrame from the collected usd_only_rows
+    df_usd = pd.DataFrame(
+        usd_only_rows,
+        columns=["Ano", "Educação Exterior ($)", "Viagens Internacionais ($)", "Total ($)"],
+    )
+    df_incomes = pd.DataFrame(
+        incomes_rows,
+        columns=[
+            "Ano",
+            "Salário (R$)",
+            "Aluguéis BRL (R$)",
+            "Aluguéis USD (R$)",
+            "Dividendos BRL (R$)",
+            "Dividendos USD (R$)",
+            "Total Renda (R$)",
+        ],
+    )
+    # Compute capital guard
+    diff_cg = capital_guard_requirements(df_brl["Total (R$)"], df_incomes["Total Renda (R$)"], capital_guard_anos)[0]
+    # If the difference between expenses of the first capital_guard_anos years and first year income
+    # is less than the expenses of the first year, set the capital guard to
+    # 10% of investible patrimony; otherwise use the difference.
+    primeira_despesa = df_brl["Total (R$)"].iloc[0]
+    if diff_cg < primeira_despesa:
+        capital_guard = patrimonio_inicial * 0.10
+    else:
+        capital_guard = diff_cg
+    return df_brl, df_usd, df_incomes, capital_guard
+
+
+# Column layout of the DataFrames returned by the projection engines (besides "Ano").
+BRL_EXPENSE_COLUMNS = [
+    "Moradia (R$)",
+    "Educação (R$)",
+    "Saúde (R$)",
+    "Veículos (R$)",
+    "Lifestyle (R$)",
+    "Viagens Internacionais (R$)",
+    "Segunda Residência (R$)",
+    "Ativos de Luxo (R$)",
+    "Filantropia (R$)",
+    "Total (R$)",
+]
+USD_EXPENSE_COLUMNS = ["Educação Exterior ($)", "Viagens Internacionais ($)", "Total ($)"]
+INCOME_COLUMNS = [
+    "Salário (R$)",
+    "Aluguéis BRL (R$)",
+    "Aluguéis USD (R$)",
+    "Dividendos BRL (R$)",
+    "Dividendos USD (R$)",
+    "Total Renda (R$)",
+]
+
+# Keys of the ``scales`` dict understood by the projection engines.
+EXPENSE_SCALE_KEYS = ("moradia", "educacao_brl", "educacao_usd", "saude", "veiculos", "lifestyle", "viagens_usd")
+
+
+# Per-holding lists of the illiquid assets, in the order of the session inputs.
+ILIQUIDO_KEYS = ("iliquido_vals_brl", "iliquido_growth_brl", "iliquido_vals_usd", "iliquido_growth_usd")
+
+
+def _columnar_inputs(columns: Dict[str, Sequence]) -> Dict[str, np.ndarray]:
+    """Convert columns of client parameters into the arrays used by the engine.
+
+    ``columns`` maps each argument name of :func:`compute_costs_and_incomes`
+    to a sequence with one entry per client.  Scalars become (N,) float
+    arrays; the per‑child lists are padded into (N × max_children) arrays
+    with a validity mask; bairro, lifestyle and school names are resolved
+    against ``PREMISES`` once per client instead of once per year.  The
+    illiquid-asset lists are padded into (N × max_holdings) arrays.
+    """
+    n = len(columns["idade_cliente"])
+
+    def col(name: str, default: float = 0.0) -> np.ndarray:
+        if name not in columns:
+            return np.full(n, default, dtype=float)
+        return np.array([default if v is None else v for v in columns[name]], dtype=float)
+
+    inp: Dict[str, np.ndarray] = {
+        name: col(name)
+        for name in (
+            "idade_cliente", "idade_conjuge", "metragem", "n_carros", "n_viagens", "n_funcionarios",
+            "luxo_mensal", "segunda_resid_mensal", "aluguel_mensal_brl", "aluguel_growth_brl",
+            "aluguel_mensal_usd", "aluguel_growth_usd", "dividendos_brl", "divid_growth_brl",
+            "dividendos_usd", "divid_growth_usd", "patrimonio_inicial", "filantropia_anual",
+            "infl_brl_pct", "infl_usd_pct", "cotacao_usd", "salario_anual0", "idade_aposentadoria",
+        )
+    }
+    inp["no_conjuge"] = col("no_conjuge").astype(bool)
+    inp["capital_guard_anos"] = col("capital_guard_anos", CAPITAL_GUARD_YEARS).astype(int)
+
+    # Moradia
+    try:
+        bairros = {b["nome"]: b["precoM2"] for b in PREMISES.get("moradia", {}).get("bairros", [])
+                   if "nome" in b and "precoM2" in b}
+    except (KeyError, TypeError):
+        bairros = {}
+    inp["preco_m2"] = np.array([bairros.get(b, 0) for b in columns["bairro"]], dtype=float)
+
+    # Lifestyle
+    estilos = PREMISES.get("lifestyle", {}).get("estilosDeVida", {})
+    if not estilos:
+        estilos = {1: {"casal": 20000.0, "porFilho": 5000.0},
+                   2: {"casal": 50000.0, "porFilho": 12000.0},
+                   3: {"casal": 100000.0, "porFilho": 25000.0}}
+    estilo_cfgs = [estilos.get(e, estilos.get(2, estilos.get(1, {}))) for e in columns["estilo_vida"]]
+    inp["estilo_casal"] = np.array([cfg.get("casal", 0.0) for cfg in estilo_cfgs], dtype=float)
+    inp["estilo_por_filho"] = np.array([cfg.get("porFilho", 0.0) for cfg in estilo_cfgs], dtype=float)
+
+    # Children, padded to the largest family in the batch
+    idades = [list(v or []) for v in columns["idades_filhos"]]
+    escolas = [list(v or []) for v in columns["escolas_filhos"]]
+    fora = [list(v or []) for v in columns["estudam_fora"]]
+    max_filhos = max((len(v) for v in idades), default=0)
+    inp["idades_filhos"] = np.zeros((n, max_filhos), dtype=int)
+    inp["filhos_validos"] = np.zeros((n, max_filhos), dtype=bool)
+    inp["estudam_fora"] = np.zeros((n, max_filhos), dtype=bool)
+    escola_nomes = np.full((n, max_filhos), "", dtype=object)
+    for i, ages in enumerate(idades):
+        k = len(ages)
+        inp["idades_filhos"][i, :k] = ages
+        inp["filhos_validos"][i, :k] = True
+        inp["estudam_fora"][i, :k] = [bool(f) for f in fora[i][:k]]
+        escola_nomes[i, :k] = [e or "" for e in escolas[i][:k]]
+    # School id per child into the shared price index (row 0 means "no school").
+    inp["escola_idx"] = school_price_index().school_ids(escola_nomes)
+
+    inp.update(_iliquido_columns(columns, n))
+    inp.update(_scale_columns(columns.get("scales", [None] * n)))
+    return inp
+
+
+def _iliquido_columns(columns: Dict[str, Sequence], n: int) -> Dict[str, np.ndarray]:
+    """Illiquid-holding lists as (N × max_holdings) arrays, one per key of ``ILIQUIDO_KEYS``.
+
+    Shorter lists are padded with zero-valued holdings; only clients with
+    ``has_iliquido`` set contribute any.
+    """
+    tem_iliquido = columns.get("has_iliquido", [False] * n)
+    iliquidos = []
+    for i in range(n):
+        listas = [list(columns[nome][i] or []) if nome in columns else [] for nome in ILIQUIDO_KEYS]
+        k = min(len(lista) for lista in listas) if tem_iliquido[i] else 0
+        iliquidos.append([lista[:k] for lista in listas])
+    max_iliquidos = max((len(listas[0]) for listas in iliquidos), default=0)
+    saida = {}
+    for j, nome in enumerate(ILIQUIDO_KEYS):
+        saida[nome] = np.zeros((n, max_iliquidos), dtype=float)
+        for i, listas in enumerate(iliquidos):
+            saida[nome][i, : len(listas[j])] = listas[j]
+    return saida
+
+
+def _scale_columns(scales: Sequence[Dict[str, float] | None]) -> Dict[str, np.ndarray]:
+    """One ``scale_<key>`` array (N,) per key of ``EXPENSE_SCALE_KEYS``; missing keys are 1."""
+    return {
+        f"scale_{key}": np.array([(s or {}).get(key, 1.0) for s in scales], dtype=float)
+        for key in EXPENSE_SCALE_KEYS
+    }
+
+
+def _expenses_incomes_arrays(
+    inp: Dict[str, np.ndarray], anos_proj: int, macro: Dict[str, np.ndarray] | None = None
+) -> Dict[str, np.ndarray]:
+    """Evaluate every expense and income category for all clients at once.
+
+    ``inp`` is the output of :func:`_columnar_inputs`.  Returns a dict of
+    (N × years) arrays keyed like the DataFrame columns produced by
+    :func:`compute_costs_and_incomes`, plus the USD categories, the
+    year‑by‑year FX path and the initial capital guard (N,).  ``macro``
+    is passed on to :func:`_unscaled_expenses_incomes`.
+    """
+    return _apply_expense_scales(_unscaled_expenses_incomes(inp, anos_proj, macro), inp)
+
+
+def _unscaled_expenses_incomes(
+    inp: Dict[str, np.ndarray], anos_proj: int, macro: Dict[str, np.ndarray] | None = None
+) -> Dict[str, np.ndarray]:
+    """Expense categories before the ``scales`` multipliers, plus incomes.
+
+    The scalable categories are keyed by ``EXPENSE_SCALE_KEYS`` (education
+    split into its BRL and USD parts); the fixed ones, the income columns,
+    the FX path, ``patrimonio_inicial`` and ``capital_guard_anos`` are carried along so that
+    :func:`_apply_expense_scales` can produce the final columns without
+    touching the inputs again.
+
+    ``macro`` replaces the deterministic ``fator_brl``, ``fator_usd`` and
+    ``cotacoes`` of :class:`MacroPath` (e.g. with
+    :meth:`MacroScenarioModel.scenarios`).  Its arrays broadcast against
+    the client axis, so a single client (N = 1) with P macro paths yields
+    P rows; income columns that do not depend on the macro path then stay
+    (1 × years).
+    """
+    n_anos = int(anos_proj)
+    t = np.arange(n_anos)
+    # Inflation factors and FX path (cotacao * ((1+infl_brl)/(1+infl_usd))**ano)
+    if macro is None:
+        macro = macro_path_arrays(inp["infl_brl_pct"], inp["infl_usd_pct"], inp["cotacao_usd"], n_anos)
+    infl_factor_brl = macro["fator_brl"]
+    infl_factor_usd = macro["fator_usd"]
+    cot = macro["cotacoes"]
+
+    # Children ages for every year: shape (N, years, children)
+    validos = inp["filhos_validos"][:, None, :]
+    n_filhos = inp["filhos_validos"].sum(axis=1)
+    idades_f0 = inp["idades_filhos"][:, None, :]
+    idades_f = idades_f0 + t[None, :, None]
+    fora = inp["estudam_fora"][:, None, :]
+
+    # Moradia
+    moradia = PREMISES.get("moradia", {})
+    func_por_m2 = moradia.get("funcionariosPor1000m2", 0) / 1000.0
+    base_func = np.maximum(1, np.ceil(inp["metragem"] * func_por_m2))
+    occupants = 1 + np.where(inp["no_conjuge"], 0, 1) + n_filhos
+    custo_moradia_brl = (
+        inp["preco_m2"] * inp["metragem"] * 0.02
+        + (base_func * moradia.get("custoFuncionario", 0) + inp["n_funcionarios"] * 48000)
+        + occupants * moradia.get("custoBasePorPessoa", 0)
+    )[:, None] * infl_factor_brl
+
+    # Educação
+    faculdade = PREMISES.get("educacao", {}).get("faculdade", {})
+    na_escola = validos & (idades_f <= 17)
+    escola_anual = np.where(
+        na_escola, school_price_index().prices_for(inp["escola_idx"][:, None, :], idades_f), 0.0
+    )
+    faculdade_idade = validos & (idades_f >= 18) & (idades_f <= 21)
+    custo_educ_brl = (
+        escola_anual.sum(axis=2)
+        + faculdade.get("brasil", 0) * (faculdade_idade & ~fora).sum(axis=2)
+    ) * infl_factor_brl
+    custo_educ_usd = faculdade.get("exteriorUSD", 0) * (faculdade_idade & fora).sum(axis=2) * infl_factor_usd
+    mesadas = np.select(
+        [validos & (idades_f >= 10) & (idades_f <= 13), na_escola & (idades_f >= 14), faculdade_idade],
+        [500 * 12, 1500 * 12, 2500 * 12],
+        default=0,
     )
-    df_incomes = pd.DataFrame(
-        incomes_rows,
-        columns=[
-            "Ano",
-            "Salário (R$)",
-            "Aluguéis BRL (R$)",
-            "Aluguéis USD (R$)",
-            "Dividendos BRL (R$)",
-            "Dividendos USD (R$)",
-            "Total Renda (R$)",
-        ],
+    custo_mesadas_brl = mesadas.sum(axis=2) * infl_factor_brl
+
+    # Saúde: index the compiled age table with the age arrays
+    idades_cli = inp["idade_cliente"].astype(int)[:, None] + t
+    idades_conj = inp["idade_conjuge"].astype(int)[:, None] + t
+    saude = health_table()
+    saude_filhos = np.where(validos & (idades_f < 26), health_costs_for_ages(idades_f, saude), 0.0).sum(axis=2)
+    saude_conj = np.where(inp["no_conjuge"][:, None], 0.0, health_costs_for_ages(idades_conj, saude))
+    custo_saude_brl = (
+        health_costs_for_ages(idades_cli, saude) + saude_conj + saude_filhos
+        + (occupants * 10000)[:, None]
+    ) * infl_factor_brl
+
+    # Veículos: a child gets a car in the year they turn 18 and keeps it until 26.
+    # Children already older than 18 at year 0 never receive one.
+    compra = (validos & (idades_f == 18)).sum(axis=2)
+    com_carro = (validos & (idades_f0 <= 18) & (idades_f >= 18) & (idades_f <= 25)).sum(axis=2)
+    gasto_veiculo = PREMISES.get("veiculos", {}).get("gastoAnualPorVeiculo", 0)
+    custo_veic_brl = ((inp["n_carros"][:, None] + com_carro) * gasto_veiculo + compra * 200_000) * infl_factor_brl
+
+    # Lifestyle
+    custo_lifestyle_brl = (
+        inp["estilo_casal"] + inp["estilo_por_filho"] * n_filhos
+    )[:, None] * infl_factor_brl + custo_mesadas_brl
+
+    # Viagens internacionais (USD)
+    viagem_custos = PREMISES.get("lifestyle", {}).get("viagensInternacionais", {}).get("custoUSD", {})
+    if not isinstance(viagem_custos, dict):
+        viagem_custos = {"casal": 10000.0, "filho0a6": 2000.0, "filho7a12": 3000.0, "filho13mais": 5000.0}
+    custo_filho_viagem = np.select(
+        [~validos, idades_f <= 6, idades_f <= 12],
+        [0.0, viagem_custos["filho0a6"], viagem_custos["filho7a12"]],
+        default=viagem_custos["filho13mais"],
     )
-    # Compute capital guard
-    gastos_4anos = df_brl["Total (R$)"].iloc[: min(4, anos_proj)].sum()
-    ganho_primeiro_ano = df_incomes["Total Renda (R$)"].iloc[0]
-    diff_cg = gastos_4anos - ganho_primeiro_ano
-    # If the difference between expenses of the first four years and first year income
-    # is less than the expenses of the first year, set the capital guard to
-    # 10% of investible patrimony; otherwise use the difference.
-    primeira_despesa = df_brl["Total (R$)"].iloc[0]
-    if diff_cg < primeira_despesa:
-        capital_guard = patrimonio_inicial * 0.10
-    else:
-        capital_guard = diff_cg
-    return df_brl, df_usd, df_incomes, capital_guard
+    trip = viagem_custos["casal"] + custo_filho_viagem.sum(axis=2)
+    custo_viagens_usd = inp["n_viagens"][:, None] * trip * infl_factor_usd
+
+    luxo_brl = (inp["luxo_mensal"] * 12.0)[:, None] * infl_factor_brl
+    seg_resid_brl = (inp["segunda_resid_mensal"] * 12.0)[:, None] * infl_factor_brl
+    fil_brl = inp["filantropia_anual"][:, None] * infl_factor_brl
+
+    # Rendas
+    sal = np.where(
+        idades_cli < inp["idade_aposentadoria"][:, None],
+        inp["salario_anual0"][:, None] * infl_factor_brl,
+        0.0,
+    )
+    aluguel_brl = (inp["aluguel_mensal_brl"] * 12)[:, None] * (1 + inp["aluguel_growth_brl"][:, None] / 100.0) ** t
+    aluguel_usd_brl = (inp["aluguel_mensal_usd"] * 12)[:, None] * (1 + inp["aluguel_growth_usd"][:, None] / 100.0) ** t * cot
+    dividendos_brl_ano = inp["dividendos_brl"][:, None] * (1 + inp["divid_growth_brl"][:, None] / 100.0) ** t
+    dividendos_usd_brl_ano = inp["dividendos_usd"][:, None] * (1 + inp["divid_growth_usd"][:, None] / 100.0) ** t * cot
+    total_renda = sal + aluguel_brl + aluguel_usd_brl + dividendos_brl_ano + dividendos_usd_brl_ano
+
+    return {
+        "moradia": custo_moradia_brl,
+        "educacao_brl": custo_educ_brl,
+        "educacao_usd": custo_educ_usd,
+        "saude": custo_saude_brl,
+        "veiculos": custo_veic_brl,
+        "lifestyle": custo_lifestyle_brl,
+        "viagens_usd": custo_viagens_usd,
+        "Segunda Residência (R$)": seg_resid_brl,
+        "Ativos de Luxo (R$)": luxo_brl,
+        "Filantropia (R$)": fil_brl,
+        "Salário (R$)": sal,
+        "Aluguéis BRL (R$)": aluguel_brl,
+        "Aluguéis USD (R$)": aluguel_usd_brl,
+        "Dividendos BRL (R$)": dividendos_brl_ano,
+        "Dividendos USD (R$)": dividendos_usd_brl_ano,
+        "Total Renda (R$)": total_renda,
+        "cotacoes": cot,
+        "patrimonio_inicial": inp["patrimonio_inicial"],
+        "capital_guard_anos": inp["capital_guard_anos"],
+    }
+
+
+def _apply_expense_scales(base: Dict[str, np.ndarray], escalas: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Apply the ``scales`` multipliers to unscaled categories and total them.
+
+    ``base`` comes from :func:`_unscaled_expenses_incomes` and ``escalas``
+    holds one ``scale_<key>`` array (N,) per key of ``EXPENSE_SCALE_KEYS``
+    (see :func:`_scale_columns`).  Only a few vector multiplies and sums
+    are needed, so a change of scales does not rerun the year loop.
+    """
+    cot = base["cotacoes"]
+    sc = {key: escalas[f"scale_{key}"][:, None] for key in EXPENSE_SCALE_KEYS}
+    custo_educ_usd = base["educacao_usd"] * sc["educacao_usd"]
+    custo_viagens_usd = base["viagens_usd"] * sc["viagens_usd"]
+    custo_educ_total_brl = base["educacao_brl"] * sc["educacao_brl"] + custo_educ_usd * cot
+    viagens_brl = custo_viagens_usd * cot
+    res = {
+        "Moradia (R$)": base["moradia"] * sc["moradia"],
+        "Educação (R$)": custo_educ_total_brl,
+        "Saúde (R$)": base["saude"] * sc["saude"],
+        "Veículos (R$)": base["veiculos"] * sc["veiculos"],
+        "Lifestyle (R$)": base["lifestyle"] * sc["lifestyle"],
+        "Viagens Internacionais (R$)": viagens_brl,
+        "Segunda Residência (R$)": base["Segunda Residência (R$)"],
+        "Ativos de Luxo (R$)": base["Ativos de Luxo (R$)"],
+        "Filantropia (R$)": base["Filantropia (R$)"],
+    }
+    total_brl = (
+        res["Moradia (R$)"]
+        + custo_educ_total_brl
+        + res["Saúde (R$)"]
+        + res["Veículos (R$)"]
+        + res["Lifestyle (R$)"]
+        + res["Segunda Residência (R$)"]
+        + res["Ativos de Luxo (R$)"]
+        + res["Filantropia (R$)"]
+    ) + viagens_brl
+    res["Total (R$)"] = total_brl
+    res["Educação Exterior ($)"] = custo_educ_usd
+    res["Viagens Internacionais ($)"] = custo_viagens_usd
+    res["Total ($)"] = custo_educ_usd + custo_viagens_usd
+    for col in INCOME_COLUMNS:
+        res[col] = base[col]
+    res["cotacoes"] = cot
+    # Capital guard: same rule as compute_costs_and_incomes
+    total_renda = base["Total Renda (R$)"]
+    diff_cg = capital_guard_requirements(total_brl, total_renda, base["capital_guard_anos"])[:, 0]
+    res["capital_guard"] = np.where(diff_cg < total_brl[:, 0], base["patrimonio_inicial"] * 0.10, diff_cg)
+    return res
+
+
+def _expense_frames(res: Dict[str, np.ndarray], row: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, float]:
+    """Build the ``compute_costs_and_incomes`` outputs for one client of ``res``."""
+    ano_col = np.arange(1, res["Total (R$)"].shape[1] + 1)
+    df_brl = pd.DataFrame({"Ano": ano_col, **{c: res[c][row] for c in BRL_EXPENSE_COLUMNS}})
+    df_usd = pd.DataFrame({"Ano": ano_col, **{c: res[c][row] for c in USD_EXPENSE_COLUMNS}})
+    df_incomes = pd.DataFrame({"Ano": ano_col, **{c: res[c][row] for c in INCOME_COLUMNS}})
+    return df_brl, df_usd, df_incomes, float(res["capital_guard"][row])
+
+
+def compute_costs_and_incomes_vectorized(
+    idade_cliente: int,
+    idade_conjuge: int,
+    idades_filhos: List[int],
+    escolas_filhos: List[str],
+    estudam_fora: List[bool],
+    bairro: str,
+    metragem: float,
+    n_carros: int,
+    estilo_vida: int,
+    n_viagens: int,
+    n_funcionarios: int,
+    luxo_mensal: float,
+    segunda_resid_mensal: float,
+    aluguel_mensal_brl: float,
+    aluguel_growth_brl: float,
+    aluguel_mensal_usd: float,
+    aluguel_growth_usd: float,
+    dividendos_brl: float,
+    divid_growth_brl: float,
+    dividendos_usd: float,
+    divid_growth_usd: float,
+    patrimonio_inicial: float,
+    filantropia_anual: float,
+    anos_proj: int,
+    infl_brl_pct: float,
+    infl_usd_pct: float,
+    cotacao_usd: float,
+    salario_anual0: float,
+    idade_aposentadoria: int,
+    no_conjuge: bool = False,
+    scales: Dict[str, float] | None = None,
+    capital_guard_anos: int = CAPITAL_GUARD_YEARS,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, float]:
+    """Vectorized equivalent of :func:`compute_costs_and_incomes`.
+
+    Takes exactly the same arguments and returns the same ``df_brl``,
+    ``df_usd``, ``df_incomes`` and capital guard.  Instead of looping over
+    the projection years, every category is computed at once as a
+    (years,) or (years × children) NumPy array: inflation factors are
+    obtained with a single ``power`` call and the per‑child rules
+    (school, university, allowances, cars, trips and health) become
+    boolean masks over the matrix of children's ages.  The loop version
+    is kept as the reference implementation.
+    """
+    args = dict(locals())
+    anos_proj = int(args.pop("anos_proj"))
+    return _expense_frames(_expenses_incomes_arrays(_columnar_inputs({k: [v] for k, v in args.items()}), anos_proj))
+
+
+def _despesas_macro_shard(
+    n: int,
+    seed_seq: np.random.SeedSequence,
+    chunk_size: int,
+    inp: Dict[str, np.ndarray],
+    modelo: MacroScenarioModel,
+    variance_reduction: str = "none",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Spending and net cash (n × years) of one client under ``n`` macro paths."""
+    rng = np.random.default_rng(seed_seq)
+    gastos = np.empty((n, modelo.anos))
+    fluxo = np.empty((n, modelo.anos))
+    engines: Dict[Tuple[int, int], object] = {}
+    for inicio in range(0, n, chunk_size):
+        m = min(chunk_size, n - inicio)
+        res = _expenses_incomes_arrays(inp, modelo.anos, modelo.scenarios(rng, m, variance_reduction, engines))
+        gastos[inicio : inicio + m] = res["Total (R$)"]
+        fluxo[inicio : inicio + m] = res["Total Renda (R$)"] - res["Total (R$)"]
+    return gastos, fluxo
+
+
+def simular_despesas_macro(
+    inputs: Dict[str, object],
+    n_sim: int = 5000,
+    seed: int = MC_SEED,
+    chunk_size: int = 1000,
+    workers: int = 1,
+    variance_reduction: str = "none",
+    params: Dict[str, object] | None = None,
+    memory_budget: int | None = None,
+    on_budget: str = "chunk",
+) -> pd.DataFrame:
+    """Bands of yearly spending and net cash under stochastic inflation and FX.
+
+    ``inputs`` are the projection inputs of a client (see
+    :func:`run_projections`).  Paths of BRL inflation, USD inflation and
+    USD/BRL are drawn by :class:`MacroScenarioModel` (assumptions in
+    ``MACRO_SCENARIO_PARAMS``, overridable with ``params``) and the
+    vectorized expense engine is evaluated over ``chunk_size`` paths at a
+    time; shards, seeds and the memory budget work as in
+    :func:`simular_patrimonio_monte_carlo`.
+
+    Returns
+    -------
+    DataFrame
+        Columns: Ano, Gastos P10/P50/P90 (R$) and Fluxo Líquido P10/P50/P90
+        (R$), nominal BRL per year.
+    """
+    n_anos = int(inputs["anos_proj"])
+    n_sim = int(n_sim)
+    chunk_size = fit_monte_carlo_chunk(
+        "despesas_macro", n_sim, n_anos, max(1, int(chunk_size)), workers, "float64", memory_budget, on_budget
+    )
+    columns = {key: [value] for key, value in inputs.items()}
+    columns["no_conjuge"] = [bool(inputs.get("nao_tem_conjuge", False))]
+    modelo = MacroScenarioModel(inputs["infl_brl_pct"], inputs["infl_usd_pct"], inputs["cotacao_usd"], n_anos, params)
+    shards = run_monte_carlo_shards(
+        _despesas_macro_shard, n_sim, seed, workers, chunk_size, _columnar_inputs(columns), modelo, variance_reduction
+    )
+    gastos = shards[0][0] if len(shards) == 1 else np.concatenate([g for g, _ in shards])
+    fluxo = shards[0][1] if len(shards) == 1 else np.concatenate([f for _, f in shards])
+    g10, g50, g90 = np.percentile(gastos, [10, 50, 90], axis=0)
+    f10, f50, f90 = np.percentile(fluxo, [10, 50, 90], axis=0)
+    return pd.DataFrame({
+        "Ano": np.arange(1, n_anos + 1),
+        "Gastos P10 (R$)": g10,
+        "Gastos P50 (R$)": g50,
+        "Gastos P90 (R$)": g90,
+        "Fluxo Líquido P10 (R$)": f10,
+        "Fluxo Líquido P50 (R$)": f50,
+        "Fluxo Líquido P90 (R$)": f90,
+    })
 
 
 def compute_patrimony_dynamic(
@@ -828,13 +2599,14 @@ def compute_patrimony_dynamic(
     cotacao_usd: float,
     net_cash: List[float] | None = None,
     aspirational_series: List[float] | None = None,
+    capital_guard_anos: int = CAPITAL_GUARD_YEARS,
 ) -> pd.DataFrame:
     """Compute patrimony evolution with dynamic capital guard and aspirational growth.
 
     This version recomputes the required capital guard at the start of each
-    year based on the projected expenses of the next four years and the
-    current investible patrimony.  If the difference between the sum of the
-    next four years' expenses and the current year's income is less than
+    year based on the projected expenses of the next ``capital_guard_anos``
+    years (four by default) and the current investible patrimony.  If the
+    difference between the sum of those years' expenses and the current year's income is less than
     the expenses of the current year, the required capital guard is set to
     10% of the investible patrimony.  Otherwise it is the computed
     difference.  The endowment grows at the expected return given the
@@ -879,6 +2651,8 @@ def compute_patrimony_dynamic(
         Precomputed aspirational amounts for each year.  When provided, these values
         override the growth given by ``aspirational_growth_pct`` and are used directly
         for each year of the projection.
+    capital_guard_anos : int, optional
+        Years of expenses the capital guard must cover (``CAPITAL_GUARD_YEARS``).
 
     Returns
     -------
@@ -898,11 +2672,12 @@ def compute_patrimony_dynamic(
     cap_growth_factor = 1 + capital_growth_pct / 100.0
     # Aspirational growth factor
     asp_growth_factor = 1 + aspirational_growth_pct / 100.0
+    # Expenses of the next ``capital_guard_anos`` years minus income, for every year
+    n_req = max(anos_proj, len(df_brl_totals))
+    gastos_req = list(df_brl_totals) + [0.0] * (n_req - len(df_brl_totals))
+    diffs = capital_guard_requirements(gastos_req, df_incomes_totals[:n_req], capital_guard_anos).tolist()
     # Compute initial required capital guard based on expenses and incomes for year 0
-    # Sum expenses from year 0 to year 3 (max 4 years)
-    sum_exp0 = sum(df_brl_totals[:4]) if df_brl_totals else 0.0
-    income0 = df_incomes_totals[0] if df_incomes_totals else 0.0
-    diff0 = sum_exp0 - income0
+    diff0 = diffs[0] if diffs else 0.0
     first_expense0 = df_brl_totals[0] if df_brl_totals else 0.0
     # Investible patrimony at start is patrimonio_inicial
     if diff0 < first_expense0:
@@ -920,8 +2695,8 @@ def compute_patrimony_dynamic(
     asps: List[float] = []
     ends: List[float] = []
     totals: List[float] = []
-    # Precompute FX ratio for USD projection
-    fx_ratio = (1 + infl_brl_pct / 100.0) / (1 + infl_usd_pct / 100.0) if (1 + infl_usd_pct / 100.0) != 0 else 1.0
+    # FX display factor of the endowment for every year
+    fator_fx_display = macro_path(infl_brl_pct, infl_usd_pct, cotacao_usd, anos_proj).fator_fx_display
     # Ensure net_cash length
     net_cash_local = list(net_cash) if net_cash is not None else [0.0] * anos_proj
     if len(net_cash_local) < anos_proj:
@@ -936,7 +2711,7 @@ def compute_patrimony_dynamic(
         caps.append(cap)
         asps.append(current_asp)
         # Apply currency adjustment for endowment display: 70% BRL + 30% USD*FX
-        factor_fx_display = 0.7 + 0.3 * (fx_ratio ** i)
+        factor_fx_display = fator_fx_display[i]
         ends.append(end * factor_fx_display)
         totals.append(cap + current_asp + end * factor_fx_display)
         # Update aspirational for next year
@@ -955,10 +2730,8 @@ def compute_patrimony_dynamic(
         matured_end = (end + netcash_i) * (1 + 0.7 * mu_dom + 0.3 * mu_int)
         # Compute current investible patrimony (after returns)
         investible_i = matured_cap + matured_end
-        # Compute required capital guard for next year based on next 4 years of expenses and current income
-        sum_exp_i4 = sum(df_brl_totals[i : i + 4]) if df_brl_totals else 0.0
-        income_i = df_incomes_totals[i] if i < len(df_incomes_totals) else 0.0
-        diff_i = sum_exp_i4 - income_i
+        # Compute required capital guard for next year based on the upcoming expenses and current income
+        diff_i = diffs[i]
         first_expense_i = df_brl_totals[i] if i < len(df_brl_totals) else 0.0
         if diff_i < first_expense_i:
             req_cap_i = investible_i * 0.10
@@ -983,7 +2756,993 @@ def compute_patrimony_dynamic(
             "Patrimônio Total (R$)": totals,
         }
     )
-    return df_pat
+    return df_pat
+
+
+def _patrimony_initial_split(
+    patrimonio_inicial: np.ndarray, diffs: np.ndarray, df_brl_totals: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Initial (capital guard, endowment) split of :func:`compute_patrimony_dynamic`."""
+    diff0 = diffs[:, 0]
+    cap = np.where(diff0 < df_brl_totals[:, 0], patrimonio_inicial * 0.10, diff0)
+    return cap, np.maximum(patrimonio_inicial - cap, 0.0)
+
+
+def _patrimony_step(
+    cap: np.ndarray,
+    end: np.ndarray,
+    i: int,
+    rets_i: np.ndarray,
+    cap_growth_factor: np.ndarray | float,
+    diffs: np.ndarray,
+    df_brl_totals: np.ndarray,
+    net_cash: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Rebalance year ``i``: next (capital guard, endowment) and the paths whose endowment ran out.
+
+    Yearly series are (N × years) or (1 × years) when shared by every path.
+    """
+    matured_cap = cap * cap_growth_factor
+    matured_end = (end + net_cash[:, i]) * (1 + rets_i)
+    investible_i = matured_cap + matured_end
+    diff_i = diffs[:, i]
+    req_cap_i = np.where(diff_i < df_brl_totals[:, i], investible_i * 0.10, diff_i)
+    req_cap_i = np.maximum(req_cap_i, 0.0)
+    end = matured_end - (req_cap_i - matured_cap)
+    return req_cap_i, np.maximum(end, 0.0), end < 0.0
+
+
+def _patrimony_dynamic_arrays(
+    patrimonio_inicial: np.ndarray,
+    aspirational: np.ndarray,
+    capital_growth_pct: np.ndarray,
+    endowment_returns: np.ndarray,
+    df_brl_totals: np.ndarray,
+    df_incomes_totals: np.ndarray,
+    net_cash: np.ndarray,
+    fator_fx_display: np.ndarray,
+    capital_guard_anos: int = CAPITAL_GUARD_YEARS,
+) -> Dict[str, np.ndarray]:
+    """Run the :func:`compute_patrimony_dynamic` recurrence for N clients at once.
+
+    Every argument carries a leading client axis: scalars are (N,) and
+    yearly series are (N × years).  ``fator_fx_display`` is the
+    :attr:`MacroPath.fator_fx_display` series of each client (N × years)
+    and ``capital_guard_anos`` a shared window or one per client (N,).
+    ``aspirational`` is the full
+    aspirational series (as passed via ``aspirational_series`` in the
+    Streamlit flow).  ``endowment_returns`` is either the blended 70/30
+    expected return (N,) or one return per year (N × years), which is how
+    the Monte Carlo feeds simulated paths through the same rebalancing.
+    The years are still stepped sequentially because each rebalancing
+    depends on the previous one, but each step is a handful of vector
+    operations over all clients.
+
+    Besides the patrimony buckets, ``ruina`` (N × years) flags the years
+    from which the endowment was exhausted, i.e. it could no longer cover
+    the net cash flow plus the top‑up of the capital guard and had to be
+    floored at zero.
+    """
+    n, n_anos = df_brl_totals.shape
+    rets = np.broadcast_to(endowment_returns.reshape(n, -1), (n, n_anos))
+    cap_growth_factor = 1 + capital_growth_pct / 100.0
+    diffs = capital_guard_requirements(df_brl_totals, df_incomes_totals, capital_guard_anos)
+    cap, end = _patrimony_initial_split(patrimonio_inicial, diffs, df_brl_totals)
+    caps = np.empty((n, n_anos))
+    ends = np.empty((n, n_anos))
+    ruina = np.empty((n, n_anos), dtype=bool)
+    arruinado = np.zeros(n, dtype=bool)
+    for i in range(n_anos):
+        caps[:, i] = cap
+        # Currency adjustment for endowment display: 70% BRL + 30% USD*FX
+        ends[:, i] = end * fator_fx_display[:, i]
+        cap, end, esgotado = _patrimony_step(cap, end, i, rets[:, i], cap_growth_factor, diffs, df_brl_totals, net_cash)
+        arruinado |= esgotado
+        ruina[:, i] = arruinado
+    return {
+        "capital_guard": caps,
+        "aspirational": aspirational,
+        "endowment": ends,
+        "patrimonio_total": caps + aspirational + ends,
+        "ruina": ruina,
+    }
+
+
+def project_batch(
+    clients: pd.DataFrame | Dict[str, Sequence],
+    anos_proj: int,
+    capital_growth_pct: float = 11.85,
+) -> Dict[str, np.ndarray]:
+    """Project expenses, incomes and patrimony for many clients in one call.
+
+    Parameters
+    ----------
+    clients : DataFrame or dict of columns
+        One row per client/scenario.  Columns are the keys of
+        ``PROJECTION_INPUT_KEYS``, as in the session state and
+        :func:`run_projections` (``idades_filhos``, ``escolas_filhos`` and
+        ``estudam_fora`` hold lists, ``scales`` holds a dict or None).  The
+        columns of ``OPTIONAL_INPUT_DEFAULTS`` may be omitted.  ``anos_proj``,
+        if present, is ignored in favour of the argument so that all rows
+        share the same horizon.
+    anos_proj : int
+        Number of years to project for every client.
+    capital_growth_pct : float
+        Annual growth rate for the capital guard (%), as in the Streamlit flow.
+
+    Returns
+    -------
+    dict of ndarray
+        ``gastos``, ``rendas``, ``net_cash``, ``capital_guard``,
+        ``endowment``, ``aspirational``, ``patrimonio_total`` and ``ruina``,
+        each of shape (N × anos_proj), plus ``capital_guard_inicial`` (N,).
+
+    Raises
+    ------
+    ValueError
+        If a column is not a projection input or a required one is missing.
+    """
+    if isinstance(clients, pd.DataFrame):
+        columns = {c: clients[c].tolist() for c in clients.columns}
+    else:
+        columns = {c: list(v) for c, v in clients.items()}
+    desconhecidas = sorted(set(columns) - set(PROJECTION_INPUT_KEYS))
+    if desconhecidas:
+        raise ValueError(f"Colunas desconhecidas: {', '.join(desconhecidas)}")
+    ausentes = [
+        k for k in PROJECTION_INPUT_KEYS if k not in columns and k not in OPTIONAL_INPUT_DEFAULTS and k != "anos_proj"
+    ]
+    if ausentes:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(ausentes)}")
+    n = len(columns["idade_cliente"])
+    for key, default in OPTIONAL_INPUT_DEFAULTS.items():
+        columns.setdefault(key, [default] * n)
+    columns["no_conjuge"] = [bool(v) for v in columns["nao_tem_conjuge"]]
+    anos_proj = int(anos_proj)
+    inp = _columnar_inputs(columns)
+    res = _expenses_incomes_arrays(inp, anos_proj)
+    gastos = res["Total (R$)"]
+    rendas = res["Total Renda (R$)"]
+    net_cash = rendas - gastos
+
+    perfis = [PORTFOLIOS.get(p, PORTFOLIOS["moderado"]) for p in columns["risk_profile"]]
+    mu = np.array([0.7 * p["dom"]["expected_return"] + 0.3 * p["intl"]["expected_return"] for p in perfis])
+    macro = macro_path_arrays(inp["infl_brl_pct"], inp["infl_usd_pct"], inp["cotacao_usd"], anos_proj)
+    aspirational = aspirational_valuations(inp).serie(anos_proj)
+    pat = _patrimony_dynamic_arrays(
+        inp["patrimonio_inicial"],
+        aspirational,
+        np.full(n, capital_growth_pct, dtype=float),
+        mu,
+        gastos,
+        rendas,
+        net_cash,
+        macro["fator_fx_display"],
+        inp["capital_guard_anos"],
+    )
+    return {
+        "gastos": gastos,
+        "rendas": rendas,
+        "net_cash": net_cash,
+        "capital_guard_inicial": res["capital_guard"],
+        **pat,
+    }
+
+
+# Probabilities (%) of the quantile sketch each shard of a multi-worker patrimony
+# Monte Carlo returns per year (see merge_quantile_sketches).
+MC_SKETCH_PERCENTIS = np.linspace(0.0, 100.0, 1001)
+
+
+def merge_quantile_sketches(
+    sketches: Sequence[np.ndarray], tamanhos: Sequence[int], percentis: Sequence[float]
+) -> np.ndarray:
+    """Per-year ``percentis`` of the union of several shards, from their quantile sketches.
+
+    Each sketch holds a shard's quantiles at ``MC_SKETCH_PERCENTIS`` (points ×
+    years); the size-weighted mixture of their interpolated CDFs is inverted,
+    to within the sketch resolution.
+    """
+    pesos = np.asarray(tamanhos, dtype=float)
+    pesos /= pesos.sum()
+    n_anos = sketches[0].shape[1]
+    saida = np.empty((len(percentis), n_anos))
+    for ano in range(n_anos):
+        pontos = np.unique(np.concatenate([q[:, ano] for q in sketches]))
+        cdf = sum(w * np.interp(pontos, q[:, ano], MC_SKETCH_PERCENTIS) for w, q in zip(pesos, sketches))
+        saida[:, ano] = np.interp(percentis, np.maximum.accumulate(cdf), pontos)
+    return saida
+
+
+def _patrimonio_mc_shard(
+    n: int,
+    seed_seq: np.random.SeedSequence,
+    chunk_size: int,
+    patrimonio_inicial: float,
+    asp: np.ndarray,
+    capital_growth_pct: float,
+    mu: np.ndarray,
+    vol: np.ndarray,
+    totals: np.ndarray,
+    incomes: np.ndarray,
+    fluxo: np.ndarray,
+    fator_fx_display: np.ndarray,
+    variance_reduction: str = "none",
+    class_profile: str | None = None,
+    precision: str = "float64",
+    percentis: Sequence[float] = (10, 50, 90),
+    capital_guard_anos: int = CAPITAL_GUARD_YEARS,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Paths of :func:`simular_patrimonio_monte_carlo`: per-year ``percentis`` (len(percentis) × years) and ruined paths (years,)."""
+    rng = np.random.default_rng(seed_seq)
+    dtype = MC_PRECISIONS[precision]
+    modelo = asset_class_model(class_profile) if class_profile is not None else None
+    n_anos = len(totals)
+    pesos = np.array([0.7, 0.3], dtype=dtype)
+    totals, fluxo = totals[None, :], fluxo[None, :]
+    diffs = capital_guard_requirements(totals, incomes[None, :], capital_guard_anos)
+    cap, end = _patrimony_initial_split(np.full(n, patrimonio_inicial), diffs, totals)
+    cap_growth_factor = 1 + capital_growth_pct / 100.0
+    arruinado = np.zeros(n, dtype=bool)
+    rets = np.empty(n)
+    engines: Dict[Tuple[int, int], object] = {}
+    saida = np.empty((len(percentis), n_anos))
+    ruina_por_ano = np.zeros(n_anos)
+    for i in range(n_anos):
+        saida[:, i] = np.percentile(cap + asp[i] + end * fator_fx_display[i], percentis)
+        for inicio in range(0, n, chunk_size):
+            m = min(chunk_size, n - inicio)
+            if modelo is not None:
+                bloco = modelo.segment_returns(rng, m, 1, variance_reduction, dtype, engines, i)[:, 0]
+            elif variance_reduction == "none" and dtype is np.float64:
+                bloco = rng.normal(mu, vol, size=(m, 2))
+            else:
+                bloco = mu.astype(dtype) + vol.astype(dtype) * standard_normal_draws(
+                    rng, m, (2,), variance_reduction, dtype, engines, i
+                )
+            rets[inicio : inicio + m] = bloco @ pesos
+        cap, end, esgotado = _patrimony_step(cap, end, i, rets, cap_growth_factor, diffs, totals, fluxo)
+        arruinado |= esgotado
+        ruina_por_ano[i] = arruinado.sum()
+    return saida, ruina_por_ano
+
+
+def simular_patrimonio_monte_carlo(
+    patrimonio_inicial: float,
+    aspirational_series: List[float],
+    capital_growth_pct: float,
+    anos_proj: int,
+    risk_profile: str,
+    df_brl_totals: List[float],
+    df_incomes_totals: List[float],
+    infl_brl_pct: float,
+    infl_usd_pct: float,
+    net_cash: List[float] | None = None,
+    n_sim: int = 10000,
+    chunk_size: int = 5000,
+    seed: int = 42,
+    workers: int = 1,
+    variance_reduction: str = "none",
+    return_model: str = "aggregate",
+    precision: str = "float64",
+    memory_budget: int | None = None,
+    on_budget: str = "chunk",
+    capital_guard_anos: int = CAPITAL_GUARD_YEARS,
+) -> Tuple[pd.DataFrame, float]:
+    """Stochastic version of :func:`compute_patrimony_dynamic`.
+
+    Each path draws yearly dom/intl returns for the risk profile, blends
+    them 70/30 and runs them through the cash-flow and capital-guard
+    rebalancing of the deterministic projection, a year and ``chunk_size``
+    paths at a time so memory does not grow with the horizon.  Paths are
+    sharded over ``workers`` processes (:func:`run_monte_carlo_shards`) and
+    reproducible for a given ``seed``, ``chunk_size`` and ``workers``;
+    ``return_model="classes"`` draws correlated asset classes
+    (:class:`AssetClassModel`) and ``memory_budget``/``on_budget`` work as
+    in :func:`fit_monte_carlo_chunk`.
+
+    Returns
+    -------
+    df_mc : DataFrame
+        Columns: Ano, P10 (R$), P50 (R$), P90 (R$) of the total patrimony and
+        Prob. Ruína, the share of paths whose endowment was exhausted up to
+        that year.  ``df_mc.attrs["chunk_size"]`` is the chunk size used.
+    prob_ruina : float
+        Share of paths ruined at any point of the horizon.
+    """
+    if return_model not in ("aggregate", "classes"):
+        raise ValueError(f"Modelo de retorno desconhecido: {return_model!r}")
+    n_anos = int(anos_proj)
+    n_sim = int(n_sim)
+    n_classes = len(asset_class_model(risk_profile).classes) if return_model == "classes" else 2
+    chunk_size = fit_monte_carlo_chunk(
+        "patrimonio", n_sim, n_anos, max(1, int(chunk_size)), workers, precision, memory_budget, on_budget, n_classes
+    )
+    totals = np.asarray(df_brl_totals, dtype=float)[:n_anos]
+    incomes = np.asarray(df_incomes_totals, dtype=float)[:n_anos]
+    fluxo = np.zeros(n_anos)
+    if net_cash is not None:
+        nc = np.asarray(net_cash, dtype=float)[:n_anos]
+        fluxo[: len(nc)] = nc
+    asp = np.empty(n_anos)
+    serie = np.asarray(aspirational_series, dtype=float)[:n_anos]
+    asp[: len(serie)] = serie
+    asp[len(serie):] = serie[-1] if len(serie) else 0.0
+    profile = PORTFOLIOS.get(risk_profile, PORTFOLIOS["moderado"])
+    mu = np.array([profile["dom"]["expected_return"], profile["intl"]["expected_return"]])
+    vol = np.array([profile["dom"]["vol"], profile["intl"]["vol"]])
+    # The display factor depends only on the inflation differential, not on the spot rate
+    fator_fx_display = macro_path(infl_brl_pct, infl_usd_pct, 1.0, n_anos).fator_fx_display
+
+    workers = max(1, min(int(workers), max(n_sim, 1)))
+    percentis = [10, 50, 90]
+    shards = run_monte_carlo_shards(
+        _patrimonio_mc_shard, n_sim, seed, workers,
+        chunk_size, float(patrimonio_inicial), asp, float(capital_growth_pct), mu, vol, totals, incomes, fluxo, fator_fx_display,
+        variance_reduction, risk_profile if return_model == "classes" else None, precision,
+        percentis if workers == 1 else MC_SKETCH_PERCENTIS, int(capital_guard_anos),
+    )
+    if workers == 1:
+        p10, p50, p90 = shards[0][0]
+    else:
+        tamanhos = [len(parte) for parte in np.array_split(np.arange(n_sim), workers)]
+        p10, p50, p90 = merge_quantile_sketches([q for q, _ in shards], tamanhos, percentis)
+    ruina_por_ano = np.sum([r for _, r in shards], axis=0)
+    prob_ruina_ano = ruina_por_ano / n_sim if n_sim else ruina_por_ano
+    df_mc = pd.DataFrame(
+        {
+            "Ano": np.arange(1, n_anos + 1),
+            "P10 (R$)": p10,
+            "P50 (R$)": p50,
+            "P90 (R$)": p90,
+            "Prob. Ruína": prob_ruina_ano,
+        }
+    )
+    df_mc.attrs["chunk_size"] = chunk_size
+    return df_mc, float(prob_ruina_ano[-1]) if n_anos else 0.0
+
+
+# Session-state keys that fully determine the projections of the results stage.
+PROJECTION_INPUT_KEYS = (
+    "idade_cliente", "idade_conjuge", "idades_filhos", "escolas_filhos", "estudam_fora",
+    "bairro", "metragem", "n_carros", "estilo_vida", "n_viagens", "n_funcionarios",
+    "luxo_mensal", "segunda_resid_mensal", "aluguel_mensal_brl", "aluguel_growth_brl",
+    "aluguel_mensal_usd", "aluguel_growth_usd", "dividendos_brl", "divid_growth_brl",
+    "dividendos_usd", "divid_growth_usd", "has_iliquido", "iliquido_vals_brl",
+    "iliquido_growth_brl", "iliquido_vals_usd", "iliquido_growth_usd", "patrimonio_inicial",
+    "filantropia_anual", "anos_proj", "infl_brl_pct", "infl_usd_pct", "cotacao_usd",
+    "salario_anual0", "idade_aposentadoria", "nao_tem_conjuge", "risk_profile", "scales",
+    "capital_guard_anos",
+)
+# Projection inputs that may be omitted (batch columns, service profiles) and
+# the value used in their place.
+OPTIONAL_INPUT_DEFAULTS: Dict[str, object] = {
+    "has_iliquido": False,
+    "iliquido_vals_brl": [],
+    "iliquido_growth_brl": [],
+    "iliquido_vals_usd": [],
+    "iliquido_growth_usd": [],
+    "nao_tem_conjuge": False,
+    "risk_profile": "moderado",
+    "scales": None,
+    "capital_guard_anos": CAPITAL_GUARD_YEARS,
+}
+
+# -----------------------------------------------------------------------------
+# Instrumentation of the results pipeline
+#
+# Each rerun of the results stage records the wall time, CPU time and peak
+# memory of its stages (projections, Monte Carlo blocks, figures, Excel
+# export).  The records are logged as one JSON line per stage on the
+# ``jera.pipeline`` logger and, with ``JERA_PIPELINE_DEBUG=1`` or ``?debug=1``
+# in the URL, shown in a debug panel together with their OpenMetrics text.
+# Peak memory is only traced when the environment variable is set.
+
+PIPELINE_LOGGER = logging.getLogger("jera.pipeline")
+PIPELINE_DEBUG = os.environ.get("JERA_PIPELINE_DEBUG", "") not in ("", "0")
+# Run being recorded on the current thread (Streamlit runs each session's
+# script in its own thread).  Shared across reruns, so a run that a rerun
+# interrupted is finished, and its memory tracing released, by the next one.
+_PIPELINE_ACTIVE = shared_resource("pipeline_active", threading.local)
+
+
+class TracemallocUsers:
+    """Reference count of the runs tracing memory.
+
+    :mod:`tracemalloc` is process-wide, so the first run to acquire it
+    starts it and the last to release it stops it, unless it was already
+    tracing before.
+    """
+
+    def __init__(self) -> None:
+        self._n = 0
+        self._iniciado = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._n == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._iniciado = True
+            self._n += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._n -= 1
+            if self._n == 0 and self._iniciado:
+                tracemalloc.stop()
+                self._iniciado = False
+
+
+def tracemalloc_users() -> TracemallocUsers:
+    """Process-wide :class:`TracemallocUsers`, shared by every session."""
+    return shared_resource("tracemalloc", TracemallocUsers)
+
+
+class PipelineTimings:
+    """Per-stage wall time, CPU time and peak memory of one results run.
+
+    Stages are opened with :meth:`stage` and may nest; a nested stage is
+    recorded as ``"pai/filho"``.  CPU time is that of this process, so work
+    done in Monte Carlo worker processes only shows up in the wall time.
+    Peak memory is the largest increase of the allocations traced by
+    :mod:`tracemalloc` while the stage ran; it is only measured when
+    ``trace_memory`` is true because tracing slows allocation-heavy code.
+    Tracing is shared by all sessions of the process, so while two traced
+    runs overlap each one's peaks also include the other's allocations.
+    Between :meth:`start` and :meth:`finish` the library functions report
+    their own sub-stages through :func:`pipeline_stage`.
+    """
+
+    def __init__(self, session_id: str = "", trace_memory: bool = False) -> None:
+        self.session_id = session_id
+        self.trace_memory = trace_memory
+        self.stages: List[Dict[str, object]] = []
+        self._pilha: List[Dict[str, object]] = []
+        self._tracing = False
+
+    def start(self) -> "PipelineTimings":
+        """Make this the active run of the current thread."""
+        anterior = getattr(_PIPELINE_ACTIVE, "timings", None)
+        if anterior is not None:
+            # A rerun interrupted the previous script run before it finished.
+            anterior.finish()
+        if self.trace_memory and not self._tracing:
+            tracemalloc_users().acquire()
+            self._tracing = True
+        _PIPELINE_ACTIVE.timings = self
+        return self
+
+    def finish(self) -> None:
+        if getattr(_PIPELINE_ACTIVE, "timings", None) is self:
+            _PIPELINE_ACTIVE.timings = None
+        if self._tracing:
+            tracemalloc_users().release()
+            self._tracing = False
+
+    @contextmanager
+    def stage(self, nome: str):
+        if self._pilha:
+            nome = f"{self._pilha[-1]['etapa']}/{nome}"
+        registro: Dict[str, object] = {"etapa": nome, "wall_s": 0.0, "cpu_s": 0.0, "pico_memoria_bytes": None}
+        medir_memoria = self._tracing
+        if medir_memoria:
+            atual, pico = tracemalloc.get_traced_memory()
+            if self._pilha:
+                # Keep the enclosing stage's peak before restarting the counter.
+                self._pilha[-1]["_pico"] = max(self._pilha[-1].get("_pico", 0), pico)
+            tracemalloc.reset_peak()
+            registro["_base"] = registro["_pico"] = atual
+        self.stages.append(registro)
+        self._pilha.append(registro)
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield registro
+        finally:
+            registro["wall_s"] = time.perf_counter() - wall0
+            registro["cpu_s"] = time.process_time() - cpu0
+            self._pilha.pop()
+            if medir_memoria and self._tracing:
+                pico = max(registro.pop("_pico"), tracemalloc.get_traced_memory()[1])
+                registro["pico_memoria_bytes"] = pico - registro.pop("_base")
+                if self._pilha:
+                    self._pilha[-1]["_pico"] = max(self._pilha[-1].get("_pico", 0), pico)
+            else:
+                registro.pop("_pico", None)
+                registro.pop("_base", None)
+            PIPELINE_LOGGER.info(json.dumps({"evento": "etapa", "sessao": self.session_id, **registro}))
+
+    def table(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "Etapa": [r["etapa"] for r in self.stages],
+                "Tempo (ms)": [r["wall_s"] * 1000.0 for r in self.stages],
+                "CPU (ms)": [r["cpu_s"] * 1000.0 for r in self.stages],
+                "Pico de memória (MiB)": [
+                    np.nan if r["pico_memoria_bytes"] is None else r["pico_memoria_bytes"] / 2**20 for r in self.stages
+                ],
+            }
+        )
+
+    def openmetrics(self) -> str:
+        """The stages as OpenMetrics gauges labelled by session and stage."""
+        series = (
+            ("jera_pipeline_stage_wall_seconds", "seconds", "Wall time of a results pipeline stage.", "wall_s"),
+            ("jera_pipeline_stage_cpu_seconds", "seconds", "CPU time of a results pipeline stage.", "cpu_s"),
+            ("jera_pipeline_stage_peak_memory_bytes", "bytes", "Peak traced memory of a results pipeline stage.",
+             "pico_memoria_bytes"),
+        )
+        linhas = []
+        for nome, unidade, ajuda, campo in series:
+            linhas += [f"# TYPE {nome} gauge", f"# UNIT {nome} {unidade}", f"# HELP {nome} {ajuda}"]
+            for r in self.stages:
+                if r[campo] is not None:
+                    etapa = str(r["etapa"]).replace("\\", "\\\\").replace('"', '\\"')
+                    linhas.append(f'{nome}{{session="{self.session_id}",stage="{etapa}"}} {r[campo]!r}')
+        linhas.append("# EOF")
+        return "\n".join(linhas) + "\n"
+
+
+def pipeline_stage(nome: str):
+    """Stage ``nome`` of the thread's active :class:`PipelineTimings`, or a no-op context."""
+    timings = getattr(_PIPELINE_ACTIVE, "timings", None)
+    return timings.stage(nome) if timings is not None else nullcontext()
+
+
+def _perpetuity_value(fluxo_anual: np.ndarray, taxa, crescimento: np.ndarray) -> np.ndarray:
+    """Gordon value of growing annual flows; 0 where ``taxa`` does not exceed ``crescimento``."""
+    margem = taxa - crescimento
+    positiva = margem > 0
+    return np.where(positiva, fluxo_anual / np.where(positiva, margem, 1.0), 0.0)
+
+
+class AspirationalValuation:
+    """Aspirational assets as arrays, valued over the projection horizon.
+
+    Each asset has a BRL value today, an annual growth rate (decimal) and a
+    component label; the yearly values of every asset come from one outer
+    product of the growth factors with the years, so a long list of illiquid
+    holdings costs a single (assets × years) array operation.  ``valores``
+    and ``crescimentos`` may also be (clients × assets), valuing a whole
+    batch at once.
+    """
+
+    def __init__(self, componentes: Sequence[str], valores: Sequence[float], crescimentos: Sequence[float]):
+        self.componentes = np.asarray(componentes, dtype=object)
+        self.valores = np.asarray(valores, dtype=float)
+        self.crescimentos = np.asarray(crescimentos, dtype=float)
+
+    @property
+    def valor_inicial(self):
+        """Total value today: a float, or one per client for a batch."""
+        total = self.valores.sum(axis=-1)
+        return float(total) if total.ndim == 0 else total
+
+    def linha(self, i: int) -> "AspirationalValuation":
+        """Valuation of client ``i`` of a batch."""
+        return AspirationalValuation(self.componentes, self.valores[i], self.crescimentos[i])
+
+    def matriz(self, anos_proj: int) -> np.ndarray:
+        """Value of each asset in each year, shape ([clients ×] assets × anos_proj)."""
+        anos = np.arange(int(anos_proj), dtype=float)
+        return self.valores[..., None] * (1.0 + self.crescimentos[..., None]) ** anos
+
+    def serie(self, anos_proj: int) -> np.ndarray:
+        """Total aspirational value per year, shape ([clients ×] anos_proj)."""
+        return self.matriz(anos_proj).sum(axis=-2)
+
+    def breakdown(self, anos_proj: int) -> pd.DataFrame:
+        """Yearly value per component (one column per label, plus the total) of a single client."""
+        matriz = self.matriz(anos_proj)
+        df = pd.DataFrame({"Ano": np.arange(1, int(anos_proj) + 1)})
+        for nome in dict.fromkeys(self.componentes):
+            df[nome] = matriz[self.componentes == nome].sum(axis=0)
+        df["Aspirational (R$)"] = matriz.sum(axis=0)
+        return df
+
+
+# Scalar inputs read by aspirational_valuations, besides the illiquid holdings.
+ASPIRATIONAL_INPUT_KEYS = (
+    "aluguel_mensal_brl", "aluguel_growth_brl", "aluguel_mensal_usd", "aluguel_growth_usd",
+    "dividendos_brl", "divid_growth_brl", "dividendos_usd", "divid_growth_usd", "cotacao_usd",
+)
+
+
+def aspirational_valuations(inp: Dict[str, np.ndarray]) -> AspirationalValuation:
+    """Value rentals, participations and illiquid assets of every client of a batch.
+
+    ``inp`` is the output of :func:`_columnar_inputs` (only the income and
+    ``iliquido_*`` columns are read).  Rentals are valued
+    as perpetuities at 15% (BRL) and 7% (USD) and participations at 19%
+    (BRL) and 11% (USD); illiquid assets enter at face value when
+    ``has_iliquido`` is set, their BRL and USD parts growing at their own
+    rates.  USD amounts are converted at ``cotacao_usd``.
+    """
+    cotacao = inp["cotacao_usd"][:, None]
+    # Rentals BR/EUA and participations BR/EUA, one column each
+    fluxos = np.column_stack([
+        inp["aluguel_mensal_brl"] * 12.0, inp["aluguel_mensal_usd"] * 12.0, inp["dividendos_brl"], inp["dividendos_usd"],
+    ])
+    g_renda = np.column_stack([
+        inp["aluguel_growth_brl"], inp["aluguel_growth_usd"], inp["divid_growth_brl"], inp["divid_growth_usd"],
+    ]) / 100.0
+    em_usd = np.array([False, True, False, True])
+    perpetuidades = _perpetuity_value(fluxos, np.array([0.15, 0.07, 0.19, 0.11]), g_renda)
+    perpetuidades = np.where(em_usd, perpetuidades * cotacao, perpetuidades)
+    k = inp["iliquido_vals_brl"].shape[1]
+    componentes = ["Imóveis BR (R$)", "Imóveis EUA (R$)", "Participações BR (R$)", "Participações EUA (R$)"]
+    componentes += ["Ilíquidos (R$)"] * (2 * k)
+    valores = np.concatenate(
+        [perpetuidades, inp["iliquido_vals_brl"], inp["iliquido_vals_usd"] * cotacao], axis=1
+    )
+    crescimentos = np.concatenate(
+        [g_renda, inp["iliquido_growth_brl"] / 100.0, inp["iliquido_growth_usd"] / 100.0], axis=1
+    )
+    return AspirationalValuation(componentes, valores, crescimentos)
+
+
+def aspirational_valuation(inputs: Dict[str, object]) -> AspirationalValuation:
+    """:func:`aspirational_valuations` of a single client's ``inputs`` (see :func:`run_projections`)."""
+    inp = {nome: np.array([inputs[nome]], dtype=float) for nome in ASPIRATIONAL_INPUT_KEYS}
+    inp.update(_iliquido_columns({key: [inputs.get(key)] for key in ("has_iliquido",) + ILIQUIDO_KEYS}, 1))
+    return aspirational_valuations(inp).linha(0)
+
+
+def _aspirational_projection(
+    inputs: Dict[str, object], valuation: AspirationalValuation | None = None
+) -> Tuple[float, float, List[float]]:
+    """Aspirational initial value, weighted growth rate and yearly series.
+
+    Values rentals, participations and illiquid assets from ``inputs`` (see
+    :func:`run_projections`) through :func:`aspirational_valuation`, unless
+    the client's ``valuation`` is given.
+    """
+    anos_proj = int(inputs["anos_proj"])
+    if valuation is None:
+        valuation = aspirational_valuation(inputs)
+    asp_initial = valuation.valor_inicial
+    # Weighted growth rate: each positive component weighted by its value.  An
+    # illiquid holding is weighted by its total BRL value at its BRL growth rate.
+    valores = valuation.valores
+    pesos = np.where(valores > 0, valores, 0.0)
+    iliquidos = valuation.componentes == "Ilíquidos (R$)"
+    weighted_growth_sum = float((pesos * valuation.crescimentos)[~iliquidos].sum())
+    weights_sum = float(pesos[~iliquidos].sum())
+    k = int(iliquidos.sum()) // 2
+    if k:
+        v_iliq = valores[iliquidos][:k] + valores[iliquidos][k:]
+        g_iliq = valuation.crescimentos[iliquidos][:k]
+        v_pos = v_iliq > 0
+        weighted_growth_sum += float((v_iliq * g_iliq)[v_pos].sum())
+        if v_iliq.sum() > 0:
+            weights_sum += float(v_iliq.sum())
+    asp_growth = (weighted_growth_sum / asp_initial) if asp_initial > 0 and weights_sum > 0 else 0.0
+    return asp_initial, asp_growth, valuation.serie(anos_proj).tolist()
+
+
+def _base_projection(inputs: Dict[str, object]) -> Dict[str, object]:
+    """Scale-independent part of :func:`run_projections` (cached in ``EXPENSE_BASE_CACHE``)."""
+    columns = {key: [value] for key, value in inputs.items()}
+    columns["no_conjuge"] = [bool(inputs.get("nao_tem_conjuge", False))]
+    with pipeline_stage("despesas"):
+        inp = _columnar_inputs(columns)
+        arrays = _unscaled_expenses_incomes(inp, int(inputs["anos_proj"]))
+    with pipeline_stage("aspirational"):
+        aspirational = _aspirational_projection(inputs, aspirational_valuations(inp).linha(0))
+    return {"arrays": arrays, "aspirational": aspirational}
+
+
+def run_projections(inputs: Dict[str, object]) -> Dict[str, object]:
+    """Compute every projection shown in the results stage.
+
+    ``inputs`` maps each key of ``PROJECTION_INPUT_KEYS`` to its value (as
+    stored in ``st.session_state``).  The function does not touch the
+    session, so it can be memoized and called outside Streamlit.
+
+    Returns
+    -------
+    dict
+        ``df_brl``, ``df_usd``, ``df_incomes`` and ``df_pat`` DataFrames,
+        ``net_cash_series``, ``capital_guard`` (year 0), ``required_caps``,
+        ``aspirational_inicial`` and ``aspirational_growth_rate`` (%).
+    """
+    # Unscaled expense categories and the aspirational series do not depend on
+    # ``scales``; they are cached separately so that moving an Ajustes slider only
+    # re-weights cached columns and reruns the patrimony stage.
+    base = EXPENSE_BASE_CACHE.get_or_compute(
+        {key: value for key, value in inputs.items() if key != "scales"}, _base_projection
+    )
+    df_brl, df_usd, df_incomes, capital_guard = _expense_frames(
+        _apply_expense_scales(base["arrays"], _scale_columns([inputs.get("scales")]))
+    )
+    # Net cash flows: income minus BRL expenses including USD conversion.  Returned so it
+    # can be reused later for financial return calculations.
+    net_cash_series = (df_incomes["Total Renda (R$)"] - df_brl["Total (R$)"]).tolist()
+    anos_proj = int(inputs["anos_proj"])
+    capital_guard_anos = int(inputs.get("capital_guard_anos", CAPITAL_GUARD_YEARS))
+    # Compute required capital guard for each year as the sum of the next
+    # capital_guard_anos years of expenses minus the income in year i.
+    # This yields the capital needed to cover those expenditures without
+    # relying on investment returns.  For the first year, we will
+    # override this value with the capital_guard computed in
+    # compute_costs_and_incomes (which already applies the 10% rule
+    # when expenses minus income is less than the first year's
+    # expenses).
+    required_caps: List[float] = capital_guard_requirements(
+        df_brl["Total (R$)"].to_numpy()[:anos_proj],
+        df_incomes["Total Renda (R$)"].to_numpy()[:anos_proj],
+        capital_guard_anos,
+    ).tolist()
+    # Override the first required capital guard with the value computed
+    # by compute_costs_and_incomes.  This enforces the condition that
+    # the capital guard must be at least 10% of the investible patrimony
+    # when the projected expenses of the first four years minus the
+    # first year's income are less than the first year's expenses.
+    if required_caps:
+        required_caps[0] = capital_guard
+    asp_initial, asp_growth, asp_series = base["aspirational"]
+    # Compute total patrimony at year 0: investible patrimony plus initial
+    # aspirational amount.  Do not add the capital guard again here
+    # because compute_patrimony_dynamic splits the investible
+    # patrimony into capital guard and endowment based on
+    # required_caps[0].  Adding it here would double count the
+    # capital guard and inflate the starting patrimony.
+    patrimonio_total_start = inputs["patrimonio_inicial"] + (asp_series[0] if asp_series else 0.0)
+    # Compute patrimony with dynamic capital guard and aspirational series.  The capital
+    # guard return reflects a mix of 70% domestic assets at 15% a.a. and 30% foreign
+    # assets at 4.5% a.a., resulting in an effective growth rate of 11.85% per year.
+    # Build lists of total expenses and total incomes for each year to feed into the
+    # patrimony calculation.  These lists will be used to recompute the capital guard
+    # requirements dynamically within compute_patrimony_dynamic.
+    df_brl_totals_list = df_brl["Total (R$)"].tolist()
+    df_incomes_totals_list = df_incomes["Total Renda (R$)"].tolist()
+    with pipeline_stage("patrimonio"):
+        df_pat = compute_patrimony_dynamic(
+            # Only the investible patrimony (input) is passed here.  The aspirational
+            # portion is supplied separately via aspirational_series and should not
+            # inflate the investible amount used to compute the capital guard and
+            # endowment.  Passing patrimonio_total_start here was causing the
+            # endowment and capital guard to start with an inflated base.
+            inputs["patrimonio_inicial"],
+            asp_series[0] if asp_series else asp_initial,
+            asp_growth * 100.0,
+            11.85,
+            anos_proj,
+            inputs["risk_profile"],
+            df_brl_totals_list,
+            df_incomes_totals_list,
+            inputs["infl_brl_pct"],
+            inputs["infl_usd_pct"],
+            inputs["cotacao_usd"],
+            net_cash=net_cash_series,
+            aspirational_series=asp_series,
+            capital_guard_anos=capital_guard_anos,
+        )
+
+    return {
+        "df_brl": df_brl,
+        "df_usd": df_usd,
+        "df_incomes": df_incomes,
+        "df_pat": df_pat,
+        "net_cash_series": net_cash_series,
+        "capital_guard": capital_guard,
+        "required_caps": required_caps,
+        "aspirational_inicial": asp_initial,
+        "aspirational_growth_rate": asp_growth * 100.0,
+    }
+
+
+def json_default(obj: object) -> object:
+    """``json.dumps`` hook for NumPy scalars/arrays (cache keys and service responses)."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+
+def projection_cache_key(inputs: Dict[str, object]) -> str:
+    """Stable hash of the projection inputs together with PREMISES and PORTFOLIOS.
+
+    The premises and portfolios are part of the key so that editing them at
+    runtime never returns a stale projection.
+    """
+    payload = json.dumps(
+        {"inputs": inputs, "premises": PREMISES, "portfolios": PORTFOLIOS},
+        sort_keys=True,
+        default=json_default,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ProjectionCache:
+    """Thread-safe LRU cache of :func:`run_projections` results.
+
+    Entries are keyed by :func:`projection_cache_key`, so moving a slider
+    back to a value already seen returns the stored projection instantly.
+    At most ``maxsize`` entries are kept; the least recently used one is
+    evicted first.  Every caller gets its own deep copy, so mutating a
+    returned DataFrame or list never changes the cached entry.
+    """
+
+    def __init__(self, maxsize: int = 64) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict[str, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, inputs: Dict[str, object], compute=None) -> Dict[str, object]:
+        """Return the cached projection for ``inputs``, computing it on a miss."""
+        key = projection_cache_key(inputs)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return copy.deepcopy(self._entries[key])
+            self.misses += 1
+        result = (compute or run_projections)(inputs)
+        with self._lock:
+            self._entries[key] = copy.deepcopy(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+def shared_cache(nome: str, maxsize: int) -> ProjectionCache:
+    """Process-wide :class:`ProjectionCache` called ``nome`` (see :func:`shared_resource`)."""
+    return shared_resource(f"cache/{nome}/{maxsize}", lambda: ProjectionCache(maxsize=maxsize))
+
+
+# Shared by all sessions of the Streamlit process; keys include every input.
+PROJECTION_CACHE = shared_cache("projecoes", 128)
+# Unscaled expenses and aspirational series, keyed on every input except ``scales``.
+EXPENSE_BASE_CACHE = shared_cache("despesas_base", 32)
+# Monte Carlo results (patrimony bands and live endowment growth factors),
+# keyed on the profile or premises and the simulation settings.
+MONTE_CARLO_CACHE = shared_cache("monte_carlo", 32)
+
+
+def projection_monte_carlo(
+    inputs: Dict[str, object],
+    n_sim: int = 10000,
+    seed: int = MC_SEED,
+    precision: str = "float64",
+    chunk_size: int = 5000,
+    workers: int = 1,
+    memory_budget: int | None = None,
+) -> Dict[str, object]:
+    """Patrimony Monte Carlo of a client profile, cached in ``MONTE_CARLO_CACHE``.
+
+    ``inputs`` are the projection inputs (see :func:`run_projections`); the
+    deterministic projection is taken from ``PROJECTION_CACHE``.  The other
+    arguments are passed to :func:`simular_patrimonio_monte_carlo`.  Returns
+    ``df_mc`` (P10/P50/P90 per year), ``prob_ruina``, the ``chunk_size``
+    actually used once fitted to the memory budget and ``memoria_estimada``,
+    the estimated peak bytes of the run with that chunk and ``workers``.
+    """
+
+    def compute(chave: Dict[str, object]) -> Dict[str, object]:
+        anos = int(inputs["anos_proj"])
+        proj = PROJECTION_CACHE.get_or_compute(inputs)
+        df_mc, prob_ruina = simular_patrimonio_monte_carlo(
+            inputs["patrimonio_inicial"],
+            proj["df_pat"]["Aspirational (R$)"].tolist(),
+            11.85,
+            int(inputs["anos_proj"]),
+            inputs["risk_profile"],
+            proj["df_brl"]["Total (R$)"].tolist(),
+            proj["df_incomes"]["Total Renda (R$)"].tolist(),
+            inputs["infl_brl_pct"],
+            inputs["infl_usd_pct"],
+            net_cash=proj["net_cash_series"],
+            n_sim=n_sim,
+            chunk_size=chunk_size,
+            seed=seed,
+            workers=workers,
+            precision=precision,
+            memory_budget=memory_budget,
+            capital_guard_anos=int(inputs.get("capital_guard_anos", CAPITAL_GUARD_YEARS)),
+        )
+        # Fitted to the memory budget by simular_patrimonio_monte_carlo
+        chunk = df_mc.attrs["chunk_size"]
+        return {
+            "df_mc": df_mc,
+            "prob_ruina": prob_ruina,
+            "chunk_size": chunk,
+            "memoria_estimada": estimate_monte_carlo_memory("patrimonio", n_sim, anos, chunk, workers, precision),
+        }
+
+    return MONTE_CARLO_CACHE.get_or_compute(
+        {
+            "inputs": inputs,
+            "n_sim": int(n_sim),
+            "seed": seed,
+            "precision": precision,
+            "chunk_size": int(chunk_size),
+            "workers": int(workers),
+            "memory_budget": memory_budget,
+        },
+        compute,
+    )
+
+
+def projection_macro_scenarios(inputs: Dict[str, object], n_sim: int = 5000, seed: int = MC_SEED) -> pd.DataFrame:
+    """:func:`simular_despesas_macro` of a client profile, cached in ``MONTE_CARLO_CACHE``."""
+    return MONTE_CARLO_CACHE.get_or_compute(
+        {"macro": inputs, "n_sim": int(n_sim), "seed": seed, "params": MACRO_SCENARIO_PARAMS},
+        lambda chave: simular_despesas_macro(inputs, n_sim=n_sim, seed=seed),
+    )
+
+
+EXCEL_FILE_NAME = "projecao_jera.xlsx"
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Workbook bytes keyed on the hash of the sheets' contents.
+EXCEL_CACHE = shared_cache("excel", 16)
+
+
+def write_excel_workbook(destino, planilhas: Iterable[Tuple[str, pd.DataFrame, bool]]) -> None:
+    """Stream ``planilhas`` into an xlsx workbook.
+
+    ``destino`` is a path or a binary file object and ``planilhas`` yields
+    ``(sheet name, DataFrame, write the index)`` tuples.  The workbook is
+    written in xlsxwriter's ``constant_memory`` mode: each row goes to a
+    temporary file as soon as the next one starts, so only one row of the
+    current sheet is held in memory.  ``planilhas`` may be a generator that
+    builds one sheet at a time, e.g. the sheets of many clients, without
+    ever holding all of them.
+    """
+    workbook = xlsxwriter.Workbook(destino, {"constant_memory": True, "nan_inf_to_errors": True})
+    try:
+        negrito = workbook.add_format({"bold": True})
+        for nome, df, com_indice in planilhas:
+            worksheet = workbook.add_worksheet(nome[:31])
+            cabecalho = ([df.index.name or ""] if com_indice else []) + [str(c) for c in df.columns]
+            worksheet.write_row(0, 0, cabecalho, negrito)
+            # Column lists hold native Python values, which xlsxwriter writes directly.
+            colunas = ([df.index.tolist()] if com_indice else []) + [df[c].tolist() for c in df.columns]
+            for linha, valores in enumerate(zip(*colunas), start=1):
+                worksheet.write_row(linha, 0, valores)
+    finally:
+        workbook.close()
+
+
+def excel_sheets_digest(planilhas: Sequence[Tuple[str, pd.DataFrame, bool]]) -> str:
+    """SHA-256 of the names, columns and values of ``planilhas``."""
+    h = hashlib.sha256()
+    for nome, df, com_indice in planilhas:
+        cabecalho = [nome, [str(c) for c in df.columns], [str(t) for t in df.dtypes], bool(com_indice), len(df)]
+        h.update(json.dumps(cabecalho).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(df, index=com_indice).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _excel_sheets(
+    df_brl: pd.DataFrame,
+    df_usd: pd.DataFrame,
+    df_incomes: pd.DataFrame,
+    df_pat: pd.DataFrame,
+    extras: Sequence[Tuple[str, pd.DataFrame]] = (),
+) -> List[Tuple[str, pd.DataFrame, bool]]:
+    planilhas = [
+        ("Gastos BRL", df_brl, False),
+        ("Gastos USD", df_usd, False),
+        ("Rendas", df_incomes, False),
+        ("Patrimônio", df_pat, False),
+    ]
+    # Extra tables (cash flow, overview) are labelled by their index.
+    return planilhas + [(nome, df, not isinstance(df.index, pd.RangeIndex)) for nome, df in extras]
 
 
 def build_excel_download(
@@ -991,18 +3750,40 @@ def build_excel_download(
     df_usd: pd.DataFrame,
     df_incomes: pd.DataFrame,
     df_pat: pd.DataFrame,
+    extras: Sequence[Tuple[str, pd.DataFrame]] = (),
 ) -> Tuple[str, bytes]:
-    """Create an Excel file with separate sheets for BRL, USD, incomes and patrimony."""
+    """Create an Excel file with separate sheets for BRL, USD, incomes and patrimony.
+
+    ``extras`` are further ``(sheet name, DataFrame)`` pairs, e.g. the cash
+    flow, patrimony overview and Monte Carlo tables shown in the results tab.
+    """
     out = BytesIO()
-    with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
-        df_brl.to_excel(writer, index=False, sheet_name="Gastos BRL")
-        df_usd.to_excel(writer, index=False, sheet_name="Gastos USD")
-        df_incomes.to_excel(writer, index=False, sheet_name="Rendas")
-        df_pat.to_excel(writer, index=False, sheet_name="Patrimônio")
-    return "projecao_jera.xlsx", out.getvalue()
+    write_excel_workbook(out, _excel_sheets(df_brl, df_usd, df_incomes, df_pat, extras))
+    return EXCEL_FILE_NAME, out.getvalue()
+
+
+def excel_download(
+    df_brl: pd.DataFrame,
+    df_usd: pd.DataFrame,
+    df_incomes: pd.DataFrame,
+    df_pat: pd.DataFrame,
+    extras: Sequence[Tuple[str, pd.DataFrame]] = (),
+) -> Tuple[str, bytes]:
+    """:func:`build_excel_download` cached in ``EXCEL_CACHE`` by the sheets' content."""
+    planilhas = _excel_sheets(df_brl, df_usd, df_incomes, df_pat, extras)
+
+    def compute(chave: Dict[str, object]) -> bytes:
+        out = BytesIO()
+        write_excel_workbook(out, planilhas)
+        return out.getvalue()
+
+    return EXCEL_FILE_NAME, EXCEL_CACHE.get_or_compute({"planilhas": excel_sheets_digest(planilhas)}, compute)
 
 
 def main():
+    import plotly.graph_objects as go
+    import streamlit as st
+
     st.set_page_config(page_title="Jera Onboarding", layout="wide")
     # Sidebar with logo and title
     st.sidebar.markdown(
@@ -1088,6 +3869,7 @@ def main():
         "warning_no_salary": False,
         "aspirational_inicial": None,
         "aspirational_growth_rate": None,
+        "capital_guard_anos": CAPITAL_GUARD_YEARS,
     }
 
     for key, default_value in defaults.items():
@@ -1101,6 +3883,13 @@ def main():
         st.session_state.cargo = st.text_input("Cargo", value=st.session_state.cargo or "")
         st.session_state.setor = st.text_input("Setor", value=st.session_state.setor or "")
         st.session_state.empresa = st.text_input("Empresa", value=st.session_state.empresa or "")
+        # Start the salary estimate in the background as soon as the job fields are filled,
+        # so the webhook call overlaps with the rest of the form instead of blocking it.
+        # Only a new triple is submitted; other reruns of this stage leave the call alone.
+        triple_salario = (st.session_state.cargo, st.session_state.setor, st.session_state.empresa)
+        if all(triple_salario) and st.session_state.get("salary_submitted") != triple_salario:
+            salary_estimator().submit(*triple_salario)
+            st.session_state.salary_submitted = triple_salario
         # Ages.  Allow zero as default so that the form starts blank.  Minimums set to 0 to avoid
         # forcing a default age.  Users must provide sensible ages themselves.
         col1, col2, col3 = st.columns(3)
@@ -1540,200 +4329,23 @@ def main():
     # Stage: Results and projections
     elif st.session_state.stage == "results":
         st.header("Recomendações e Projeções")
+        # Per-stage timings of this run.  ``?debug=1`` only shows the panel; peak
+        # memory is traced when JERA_PIPELINE_DEBUG enables it for the process.
+        debug_pipeline = PIPELINE_DEBUG or "debug" in params
+        if "pipeline_session_id" not in st.session_state:
+            st.session_state.pipeline_session_id = uuid.uuid4().hex[:12]
+        timings = PipelineTimings(st.session_state.pipeline_session_id, trace_memory=PIPELINE_DEBUG).start()
         # Compute projections if not already done
         if "projections" not in st.session_state or st.session_state.projections is None:
-            df_brl, df_usd, df_incomes, capital_guard = compute_costs_and_incomes(
-                st.session_state.idade_cliente,
-                st.session_state.idade_conjuge,
-                st.session_state.idades_filhos,
-                st.session_state.escolas_filhos,
-                st.session_state.estudam_fora,
-                st.session_state.bairro,
-                st.session_state.metragem,
-                st.session_state.n_carros,
-                st.session_state.estilo_vida,
-                st.session_state.n_viagens,
-                st.session_state.n_funcionarios,
-                st.session_state.luxo_mensal,
-                st.session_state.segunda_resid_mensal,
-                # novos inputs de renda: alugueis e dividendos
-                st.session_state.aluguel_mensal_brl,
-                st.session_state.aluguel_growth_brl,
-                st.session_state.aluguel_mensal_usd,
-                st.session_state.aluguel_growth_usd,
-                st.session_state.dividendos_brl,
-                st.session_state.divid_growth_brl,
-                st.session_state.dividendos_usd,
-                st.session_state.divid_growth_usd,
-                st.session_state.patrimonio_inicial,
-                st.session_state.filantropia_anual,
-                int(st.session_state.anos_proj),
-                st.session_state.infl_brl_pct,
-                st.session_state.infl_usd_pct,
-                st.session_state.cotacao_usd,
-                st.session_state.salario_anual0,
-                st.session_state.idade_aposentadoria,
-                no_conjuge=bool(st.session_state.get("nao_tem_conjuge", False)),
-                scales=st.session_state.get("scales"),
-            )
-            # Net cash flows: income minus BRL expenses including USD conversion.  Persist this
-            # series in session state so it can be reused later for financial return calculations.
-            net_cash_series = (df_incomes["Total Renda (R$)"] - df_brl["Total (R$)"]).tolist()
-            st.session_state.net_cash_series = net_cash_series
-            anos_proj = int(st.session_state.anos_proj)
-            # Compute required capital guard for each year as the sum of the next
-            # four years of expenses minus the income in year i.  This yields
-            # the capital needed to cover four years of expenditures without
-            # relying on investment returns.  For the first year, we will
-            # override this value with the capital_guard computed in
-            # compute_costs_and_incomes (which already applies the 10% rule
-            # when expenses minus income is less than the first year's
-            # expenses).
-            required_caps: List[float] = []
-            for i in range(anos_proj):
-                # Sum expenses from year i to year i+3 inclusive (or until end of projection)
-                sum_exp = df_brl["Total (R$)"].iloc[i : i + 4].sum()
-                income_i = df_incomes["Total Renda (R$)"].iloc[i]
-                required_caps.append(sum_exp - income_i)
-            # Override the first required capital guard with the value computed
-            # by compute_costs_and_incomes.  This enforces the condition that
-            # the capital guard must be at least 10% of the investible patrimony
-            # when the projected expenses of the first four years minus the
-            # first year's income are less than the first year's expenses.
-            if required_caps:
-                required_caps[0] = capital_guard
-            # Compute aspirational initial value and its growth rate based on rentals, dividends and illiquid assets
-            # Apartments in Brazil and US
-            aluguel_ano_brl = st.session_state.aluguel_mensal_brl * 12.0
-            aluguel_ano_usd = st.session_state.aluguel_mensal_usd * 12.0
-            g_alug_brl = st.session_state.aluguel_growth_brl / 100.0
-            g_alug_usd = st.session_state.aluguel_growth_usd / 100.0
-            # Avoid division by zero or negative denominator
-            valor_apart_br = 0.0
-            # For Brazilian rentals, use a required return of 15%
-            if 0.15 - g_alug_brl > 0:
-                valor_apart_br = aluguel_ano_brl / (0.15 - g_alug_brl)
-            valor_apart_usd = 0.0
-            if 0.07 - g_alug_usd > 0:
-                valor_apart_usd = aluguel_ano_usd / (0.07 - g_alug_usd)
-            valor_apart_usd_brl = valor_apart_usd * st.session_state.cotacao_usd
-            # Participations based on dividends and fixed return assumptions (19% BR, 11% US)
-            g_div_brl = st.session_state.divid_growth_brl / 100.0
-            g_div_usd = st.session_state.divid_growth_usd / 100.0
-            valor_part_brl = 0.0
-            if (0.19 - g_div_brl) > 0:
-                valor_part_brl = st.session_state.dividendos_brl / (0.19 - g_div_brl)
-            valor_part_usd = 0.0
-            if (0.11 - g_div_usd) > 0:
-                valor_part_usd = st.session_state.dividendos_usd / (0.11 - g_div_usd)
-            # Convert international participations to BRL
-            valor_participacoes = valor_part_brl + valor_part_usd * st.session_state.cotacao_usd
-            # Illiquid assets
-            valor_iliq_total = 0.0
-            g_iliq_num = 0.0
-            if st.session_state.has_iliquido:
-                for vb, gb, vu, gu in zip(
-                    st.session_state.iliquido_vals_brl or [],
-                    st.session_state.iliquido_growth_brl or [],
-                    st.session_state.iliquido_vals_usd or [],
-                    st.session_state.iliquido_growth_usd or [],
-                ):
-                    v_brl = vb + vu * st.session_state.cotacao_usd
-                    valor_iliq_total += v_brl
-                    g_iliq_num += v_brl * (gb / 100.0 if v_brl > 0 else 0.0)
-            # Total aspirational initial
-            asp_initial = valor_apart_br + valor_apart_usd_brl + valor_participacoes + valor_iliq_total
-            # Compute weighted growth rate for aspirational
-            weighted_growth_sum = 0.0
-            weights_sum = 0.0
-            if valor_apart_br > 0:
-                weighted_growth_sum += valor_apart_br * g_alug_brl
-                weights_sum += valor_apart_br
-            if valor_apart_usd_brl > 0:
-                weighted_growth_sum += valor_apart_usd_brl * g_alug_usd
-                weights_sum += valor_apart_usd_brl
-            # Weighted growth for participations (BRL and USD portions)
-            if valor_participacoes > 0:
-                v_brl_part = valor_part_brl
-                v_usd_part_brl = valor_part_usd * st.session_state.cotacao_usd
-                total_part_brl = v_brl_part + v_usd_part_brl
-                if total_part_brl > 0:
-                    g_part = 0.0
-                    # Growth is weighted by the BRL value of each portion
-                    if v_brl_part > 0:
-                        g_part += (v_brl_part / total_part_brl) * g_div_brl
-                    if v_usd_part_brl > 0:
-                        g_part += (v_usd_part_brl / total_part_brl) * g_div_usd
-                else:
-                    g_part = 0.0
-                weighted_growth_sum += valor_participacoes * g_part
-                weights_sum += valor_participacoes
-            if valor_iliq_total > 0:
-                # g_iliq_num accumulated above uses growth*value; now divide by total value
-                g_iliq = g_iliq_num / valor_iliq_total
-                weighted_growth_sum += valor_iliq_total * g_iliq
-                weights_sum += valor_iliq_total
-            asp_growth = (weighted_growth_sum / asp_initial) if asp_initial > 0 and weights_sum > 0 else 0.0
+            projection_inputs = {key: st.session_state.get(key) for key in PROJECTION_INPUT_KEYS}
+            with pipeline_stage("projecoes"):
+                proj = PROJECTION_CACHE.get_or_compute(projection_inputs)
+            df_brl, df_usd, df_incomes, df_pat = proj["df_brl"], proj["df_usd"], proj["df_incomes"], proj["df_pat"]
+            # Persist the net cash series so it can be reused for financial return calculations.
+            st.session_state.net_cash_series = proj["net_cash_series"]
             # Persist aspirational initial and growth rate in session_state for reference
-            st.session_state.aspirational_inicial = asp_initial
-            st.session_state.aspirational_growth_rate = asp_growth * 100.0  # percent
-            # Build aspirational series year by year using individual component growths.
-            asp_series: List[float] = []
-            for i in range(anos_proj):
-                total_asp_i = 0.0
-                # Apartments
-                total_asp_i += valor_apart_br * ((1 + g_alug_brl) ** i)
-                total_asp_i += valor_apart_usd_brl * ((1 + g_alug_usd) ** i)
-                # Participations
-                total_asp_i += valor_part_brl * ((1 + g_div_brl) ** i)
-                total_asp_i += (valor_part_usd * st.session_state.cotacao_usd) * ((1 + g_div_usd) ** i)
-                # Illiquid assets
-                if st.session_state.has_iliquido:
-                    for vb, gb, vu, gu in zip(
-                        st.session_state.iliquido_vals_brl or [],
-                        st.session_state.iliquido_growth_brl or [],
-                        st.session_state.iliquido_vals_usd or [],
-                        st.session_state.iliquido_growth_usd or [],
-                    ):
-                        val_brl_i = vb * ((1 + (gb / 100.0)) ** i)
-                        val_usd_brl_i = vu * st.session_state.cotacao_usd * ((1 + (gu / 100.0)) ** i)
-                        total_asp_i += val_brl_i + val_usd_brl_i
-                asp_series.append(total_asp_i)
-            # Compute total patrimony at year 0: investible patrimony plus initial
-            # aspirational amount.  Do not add the capital guard again here
-            # because compute_patrimony_dynamic splits the investible
-            # patrimony into capital guard and endowment based on
-            # required_caps[0].  Adding it here would double count the
-            # capital guard and inflate the starting patrimony.
-            patrimonio_total_start = st.session_state.patrimonio_inicial + (asp_series[0] if asp_series else 0.0)
-            # Compute patrimony with dynamic capital guard and aspirational series.  The capital
-            # guard return reflects a mix of 70% domestic assets at 15% a.a. and 30% foreign
-            # assets at 4.5% a.a., resulting in an effective growth rate of 11.85% per year.
-            # Build lists of total expenses and total incomes for each year to feed into the
-            # patrimony calculation.  These lists will be used to recompute the capital guard
-            # requirements dynamically within compute_patrimony_dynamic.
-            df_brl_totals_list = df_brl["Total (R$)"].tolist()
-            df_incomes_totals_list = df_incomes["Total Renda (R$)"].tolist()
-            df_pat = compute_patrimony_dynamic(
-                # Only the investible patrimony (input) is passed here.  The aspirational
-                # portion is supplied separately via aspirational_series and should not
-                # inflate the investible amount used to compute the capital guard and
-                # endowment.  Passing patrimonio_total_start here was causing the
-                # endowment and capital guard to start with an inflated base.
-                st.session_state.patrimonio_inicial,
-                asp_series[0] if asp_series else asp_initial,
-                asp_growth * 100.0,
-                11.85,
-                anos_proj,
-                st.session_state.risk_profile,
-                df_brl_totals_list,
-                df_incomes_totals_list,
-                st.session_state.infl_brl_pct,
-                st.session_state.infl_usd_pct,
-                st.session_state.cotacao_usd,
-                net_cash=net_cash_series,
-                aspirational_series=asp_series,
-            )
+            st.session_state.aspirational_inicial = proj["aspirational_inicial"]
+            st.session_state.aspirational_growth_rate = proj["aspirational_growth_rate"]
             st.session_state.projections = (df_brl, df_usd, df_incomes, df_pat)
             # Store the actual capital guard series computed for later visualisations.
             st.session_state.capital_guard_list = df_pat["Capital Guard (R$)"].tolist()
@@ -1765,13 +4377,9 @@ def main():
             # Convert USD-denominated expenses to BRL using the projected FX for each year
             # rather than the initial constant rate.  The FX projection follows the
             # inflation differential: cotacao * ((1+infl_brl)/(1+infl_usd))**year.
-            n_years = len(df_usd)
-            cot_init = st.session_state.cotacao_usd if hasattr(st.session_state, "cotacao_usd") else 1.0
-            try:
-                ratio = (1 + st.session_state.infl_brl_pct / 100.0) / (1 + st.session_state.infl_usd_pct / 100.0)
-            except Exception:
-                ratio = 1.0
-            fx_series = np.array([cot_init * (ratio ** i) for i in range(n_years)])
+            fx_series = macro_path(
+                st.session_state.infl_brl_pct, st.session_state.infl_usd_pct, st.session_state.cotacao_usd, len(df_usd)
+            ).cotacoes
             gastos_usd_brl = df_usd["Total ($)"].values * fx_series
             # BRL-only expenses are total expenses minus USD expenses converted to BRL
             gastos_brl_only = df_brl["Total (R$)"].values - gastos_usd_brl
@@ -1785,7 +4393,8 @@ def main():
             data["Ganhos - Gastos (R$)"] = result.values
             df_cf = pd.DataFrame(data, index=cols).T
             return df_cf
-        df_cf = build_cash_flow(df_brl, df_usd, df_incomes)
+        with pipeline_stage("fluxo_caixa"):
+            df_cf = build_cash_flow(df_brl, df_usd, df_incomes)
         # Setup tabs: data review, recommended portfolio, results, adjustments
         # "Dados" allows users to review and edit all input assumptions after
         # running the initial projections.  Changes made here will trigger
@@ -1793,434 +4402,397 @@ def main():
         # Present tabs in the order: recommended portfolio first, then results,
         # adjustments and finally data.  This ensures that after completing the
         # risk questionnaire the user lands on the portfolio tab automatically.
-        tab1, tab2, tab3, tab_dados = st.tabs([
-            "Carteira recomendada",
-            "Resultados",
-            "Ajustes",
-            "Dados",
-        ])
+        # Tabs run lazily: selecting a tab reruns the script and only the open
+        # tab executes, so e.g. moving an Ajustes slider neither reruns the Monte
+        # Carlo blocks of the portfolio tab nor rebuilds the Excel export.
+        tab1, tab2, tab3, tab_dados = st.tabs(
+            [
+                "Carteira recomendada",
+                "Resultados",
+                "Ajustes",
+                "Dados",
+            ],
+            key="abas_resultados",
+            on_change="rerun",
+        )
 
         # Tab 0: Dados (client data review & edit)
         with tab_dados:
-            st.subheader("Dados do Cliente")
-            # Decorative photo removed at client's request; keeping the layout unchanged
-            # Capture current values into local variables for editing.  We don't
-            # update session state until the user clicks the save button.
-            # Text inputs
-            cargo_val = st.text_input("Cargo", value=st.session_state.cargo or "")
-            setor_val = st.text_input("Setor", value=st.session_state.setor or "")
-            empresa_val = st.text_input("Empresa", value=st.session_state.empresa or "")
-            # Age inputs
-            col_dat1, col_dat2, col_dat3 = st.columns(3)
-            idade_cli_val = col_dat1.number_input(
-                "Idade do cliente", min_value=0, max_value=120, value=int(st.session_state.idade_cliente or 0), step=1
-            )
-            idade_conj_val = col_dat2.number_input(
-                "Idade do cônjuge", min_value=0, max_value=120, value=int(st.session_state.idade_conjuge or 0), step=1
-            )
-            # Checkbox to indicate absence of a spouse.  When checked, the spouse age
-            # is ignored in projections and only one adult is counted for expenses.
-            nao_tem_conjuge_val = col_dat2.checkbox(
-                "Não tenho cônjuge",
-                value=bool(st.session_state.nao_tem_conjuge) if st.session_state.nao_tem_conjuge is not None else False,
-            )
-            idade_apos_val = col_dat3.number_input(
-                "Idade desejada de aposentadoria", min_value=0, max_value=120, value=int(st.session_state.idade_aposentadoria or 0), step=1
-            )
-            # Number of children
-            n_filhos_val = st.number_input(
-                "Número de filhos", min_value=0, max_value=10, value=int(st.session_state.n_filhos or 0), step=1
-            )
-            # Prepare lists for children ages, schools and abroad flags
-            n_children = int(n_filhos_val)
-            # Ensure existing lists have correct length
-            idades_filhos_val = list(st.session_state.idades_filhos) if st.session_state.idades_filhos else []
-            escolas_filhos_val = list(st.session_state.escolas_filhos) if st.session_state.escolas_filhos else []
-            estudam_fora_val = list(st.session_state.estudam_fora) if st.session_state.estudam_fora else []
-            if len(idades_filhos_val) != n_children:
-                idades_filhos_val = [10] * n_children
-            if len(escolas_filhos_val) != n_children:
-                escolas_filhos_val = [""] * n_children
-            if len(estudam_fora_val) != n_children:
-                estudam_fora_val = [False] * n_children
-            if n_children > 0:
-                st.markdown("### Filhos")
-                try:
-                    school_names = sorted({esc["nome"] for esc in PREMISES.get("educacao", {}).get("escolas", [])
-                                           if "nome" in esc})
-                except (KeyError, TypeError):
-                    school_names = []
-                for i in range(n_children):
-                    colA, colB, colC = st.columns([1, 2, 2])
-                    idades_filhos_val[i] = colA.number_input(
-                        f"Idade do filho {i+1}", min_value=0, max_value=40, value=int(idades_filhos_val[i]), step=1, key=f"dados_idade_filho_{i}"
-                    )
-                    idade_f = idades_filhos_val[i]
-                    # Escola para idades até 17
-                    if idade_f <= 17:
-                        escol_options = ["Nenhuma"] + school_names
-                        selected = escolas_filhos_val[i] if escolas_filhos_val[i] else "Nenhuma"
-                        escol_val = colB.selectbox(
-                            f"Escola do filho {i+1}", escol_options, index=escol_options.index(selected), key=f"dados_escola_filho_{i}"
-                        )
-                        escolas_filhos_val[i] = escol_val if escol_val != "Nenhuma" else ""
-                        ext_val = colC.selectbox(
-                            f"Estuda fora aos 18?", ["Não", "Sim"], index=1 if estudam_fora_val[i] else 0, key=f"dados_estuda_fora_{i}"
+            if tab_dados.open:
+                st.subheader("Dados do Cliente")
+                # Decorative photo removed at client's request; keeping the layout unchanged
+                # Capture current values into local variables for editing.  We don't
+                # update session state until the user clicks the save button.
+                # Text inputs
+                cargo_val = st.text_input("Cargo", value=st.session_state.cargo or "")
+                setor_val = st.text_input("Setor", value=st.session_state.setor or "")
+                empresa_val = st.text_input("Empresa", value=st.session_state.empresa or "")
+                # Age inputs
+                col_dat1, col_dat2, col_dat3 = st.columns(3)
+                idade_cli_val = col_dat1.number_input(
+                    "Idade do cliente", min_value=0, max_value=120, value=int(st.session_state.idade_cliente or 0), step=1
+                )
+                idade_conj_val = col_dat2.number_input(
+                    "Idade do cônjuge", min_value=0, max_value=120, value=int(st.session_state.idade_conjuge or 0), step=1
+                )
+                # Checkbox to indicate absence of a spouse.  When checked, the spouse age
+                # is ignored in projections and only one adult is counted for expenses.
+                nao_tem_conjuge_val = col_dat2.checkbox(
+                    "Não tenho cônjuge",
+                    value=bool(st.session_state.nao_tem_conjuge) if st.session_state.nao_tem_conjuge is not None else False,
+                )
+                idade_apos_val = col_dat3.number_input(
+                    "Idade desejada de aposentadoria", min_value=0, max_value=120, value=int(st.session_state.idade_aposentadoria or 0), step=1
+                )
+                # Number of children
+                n_filhos_val = st.number_input(
+                    "Número de filhos", min_value=0, max_value=10, value=int(st.session_state.n_filhos or 0), step=1
+                )
+                # Prepare lists for children ages, schools and abroad flags
+                n_children = int(n_filhos_val)
+                # Ensure existing lists have correct length
+                idades_filhos_val = list(st.session_state.idades_filhos) if st.session_state.idades_filhos else []
+                escolas_filhos_val = list(st.session_state.escolas_filhos) if st.session_state.escolas_filhos else []
+                estudam_fora_val = list(st.session_state.estudam_fora) if st.session_state.estudam_fora else []
+                if len(idades_filhos_val) != n_children:
+                    idades_filhos_val = [10] * n_children
+                if len(escolas_filhos_val) != n_children:
+                    escolas_filhos_val = [""] * n_children
+                if len(estudam_fora_val) != n_children:
+                    estudam_fora_val = [False] * n_children
+                if n_children > 0:
+                    st.markdown("### Filhos")
+                    try:
+                        school_names = sorted({esc["nome"] for esc in PREMISES.get("educacao", {}).get("escolas", [])
+                                               if "nome" in esc})
+                    except (KeyError, TypeError):
+                        school_names = []
+                    for i in range(n_children):
+                        colA, colB, colC = st.columns([1, 2, 2])
+                        idades_filhos_val[i] = colA.number_input(
+                            f"Idade do filho {i+1}", min_value=0, max_value=40, value=int(idades_filhos_val[i]), step=1, key=f"dados_idade_filho_{i}"
                         )
-                        estudam_fora_val[i] = True if ext_val == "Sim" else False
-                    else:
-                        escolas_filhos_val[i] = ""
-                        if 18 <= idade_f <= 21:
+                        idade_f = idades_filhos_val[i]
+                        # Escola para idades até 17
+                        if idade_f <= 17:
+                            escol_options = ["Nenhuma"] + school_names
+                            selected = escolas_filhos_val[i] if escolas_filhos_val[i] else "Nenhuma"
+                            escol_val = colB.selectbox(
+                                f"Escola do filho {i+1}", escol_options, index=escol_options.index(selected), key=f"dados_escola_filho_{i}"
+                            )
+                            escolas_filhos_val[i] = escol_val if escol_val != "Nenhuma" else ""
                             ext_val = colC.selectbox(
-                                f"Faz faculdade fora?", ["Não", "Sim"], index=1 if estudam_fora_val[i] else 0, key=f"dados_faculdade_fora_{i}"
+                                f"Estuda fora aos 18?", ["Não", "Sim"], index=1 if estudam_fora_val[i] else 0, key=f"dados_estuda_fora_{i}"
                             )
                             estudam_fora_val[i] = True if ext_val == "Sim" else False
                         else:
-                            estudam_fora_val[i] = False
-            # Residence and lifestyle.  Include a "Selecione" option for bairro and start metragem
-            # at zero.  Cars and trips default to zero as well.
-            col_r1, col_r2 = st.columns(2)
-            try:
-                bairro_opts = ["Selecione"] + [b["nome"] for b in PREMISES.get("moradia", {}).get("bairros", [])
-                                               if "nome" in b]
-            except (KeyError, TypeError):
-                bairro_opts = ["Selecione"]
-            bairro_idx = 0
-            if st.session_state.bairro and st.session_state.bairro in bairro_opts:
-                bairro_idx = bairro_opts.index(st.session_state.bairro)
-            bairro_val = col_r1.selectbox(
-                "Bairro do imóvel principal",
-                options=bairro_opts,
-                index=bairro_idx,
-            )
-            if bairro_val == "Selecione":
-                bairro_val = ""
-            metragem_val = col_r2.number_input(
-                "Metragem do imóvel (m²)", min_value=0.0, max_value=5000.0, value=float(st.session_state.metragem or 0.0), step=10.0
-            )
-            col_r3, col_r4, col_r5 = st.columns(3)
-            n_carros_val = col_r3.number_input(
-                "Número de carros", min_value=0, max_value=10, value=int(st.session_state.n_carros or 0), step=1
-            )
-            # Lifestyle selection (numeric labels 1, 2, 3).
-            estilo_labels_local = ["1", "2", "3"]
-            estilo_map_local = {"1": 1, "2": 2, "3": 3}
-            estilo_reverse_local = {v: k for k, v in estilo_map_local.items()}
-            estilo_str_current_val = estilo_reverse_local.get(st.session_state.estilo_vida, "2")
-            estilo_str_val = col_r4.selectbox(
-                "Estilo de vida",
-                estilo_labels_local,
-                index=estilo_labels_local.index(estilo_str_current_val),
-            )
-            estilo_vida_val = estilo_map_local[estilo_str_val]
-            n_viagens_val = col_r5.number_input(
-                "Número de viagens internacionais por ano", min_value=0, max_value=12, value=int(st.session_state.n_viagens or 0), step=1
-            )
-            # Number of employees employed by the client
-            n_funcionarios_val = st.number_input(
-                "Número de funcionários",
-                min_value=0,
-                max_value=20,
-                value=int(st.session_state.n_funcionarios or 0),
-                step=1,
-            )
-            # Luxury
-            possui_luxo_val = st.selectbox(
-                "Possui ativos de luxo?", ["Não", "Sim"], index=1 if (st.session_state.luxo_mensal or 0) > 0 else 0
-            )
-            if possui_luxo_val == "Sim":
-                luxo_mensal_val = st.number_input(
-                    "Gasto mensal com ativos de luxo (R$)",
+                            escolas_filhos_val[i] = ""
+                            if 18 <= idade_f <= 21:
+                                ext_val = colC.selectbox(
+                                    f"Faz faculdade fora?", ["Não", "Sim"], index=1 if estudam_fora_val[i] else 0, key=f"dados_faculdade_fora_{i}"
+                                )
+                                estudam_fora_val[i] = True if ext_val == "Sim" else False
+                            else:
+                                estudam_fora_val[i] = False
+                # Residence and lifestyle.  Include a "Selecione" option for bairro and start metragem
+                # at zero.  Cars and trips default to zero as well.
+                col_r1, col_r2 = st.columns(2)
+                try:
+                    bairro_opts = ["Selecione"] + [b["nome"] for b in PREMISES.get("moradia", {}).get("bairros", [])
+                                                   if "nome" in b]
+                except (KeyError, TypeError):
+                    bairro_opts = ["Selecione"]
+                bairro_idx = 0
+                if st.session_state.bairro and st.session_state.bairro in bairro_opts:
+                    bairro_idx = bairro_opts.index(st.session_state.bairro)
+                bairro_val = col_r1.selectbox(
+                    "Bairro do imóvel principal",
+                    options=bairro_opts,
+                    index=bairro_idx,
+                )
+                if bairro_val == "Selecione":
+                    bairro_val = ""
+                metragem_val = col_r2.number_input(
+                    "Metragem do imóvel (m²)", min_value=0.0, max_value=5000.0, value=float(st.session_state.metragem or 0.0), step=10.0
+                )
+                col_r3, col_r4, col_r5 = st.columns(3)
+                n_carros_val = col_r3.number_input(
+                    "Número de carros", min_value=0, max_value=10, value=int(st.session_state.n_carros or 0), step=1
+                )
+                # Lifestyle selection (numeric labels 1, 2, 3).
+                estilo_labels_local = ["1", "2", "3"]
+                estilo_map_local = {"1": 1, "2": 2, "3": 3}
+                estilo_reverse_local = {v: k for k, v in estilo_map_local.items()}
+                estilo_str_current_val = estilo_reverse_local.get(st.session_state.estilo_vida, "2")
+                estilo_str_val = col_r4.selectbox(
+                    "Estilo de vida",
+                    estilo_labels_local,
+                    index=estilo_labels_local.index(estilo_str_current_val),
+                )
+                estilo_vida_val = estilo_map_local[estilo_str_val]
+                n_viagens_val = col_r5.number_input(
+                    "Número de viagens internacionais por ano", min_value=0, max_value=12, value=int(st.session_state.n_viagens or 0), step=1
+                )
+                # Number of employees employed by the client
+                n_funcionarios_val = st.number_input(
+                    "Número de funcionários",
+                    min_value=0,
+                    max_value=20,
+                    value=int(st.session_state.n_funcionarios or 0),
+                    step=1,
+                )
+                # Luxury
+                possui_luxo_val = st.selectbox(
+                    "Possui ativos de luxo?", ["Não", "Sim"], index=1 if (st.session_state.luxo_mensal or 0) > 0 else 0
+                )
+                if possui_luxo_val == "Sim":
+                    luxo_mensal_val = st.number_input(
+                        "Gasto mensal com ativos de luxo (R$)",
+                        min_value=0.0,
+                        max_value=10_000_000.0,
+                        value=float(st.session_state.luxo_mensal or 0.0),
+                        step=1000.0,
+                    )
+                else:
+                    luxo_mensal_val = 0.0
+                # Second residence (monthly cost), analogous to luxury spending.
+                possui_seg_res_val = st.selectbox(
+                    "Possui segunda residência?",
+                    ["Não", "Sim"],
+                    index=1 if (st.session_state.segunda_resid_mensal or 0) > 0 else 0,
+                )
+                if possui_seg_res_val == "Sim":
+                    # Remove the arbitrary 10M cap so users with very high expenses can enter
+                    # any positive value without causing the app to freeze.
+                    seg_resid_mensal_val = st.number_input(
+                        "Gasto mensal com segunda residência (R$)",
+                        min_value=0.0,
+                        value=float(st.session_state.segunda_resid_mensal or 0.0),
+                        step=1000.0,
+                    )
+                else:
+                    seg_resid_mensal_val = 0.0
+                # Passive income: aluguéis e dividendos
+                st.markdown("### Rendimentos passivos")
+                col_i1, col_i2 = st.columns(2)
+                aluguel_brl_val = col_i1.number_input(
+                    "Aluguéis mensais (R$)",
                     min_value=0.0,
-                    max_value=10_000_000.0,
-                    value=float(st.session_state.luxo_mensal or 0.0),
+                    value=float(st.session_state.aluguel_mensal_brl or 0.0),
                     step=1000.0,
                 )
-            else:
-                luxo_mensal_val = 0.0
-            # Second residence (monthly cost), analogous to luxury spending.
-            possui_seg_res_val = st.selectbox(
-                "Possui segunda residência?",
-                ["Não", "Sim"],
-                index=1 if (st.session_state.segunda_resid_mensal or 0) > 0 else 0,
-            )
-            if possui_seg_res_val == "Sim":
-                # Remove the arbitrary 10M cap so users with very high expenses can enter
-                # any positive value without causing the app to freeze.
-                seg_resid_mensal_val = st.number_input(
-                    "Gasto mensal com segunda residência (R$)",
+                aluguel_growth_brl_val = col_i1.number_input(
+                    "Crescimento esperado aluguel BRL (%)", min_value=0.0, max_value=50.0, value=float(st.session_state.aluguel_growth_brl or 0.0), step=0.5
+                )
+                aluguel_usd_val = col_i2.number_input(
+                    "Aluguéis mensais (USD)",
                     min_value=0.0,
-                    value=float(st.session_state.segunda_resid_mensal or 0.0),
+                    value=float(st.session_state.aluguel_mensal_usd or 0.0),
                     step=1000.0,
                 )
-            else:
-                seg_resid_mensal_val = 0.0
-            # Passive income: aluguéis e dividendos
-            st.markdown("### Rendimentos passivos")
-            col_i1, col_i2 = st.columns(2)
-            aluguel_brl_val = col_i1.number_input(
-                "Aluguéis mensais (R$)",
-                min_value=0.0,
-                value=float(st.session_state.aluguel_mensal_brl or 0.0),
-                step=1000.0,
-            )
-            aluguel_growth_brl_val = col_i1.number_input(
-                "Crescimento esperado aluguel BRL (%)", min_value=0.0, max_value=50.0, value=float(st.session_state.aluguel_growth_brl or 0.0), step=0.5
-            )
-            aluguel_usd_val = col_i2.number_input(
-                "Aluguéis mensais (USD)",
-                min_value=0.0,
-                value=float(st.session_state.aluguel_mensal_usd or 0.0),
-                step=1000.0,
-            )
-            aluguel_growth_usd_val = col_i2.number_input(
-                "Crescimento esperado aluguel USD (%)", min_value=0.0, max_value=50.0, value=float(st.session_state.aluguel_growth_usd or 0.0), step=0.5
-            )
-            dividendos_brl_val = col_i1.number_input(
-                "Dividendos anuais (R$)",
-                min_value=0.0,
-                value=float(st.session_state.dividendos_brl or 0.0),
-                step=1000.0,
-            )
-            divid_growth_brl_val = col_i1.number_input(
-                "Crescimento esperado dividendos BRL (%)", min_value=0.0, max_value=50.0, value=float(st.session_state.divid_growth_brl or 0.0), step=0.5
-            )
-            dividendos_usd_val = col_i2.number_input(
-                "Dividendos anuais (USD)",
-                min_value=0.0,
-                value=float(st.session_state.dividendos_usd or 0.0),
-                step=1000.0,
-            )
-            divid_growth_usd_val = col_i2.number_input(
-                "Crescimento esperado dividendos USD (%)", min_value=0.0, max_value=50.0, value=float(st.session_state.divid_growth_usd or 0.0), step=0.5
-            )
-            # Dividend Yield is removed from user inputs.  Yield assumptions are fixed (19% BRL, 11% USD).
-            # Illiquid assets
-            possui_iliq_val = st.selectbox(
-                "Possui patrimônio ilíquido extra?", ["Não", "Sim"], index=1 if st.session_state.get("has_iliquido", False) else 0
-            )
-            has_iliq = True if possui_iliq_val == "Sim" else False
-            if has_iliq:
-                n_il_val = st.number_input(
-                    "Número de patrimônios ilíquidos", min_value=1, max_value=10, value=int(st.session_state.n_iliquidos or 1), step=1
+                aluguel_growth_usd_val = col_i2.number_input(
+                    "Crescimento esperado aluguel USD (%)", min_value=0.0, max_value=50.0, value=float(st.session_state.aluguel_growth_usd or 0.0), step=0.5
                 )
-                n_il = int(n_il_val)
-                # Ensure arrays have correct length
-                iliq_vals_brl = list(st.session_state.iliquido_vals_brl) if st.session_state.iliquido_vals_brl else []
-                iliq_growth_brl = list(st.session_state.iliquido_growth_brl) if st.session_state.iliquido_growth_brl else []
-                iliq_vals_usd = list(st.session_state.iliquido_vals_usd) if st.session_state.iliquido_vals_usd else []
-                iliq_growth_usd = list(st.session_state.iliquido_growth_usd) if st.session_state.iliquido_growth_usd else []
-                if len(iliq_vals_brl) != n_il:
-                    iliq_vals_brl = [0.0] * n_il
-                if len(iliq_growth_brl) != n_il:
-                    iliq_growth_brl = [0.0] * n_il
-                if len(iliq_vals_usd) != n_il:
-                    iliq_vals_usd = [0.0] * n_il
-                if len(iliq_growth_usd) != n_il:
-                    iliq_growth_usd = [0.0] * n_il
-                for i in range(n_il):
-                    st.markdown(f"##### Patrimônio ilíquido {i+1}")
-                    c1, c2, c3, c4 = st.columns(4)
-                    iliq_vals_brl[i] = c1.number_input(
-                        f"Valor (R$) – bem {i+1}", min_value=0.0, max_value=1_000_000_000.0, value=float(iliq_vals_brl[i] or 0.0), step=10_000.0, key=f"dados_iliq_val_brl_{i}"
-                    )
-                    iliq_growth_brl[i] = c2.number_input(
-                        f"Crescimento BRL (%) – bem {i+1}", min_value=0.0, max_value=50.0, value=float(iliq_growth_brl[i] or 0.0), step=0.5, key=f"dados_iliq_growth_brl_{i}"
-                    )
-                    iliq_vals_usd[i] = c3.number_input(
-                        f"Valor (USD) – bem {i+1}", min_value=0.0, max_value=1_000_000_000.0, value=float(iliq_vals_usd[i] or 0.0), step=10_000.0, key=f"dados_iliq_val_usd_{i}"
-                    )
-                    iliq_growth_usd[i] = c4.number_input(
-                        f"Crescimento USD (%) – bem {i+1}", min_value=0.0, max_value=50.0, value=float(iliq_growth_usd[i] or 0.0), step=0.5, key=f"dados_iliq_growth_usd_{i}"
-                    )
-            else:
-                n_il = 0
-                iliq_vals_brl, iliq_growth_brl, iliq_vals_usd, iliq_growth_usd = [], [], [], []
-            # Patrimony
-            col_p1 = st.columns(1)[0]
-            patrimonio_inicial_val = col_p1.number_input(
-                "Patrimônio investível (R$)", min_value=0.0, max_value=1_000_000_000.0, value=float(st.session_state.patrimonio_inicial or 0.0), step=50_000.0
-            )
-            # Philanthropy and projections
-            col_ph1, col_ph2, col_ph3 = st.columns(3)
-            filantropia_val = col_ph1.number_input(
-                "Gasto anual com filantropia (R$)", min_value=0.0, max_value=10_000_000.0, value=float(st.session_state.filantropia_anual or 0.0), step=1000.0
-            )
-            anos_proj_val = col_ph2.number_input(
-                "Número de anos a projetar", min_value=1, max_value=100, value=int(st.session_state.anos_proj or 30), step=1
-            )
-            # Inflation and FX
-            col_inf1, col_inf2, col_inf3 = st.columns(3)
-            infl_brl_val = col_inf1.number_input(
-                "Inflação BRL (%)", min_value=0.0, max_value=20.0, value=float(st.session_state.infl_brl_pct or 0.0), step=0.1
-            )
-            infl_usd_val = col_inf2.number_input(
-                "Inflação USD (%)", min_value=0.0, max_value=20.0, value=float(st.session_state.infl_usd_pct or 0.0), step=0.1
-            )
-            cotacao_usd_val = col_inf3.number_input(
-                "Cotação USD/BRL", min_value=0.0, max_value=20.0, value=float(st.session_state.cotacao_usd or 0.0), step=0.01
-            )
-            # Salary manual override
-            salario_manual_val = st.number_input(
-                "Salário anual (R$)", min_value=0.0, max_value=100_000_000.0, value=float(st.session_state.salario_anual0 or 0.0), step=10_000.0
-            )
-            # Save button updates session state and triggers recalculation
-            if st.button("Salvar Dados", key="save_dados"):
-                st.session_state.cargo = cargo_val
-                st.session_state.setor = setor_val
-                st.session_state.empresa = empresa_val
-                st.session_state.idade_cliente = int(idade_cli_val)
-                st.session_state.idade_conjuge = int(idade_conj_val)
-                st.session_state.idade_aposentadoria = int(idade_apos_val)
-                st.session_state.n_filhos = int(n_filhos_val)
-                st.session_state.idades_filhos = [int(v) for v in idades_filhos_val]
-                st.session_state.escolas_filhos = list(escolas_filhos_val)
-                st.session_state.estudam_fora = list(estudam_fora_val)
-                st.session_state.bairro = bairro_val
-                st.session_state.metragem = float(metragem_val)
-                st.session_state.n_carros = int(n_carros_val)
-                st.session_state.estilo_vida = int(estilo_vida_val)
-                st.session_state.n_viagens = int(n_viagens_val)
-                st.session_state.n_funcionarios = int(n_funcionarios_val)
-                st.session_state.luxo_mensal = float(luxo_mensal_val)
-                st.session_state.segunda_resid_mensal = float(seg_resid_mensal_val)
-                st.session_state.nao_tem_conjuge = bool(nao_tem_conjuge_val)
-                # Update passive incomes
-                st.session_state.aluguel_mensal_brl = float(aluguel_brl_val)
-                st.session_state.aluguel_growth_brl = float(aluguel_growth_brl_val)
-                st.session_state.aluguel_mensal_usd = float(aluguel_usd_val)
-                st.session_state.aluguel_growth_usd = float(aluguel_growth_usd_val)
-                st.session_state.dividendos_brl = float(dividendos_brl_val)
-                st.session_state.divid_growth_brl = float(divid_growth_brl_val)
-                st.session_state.dividendos_usd = float(dividendos_usd_val)
-                st.session_state.divid_growth_usd = float(divid_growth_usd_val)
+                dividendos_brl_val = col_i1.number_input(
+                    "Dividendos anuais (R$)",
+                    min_value=0.0,
+                    value=float(st.session_state.dividendos_brl or 0.0),
+                    step=1000.0,
+                )
+                divid_growth_brl_val = col_i1.number_input(
+                    "Crescimento esperado dividendos BRL (%)", min_value=0.0, max_value=50.0, value=float(st.session_state.divid_growth_brl or 0.0), step=0.5
+                )
+                dividendos_usd_val = col_i2.number_input(
+                    "Dividendos anuais (USD)",
+                    min_value=0.0,
+                    value=float(st.session_state.dividendos_usd or 0.0),
+                    step=1000.0,
+                )
+                divid_growth_usd_val = col_i2.number_input(
+                    "Crescimento esperado dividendos USD (%)", min_value=0.0, max_value=50.0, value=float(st.session_state.divid_growth_usd or 0.0), step=0.5
+                )
+                # Dividend Yield is removed from user inputs.  Yield assumptions are fixed (19% BRL, 11% USD).
                 # Illiquid assets
-                st.session_state.has_iliquido = has_iliq
-                st.session_state.n_iliquidos = int(n_il)
-                st.session_state.iliquido_vals_brl = [float(v) for v in iliq_vals_brl]
-                st.session_state.iliquido_growth_brl = [float(v) for v in iliq_growth_brl]
-                st.session_state.iliquido_vals_usd = [float(v) for v in iliq_vals_usd]
-                st.session_state.iliquido_growth_usd = [float(v) for v in iliq_growth_usd]
-                # Patrimony and other parameters
-                st.session_state.patrimonio_inicial = float(patrimonio_inicial_val)
-                st.session_state.filantropia_anual = float(filantropia_val)
-                st.session_state.anos_proj = int(anos_proj_val)
-                st.session_state.infl_brl_pct = float(infl_brl_val)
-                st.session_state.infl_usd_pct = float(infl_usd_val)
-                st.session_state.cotacao_usd = float(cotacao_usd_val)
-                st.session_state.salario_anual0 = float(salario_manual_val)
-                # Reset projections so that recalculation happens on next load
-                st.session_state.projections = None
-                # On save, reset risk stage to results so user can review the changes
-                # (but do not modify stage here; next load will recompute)
+                possui_iliq_val = st.selectbox(
+                    "Possui patrimônio ilíquido extra?", ["Não", "Sim"], index=1 if st.session_state.get("has_iliquido", False) else 0
+                )
+                has_iliq = True if possui_iliq_val == "Sim" else False
+                if has_iliq:
+                    n_il_val = st.number_input(
+                        "Número de patrimônios ilíquidos", min_value=1, max_value=10, value=int(st.session_state.n_iliquidos or 1), step=1
+                    )
+                    n_il = int(n_il_val)
+                    # Ensure arrays have correct length
+                    iliq_vals_brl = list(st.session_state.iliquido_vals_brl) if st.session_state.iliquido_vals_brl else []
+                    iliq_growth_brl = list(st.session_state.iliquido_growth_brl) if st.session_state.iliquido_growth_brl else []
+                    iliq_vals_usd = list(st.session_state.iliquido_vals_usd) if st.session_state.iliquido_vals_usd else []
+                    iliq_growth_usd = list(st.session_state.iliquido_growth_usd) if st.session_state.iliquido_growth_usd else []
+                    if len(iliq_vals_brl) != n_il:
+                        iliq_vals_brl = [0.0] * n_il
+                    if len(iliq_growth_brl) != n_il:
+                        iliq_growth_brl = [0.0] * n_il
+                    if len(iliq_vals_usd) != n_il:
+                        iliq_vals_usd = [0.0] * n_il
+                    if len(iliq_growth_usd) != n_il:
+                        iliq_growth_usd = [0.0] * n_il
+                    for i in range(n_il):
+                        st.markdown(f"##### Patrimônio ilíquido {i+1}")
+                        c1, c2, c3, c4 = st.columns(4)
+                        iliq_vals_brl[i] = c1.number_input(
+                            f"Valor (R$) – bem {i+1}", min_value=0.0, max_value=1_000_000_000.0, value=float(iliq_vals_brl[i] or 0.0), step=10_000.0, key=f"dados_iliq_val_brl_{i}"
+                        )
+                        iliq_growth_brl[i] = c2.number_input(
+                            f"Crescimento BRL (%) – bem {i+1}", min_value=0.0, max_value=50.0, value=float(iliq_growth_brl[i] or 0.0), step=0.5, key=f"dados_iliq_growth_brl_{i}"
+                        )
+                        iliq_vals_usd[i] = c3.number_input(
+                            f"Valor (USD) – bem {i+1}", min_value=0.0, max_value=1_000_000_000.0, value=float(iliq_vals_usd[i] or 0.0), step=10_000.0, key=f"dados_iliq_val_usd_{i}"
+                        )
+                        iliq_growth_usd[i] = c4.number_input(
+                            f"Crescimento USD (%) – bem {i+1}", min_value=0.0, max_value=50.0, value=float(iliq_growth_usd[i] or 0.0), step=0.5, key=f"dados_iliq_growth_usd_{i}"
+                        )
+                else:
+                    n_il = 0
+                    iliq_vals_brl, iliq_growth_brl, iliq_vals_usd, iliq_growth_usd = [], [], [], []
+                # Patrimony
+                col_p1 = st.columns(1)[0]
+                patrimonio_inicial_val = col_p1.number_input(
+                    "Patrimônio investível (R$)", min_value=0.0, max_value=1_000_000_000.0, value=float(st.session_state.patrimonio_inicial or 0.0), step=50_000.0
+                )
+                # Philanthropy and projections
+                col_ph1, col_ph2, col_ph3 = st.columns(3)
+                filantropia_val = col_ph1.number_input(
+                    "Gasto anual com filantropia (R$)", min_value=0.0, max_value=10_000_000.0, value=float(st.session_state.filantropia_anual or 0.0), step=1000.0
+                )
+                anos_proj_val = col_ph2.number_input(
+                    "Número de anos a projetar", min_value=1, max_value=100, value=int(st.session_state.anos_proj or 30), step=1
+                )
+                # Inflation and FX
+                col_inf1, col_inf2, col_inf3 = st.columns(3)
+                infl_brl_val = col_inf1.number_input(
+                    "Inflação BRL (%)", min_value=0.0, max_value=20.0, value=float(st.session_state.infl_brl_pct or 0.0), step=0.1
+                )
+                infl_usd_val = col_inf2.number_input(
+                    "Inflação USD (%)", min_value=0.0, max_value=20.0, value=float(st.session_state.infl_usd_pct or 0.0), step=0.1
+                )
+                cotacao_usd_val = col_inf3.number_input(
+                    "Cotação USD/BRL", min_value=0.0, max_value=20.0, value=float(st.session_state.cotacao_usd or 0.0), step=0.01
+                )
+                # Salary manual override
+                salario_manual_val = st.number_input(
+                    "Salário anual (R$)", min_value=0.0, max_value=100_000_000.0, value=float(st.session_state.salario_anual0 or 0.0), step=10_000.0
+                )
+                # Save button updates session state and triggers recalculation
+                if st.button("Salvar Dados", key="save_dados"):
+                    st.session_state.cargo = cargo_val
+                    st.session_state.setor = setor_val
+                    st.session_state.empresa = empresa_val
+                    st.session_state.idade_cliente = int(idade_cli_val)
+                    st.session_state.idade_conjuge = int(idade_conj_val)
+                    st.session_state.idade_aposentadoria = int(idade_apos_val)
+                    st.session_state.n_filhos = int(n_filhos_val)
+                    st.session_state.idades_filhos = [int(v) for v in idades_filhos_val]
+                    st.session_state.escolas_filhos = list(escolas_filhos_val)
+                    st.session_state.estudam_fora = list(estudam_fora_val)
+                    st.session_state.bairro = bairro_val
+                    st.session_state.metragem = float(metragem_val)
+                    st.session_state.n_carros = int(n_carros_val)
+                    st.session_state.estilo_vida = int(estilo_vida_val)
+                    st.session_state.n_viagens = int(n_viagens_val)
+                    st.session_state.n_funcionarios = int(n_funcionarios_val)
+                    st.session_state.luxo_mensal = float(luxo_mensal_val)
+                    st.session_state.segunda_resid_mensal = float(seg_resid_mensal_val)
+                    st.session_state.nao_tem_conjuge = bool(nao_tem_conjuge_val)
+                    # Update passive incomes
+                    st.session_state.aluguel_mensal_brl = float(aluguel_brl_val)
+                    st.session_state.aluguel_growth_brl = float(aluguel_growth_brl_val)
+                    st.session_state.aluguel_mensal_usd = float(aluguel_usd_val)
+                    st.session_state.aluguel_growth_usd = float(aluguel_growth_usd_val)
+                    st.session_state.dividendos_brl = float(dividendos_brl_val)
+                    st.session_state.divid_growth_brl = float(divid_growth_brl_val)
+                    st.session_state.dividendos_usd = float(dividendos_usd_val)
+                    st.session_state.divid_growth_usd = float(divid_growth_usd_val)
+                    # Illiquid assets
+                    st.session_state.has_iliquido = has_iliq
+                    st.session_state.n_iliquidos = int(n_il)
+                    st.session_state.iliquido_vals_brl = [float(v) for v in iliq_vals_brl]
+                    st.session_state.iliquido_growth_brl = [float(v) for v in iliq_growth_brl]
+                    st.session_state.iliquido_vals_usd = [float(v) for v in iliq_vals_usd]
+                    st.session_state.iliquido_growth_usd = [float(v) for v in iliq_growth_usd]
+                    # Patrimony and other parameters
+                    st.session_state.patrimonio_inicial = float(patrimonio_inicial_val)
+                    st.session_state.filantropia_anual = float(filantropia_val)
+                    st.session_state.anos_proj = int(anos_proj_val)
+                    st.session_state.infl_brl_pct = float(infl_brl_val)
+                    st.session_state.infl_usd_pct = float(infl_usd_val)
+                    st.session_state.cotacao_usd = float(cotacao_usd_val)
+                    st.session_state.salario_anual0 = float(salario_manual_val)
+                    # Reset projections so that recalculation happens on next load
+                    st.session_state.projections = None
+                    # On save, reset risk stage to results so user can review the changes
+                    # (but do not modify stage here; next load will recompute)
         # Tab 1: recommended portfolio
         with tab1:
-            st.subheader("Carteira Recomendada")
-            st.success(
-                f"Seu Risk Number é {st.session_state.risk_number} – perfil {st.session_state.risk_profile.title()}"
-            )
-            st.write("A alocação sugerida para o endowment é 70% em ativos domésticos e 30% em ativos internacionais.")
-            prof = PORTFOLIOS.get(st.session_state.risk_profile, PORTFOLIOS["moderado"])
-            # Domestic and international tables with recommended values
-            dom_classes = prof["dom"]["classes"]
-            intl_classes = prof["intl"]["classes"]
-            # Retrieve recommended capital guard, aspirational and endowment from the projections
-            cap_rec = df_pat["Capital Guard (R$)"].iloc[0] if not df_pat.empty else 0.0
-            asp_rec = df_pat["Aspirational (R$)"].iloc[0] if not df_pat.empty else 0.0
-            end_rec = df_pat["Endowment (R$)"].iloc[0] if not df_pat.empty else 0.0
-            # We no longer display recommended values for Capital Guard, Aspirational and Endowment.
-            # Calculate domestic and international portions of the endowment
-            dom_endowment_brl = 0.70 * end_rec
-            intl_endowment_brl = 0.30 * end_rec
-            intl_endowment_usd = intl_endowment_brl / st.session_state.cotacao_usd if st.session_state.cotacao_usd else 0.0
-            # Build allocation tables with values
-            # Build allocation tables with values.  We interpret the weights in
-            # PORTFOLIOS as percentages (e.g., 37.50 = 37.5%).  Display the
-            # weight as given and convert it to a decimal when computing
-            # absolute values.  Note: these weights are for display only and
-            # are not used directly in the Monte Carlo simulation.
-            df_dom = pd.DataFrame(
-                {
-                    "Classe de Ativo": list(dom_classes.keys()),
-                    # Display weight directly as percentage with two decimals
-                    "Peso (%)": [f"{float(w):.2f}%" for w in dom_classes.values()],
-                    # Convert weight percentage into a decimal fraction for value calculation
-                    "Valor (R$)": [float(w) / 100.0 * dom_endowment_brl for w in dom_classes.values()],
-                }
-            )
-            df_int = pd.DataFrame(
-                {
-                    "Classe de Ativo": list(intl_classes.keys()),
-                    "Peso (%)": [f"{float(w):.2f}%" for w in intl_classes.values()],
-                    "Valor (USD)": [float(w) / 100.0 * intl_endowment_usd for w in intl_classes.values()],
-                }
-            )
-            col_dom, col_int = st.columns(2)
-            with col_dom:
-                st.write("**Carteira Doméstica (70% do Endowment)**")
-                # Format domestic values using Brazilian currency formatting
-                st.table(df_dom.style.format({"Valor (R$)": format_brl_value}))
-                st.write(
-                    f"Retorno esperado (a.a): {prof['dom']['expected_return']*100:.1f}%  \nVolatilidade (a.a): {prof['dom']['vol']*100:.1f}%"
+            if tab1.open:
+                st.subheader("Carteira Recomendada")
+                st.success(
+                    f"Seu Risk Number é {st.session_state.risk_number} – perfil {st.session_state.risk_profile.title()}"
                 )
-            with col_int:
-                st.write("**Carteira Internacional (30% do Endowment)**")
-                # Format international values using USD formatting with Brazilian separators
-                st.table(df_int.style.format({"Valor (USD)": format_usd_value}))
-                st.write(
-                    f"Retorno esperado (a.a): {prof['intl']['expected_return']*100:.1f}%  \nVolatilidade (a.a): {prof['intl']['vol']*100:.1f}%"
+                st.write("A alocação sugerida para o endowment é 70% em ativos domésticos e 30% em ativos internacionais.")
+                prof = PORTFOLIOS.get(st.session_state.risk_profile, PORTFOLIOS["moderado"])
+                # Domestic and international tables with recommended values
+                dom_classes = prof["dom"]["classes"]
+                intl_classes = prof["intl"]["classes"]
+                # Retrieve recommended capital guard, aspirational and endowment from the projections
+                cap_rec = df_pat["Capital Guard (R$)"].iloc[0] if not df_pat.empty else 0.0
+                asp_rec = df_pat["Aspirational (R$)"].iloc[0] if not df_pat.empty else 0.0
+                end_rec = df_pat["Endowment (R$)"].iloc[0] if not df_pat.empty else 0.0
+                # We no longer display recommended values for Capital Guard, Aspirational and Endowment.
+                # Calculate domestic and international portions of the endowment
+                dom_endowment_brl = 0.70 * end_rec
+                intl_endowment_brl = 0.30 * end_rec
+                intl_endowment_usd = intl_endowment_brl / st.session_state.cotacao_usd if st.session_state.cotacao_usd else 0.0
+                # Build allocation tables with values
+                # Build allocation tables with values.  We interpret the weights in
+                # PORTFOLIOS as percentages (e.g., 37.50 = 37.5%).  Display the
+                # weight as given and convert it to a decimal when computing
+                # absolute values.  Note: these weights are for display only and
+                # are not used directly in the Monte Carlo simulation.
+                df_dom = pd.DataFrame(
+                    {
+                        "Classe de Ativo": list(dom_classes.keys()),
+                        # Display weight directly as percentage with two decimals
+                        "Peso (%)": [f"{float(w):.2f}%" for w in dom_classes.values()],
+                        # Convert weight percentage into a decimal fraction for value calculation
+                        "Valor (R$)": [float(w) / 100.0 * dom_endowment_brl for w in dom_classes.values()],
+                    }
                 )
-            # Combined expected return (weighted)
-            exp_comb = 0.7 * prof["dom"]["expected_return"] + 0.3 * prof["intl"]["expected_return"]
-            st.write(f"Retorno esperado combinado (a.a): {exp_comb*100:.2f}%")
-            # Monte Carlo simulation for endowment scenarios (P10, P50, P90)
-            def simulate_endowment(end_initial: float, years: int, risk_profile: str, n_sim: int = 10000) -> Tuple[float, float, float]:
-                """
-                Perform a simple Monte Carlo simulation on the endowment using the expected
-                return and volatility of the chosen risk profile.  Assumes normally
-                distributed annual returns and no additional cash flows.
-
-                Parameters
-                ----------
-                end_initial : float
-                    Initial endowment value in BRL.
-                years : int
-                    Number of years to simulate.
-                risk_profile : str
-                    The risk profile key used to look up portfolio metrics.
-                n_sim : int
-                    Number of simulations.
-
-                Returns
-                -------
-                Tuple[float, float, float]
-                    Percentile 10, 50 and 90 of the simulated endowment after `years` years.
-                """
-                prof_m = PORTFOLIOS.get(risk_profile, PORTFOLIOS["moderado"])
-                # Use aggregate expected return and volatility for domestic and international
-                mu_dom = prof_m["dom"]["expected_return"]
-                sigma_dom = prof_m["dom"]["vol"]
-                mu_int = prof_m["intl"]["expected_return"]
-                sigma_int = prof_m["intl"]["vol"]
-                # Overall mean and standard deviation (assuming no correlation between dom/int)
-                mu_total = 0.7 * mu_dom + 0.3 * mu_int
-                sigma_total = math.sqrt((0.7 ** 2) * (sigma_dom ** 2) + (0.3 ** 2) * (sigma_int ** 2))
-                # Precompute random returns matrix
-                rng = np.random.default_rng()
-                # Each simulation is a product of (1 + r) over `years`
-                # Generate a (n_sim, years) matrix of returns
-                rets = rng.normal(loc=mu_total, scale=sigma_total, size=(n_sim, years))
-                # Compute cumulative growth factors
-                growth = np.prod(1 + rets, axis=1)
-                # Final values
-                finals = end_initial * growth
-                p10 = np.percentile(finals, 10)
-                p50 = np.percentile(finals, 50)
-                p90 = np.percentile(finals, 90)
-                return p10, p50, p90
-            # Execute simulation using current endowment and projection horizon
-            if end_rec > 0:
-                try:
+                df_int = pd.DataFrame(
+                    {
+                        "Classe de Ativo": list(intl_classes.keys()),
+                        "Peso (%)": [f"{float(w):.2f}%" for w in intl_classes.values()],
+                        "Valor (USD)": [float(w) / 100.0 * intl_endowment_usd for w in intl_classes.values()],
+                    }
+                )
+                col_dom, col_int = st.columns(2)
+                with col_dom:
+                    st.write("**Carteira Doméstica (70% do Endowment)**")
+                    # Format domestic values using Brazilian currency formatting
+                    st.table(df_dom.assign(**{"Valor (R$)": format_currency_array(df_dom["Valor (R$)"])}))
+                    st.write(
+                        f"Retorno esperado (a.a): {prof['dom']['expected_return']*100:.1f}%  \nVolatilidade (a.a): {prof['dom']['vol']*100:.1f}%"
+                    )
+                with col_int:
+                    st.write("**Carteira Internacional (30% do Endowment)**")
+                    # Format international values using USD formatting with Brazilian separators
+                    st.table(df_int.assign(**{"Valor (USD)": format_currency_array(df_int["Valor (USD)"], "$")}))
+                    st.write(
+                        f"Retorno esperado (a.a): {prof['intl']['expected_return']*100:.1f}%  \nVolatilidade (a.a): {prof['intl']['vol']*100:.1f}%"
+                    )
+                # Combined expected return (weighted)
+                exp_comb = 0.7 * prof["dom"]["expected_return"] + 0.3 * prof["intl"]["expected_return"]
+                st.write(f"Retorno esperado combinado (a.a): {exp_comb*100:.2f}%")
+                # Execute simulation using current endowment and projection horizon
+                if end_rec > 0:
                     # ------------------------------------------------------------------
                     # Additional Monte Carlo simulation for domestic and international
                     # segments, producing P10/P50/P90 percentiles for each year.
@@ -2232,543 +4804,529 @@ def main():
                         years_mc = int(st.session_state.anos_proj)
                         # Increase the number of simulations for a more robust Monte Carlo
                         n_sim_mc = 10000
-                        # Extract expected return and volatility for domestic and international segments
-                        mu_dom_mc = prof["dom"]["expected_return"]
-                        sigma_dom_mc = prof["dom"]["vol"]
-                        mu_int_mc = prof["intl"]["expected_return"]
-                        sigma_int_mc = prof["intl"]["vol"]
                         # Domestic simulation (BRL)
                         if dom_endowment_brl > 0 and years_mc > 0:
-                            rng_mc_dom = np.random.default_rng()
-                            # Convert annual return and volatility to monthly metrics for finer simulation
-                            mu_month_dom = mu_dom_mc / 12.0
-                            sigma_month_dom = sigma_dom_mc / np.sqrt(12.0)
-                            # Generate monthly returns for the entire horizon
-                            rets_dom_month = rng_mc_dom.normal(loc=mu_month_dom, scale=sigma_month_dom, size=(n_sim_mc, years_mc * 12))
-                            # Compute cumulative product of (1 + monthly return)
-                            cum_prod_dom = np.cumprod(1 + rets_dom_month, axis=1)
-                            # Determine indices corresponding to the end of each year (0-indexed)
-                            year_indices = (np.arange(years_mc) + 1) * 12 - 1
-                            # Compute value path for each simulation at the end of each year
-                            path_dom = dom_endowment_brl * cum_prod_dom[:, year_indices]
-                            # Compute percentiles across simulations
-                            p10_dom = np.percentile(path_dom, 10, axis=0)
-                            p50_dom = np.percentile(path_dom, 50, axis=0)
-                            p90_dom = np.percentile(path_dom, 90, axis=0)
-                            x_vals_dom = list(range(1, years_mc + 1))
-                            fig_dom_mc = go.Figure()
-                            # Add percentile curves with user-friendly labels
-                            fig_dom_mc.add_trace(go.Scatter(x=x_vals_dom, y=p10_dom, name="Cenário pessimista (P10)", mode="lines", line=dict(color="#e74c3c", width=2)))
-                            fig_dom_mc.add_trace(go.Scatter(x=x_vals_dom, y=p50_dom, name="Cenário conservador (P50)", mode="lines", line=dict(color="#f5a623", width=2)))
-                            fig_dom_mc.add_trace(go.Scatter(x=x_vals_dom, y=p90_dom, name="Cenário otimista (P90)", mode="lines", line=dict(color="#8cc63f", width=2)))
-                            # Benchmark line for domestic portfolio: CDI at 15% per annum
-                            benchmark_dom = [dom_endowment_brl * ((1 + 0.15) ** j) for j in range(1, years_mc + 1)]
-                            fig_dom_mc.add_trace(go.Scatter(x=x_vals_dom, y=benchmark_dom, name="CDI 15%", mode="lines", line=dict(color="#ffffff", width=2, dash="dash")))
-                            fig_dom_mc.update_layout(
-                                title="Carteira Doméstica - Benchmark: CDI",
-                                xaxis_title="Ano",
-                                yaxis_title="Valor (R$)",
-                                plot_bgcolor="#071d2b",
-                                paper_bgcolor="#071d2b",
-                                font=dict(color="#f2f2f2"),
-                                xaxis=dict(gridcolor="#143857"),
-                                yaxis=dict(gridcolor="#143857", tickformat=".2s"),
-                                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                            )
-                            st.plotly_chart(fig_dom_mc, use_container_width=True)
+                            # Precomputed growth-factor percentiles scaled by the endowment,
+                            # or a live monthly simulation for customized portfolios.
+                            with pipeline_stage("mc_domestico"):
+                                p10_dom, p50_dom, p90_dom = endowment_percentiles(
+                                    dom_endowment_brl, st.session_state.risk_profile, "dom", years_mc, n_sim=n_sim_mc, seed=MC_SEED
+                                )
+                            with pipeline_stage("grafico_mc_domestico"):
+                                x_vals_dom = list(range(1, years_mc + 1))
+                                fig_dom_mc = go.Figure()
+                                # Add percentile curves with user-friendly labels
+                                fig_dom_mc.add_trace(go.Scatter(x=x_vals_dom, y=p10_dom, name="Cenário pessimista (P10)", mode="lines", line=dict(color="#e74c3c", width=2)))
+                                fig_dom_mc.add_trace(go.Scatter(x=x_vals_dom, y=p50_dom, name="Cenário conservador (P50)", mode="lines", line=dict(color="#f5a623", width=2)))
+                                fig_dom_mc.add_trace(go.Scatter(x=x_vals_dom, y=p90_dom, name="Cenário otimista (P90)", mode="lines", line=dict(color="#8cc63f", width=2)))
+                                # Benchmark line for domestic portfolio: CDI at 15% per annum
+                                benchmark_dom = [dom_endowment_brl * ((1 + 0.15) ** j) for j in range(1, years_mc + 1)]
+                                fig_dom_mc.add_trace(go.Scatter(x=x_vals_dom, y=benchmark_dom, name="CDI 15%", mode="lines", line=dict(color="#ffffff", width=2, dash="dash")))
+                                fig_dom_mc.update_layout(
+                                    title="Carteira Doméstica - Benchmark: CDI",
+                                    xaxis_title="Ano",
+                                    yaxis_title="Valor (R$)",
+                                    plot_bgcolor="#071d2b",
+                                    paper_bgcolor="#071d2b",
+                                    font=dict(color="#f2f2f2"),
+                                    xaxis=dict(gridcolor="#143857"),
+                                    yaxis=dict(gridcolor="#143857", tickformat=".2s"),
+                                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                                )
+                                st.plotly_chart(fig_dom_mc, use_container_width=True)
                         # International simulation (USD)
                         if intl_endowment_usd > 0 and years_mc > 0:
-                            rng_mc_int = np.random.default_rng()
-                            # Convert annual return and volatility to monthly metrics for finer simulation
-                            mu_month_int = mu_int_mc / 12.0
-                            sigma_month_int = sigma_int_mc / np.sqrt(12.0)
-                            # Generate monthly returns for the entire horizon
-                            rets_int_month = rng_mc_int.normal(loc=mu_month_int, scale=sigma_month_int, size=(n_sim_mc, years_mc * 12))
-                            # Compute cumulative product of (1 + monthly return)
-                            cum_prod_int = np.cumprod(1 + rets_int_month, axis=1)
-                            # Determine indices corresponding to the end of each year
-                            year_indices_int = (np.arange(years_mc) + 1) * 12 - 1
-                            # Compute value path for each simulation at the end of each year
-                            path_int = intl_endowment_usd * cum_prod_int[:, year_indices_int]
-                            # Compute percentiles across simulations
-                            p10_int = np.percentile(path_int, 10, axis=0)
-                            p50_int = np.percentile(path_int, 50, axis=0)
-                            p90_int = np.percentile(path_int, 90, axis=0)
-                            x_vals_int = list(range(1, years_mc + 1))
-                            fig_int_mc = go.Figure()
-                            # Add percentile curves with user-friendly labels
-                            fig_int_mc.add_trace(go.Scatter(x=x_vals_int, y=p10_int, name="Cenário pessimista (P10)", mode="lines", line=dict(color="#e74c3c", width=2)))
-                            fig_int_mc.add_trace(go.Scatter(x=x_vals_int, y=p50_int, name="Cenário conservador (P50)", mode="lines", line=dict(color="#f5a623", width=2)))
-                            fig_int_mc.add_trace(go.Scatter(x=x_vals_int, y=p90_int, name="Cenário otimista (P90)", mode="lines", line=dict(color="#8cc63f", width=2)))
-                            # Benchmark line for international portfolio: T-Bill at 4% per annum
-                            benchmark_int = [intl_endowment_usd * ((1 + 0.04) ** j) for j in range(1, years_mc + 1)]
-                            fig_int_mc.add_trace(go.Scatter(x=x_vals_int, y=benchmark_int, name="T-Bill 4%", mode="lines", line=dict(color="#ffffff", width=2, dash="dash")))
-                            fig_int_mc.update_layout(
-                                title="Carteira Internacional - Benchmark: Treasury",
-                                xaxis_title="Ano",
-                                yaxis_title="Valor (USD)",
-                                plot_bgcolor="#071d2b",
-                                paper_bgcolor="#071d2b",
-                                font=dict(color="#f2f2f2"),
-                                xaxis=dict(gridcolor="#143857"),
-                                yaxis=dict(gridcolor="#143857", tickformat=".2s"),
-                                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                            )
-                            st.plotly_chart(fig_int_mc, use_container_width=True)
-                    except Exception:
-                        # If simulation fails for any reason, silently ignore so the app continues.
-                        pass
-                except Exception:
-                    pass
+                            with pipeline_stage("mc_internacional"):
+                                p10_int, p50_int, p90_int = endowment_percentiles(
+                                    intl_endowment_usd, st.session_state.risk_profile, "intl", years_mc, n_sim=n_sim_mc, seed=MC_SEED + 1
+                                )
+                            with pipeline_stage("grafico_mc_internacional"):
+                                x_vals_int = list(range(1, years_mc + 1))
+                                fig_int_mc = go.Figure()
+                                # Add percentile curves with user-friendly labels
+                                fig_int_mc.add_trace(go.Scatter(x=x_vals_int, y=p10_int, name="Cenário pessimista (P10)", mode="lines", line=dict(color="#e74c3c", width=2)))
+                                fig_int_mc.add_trace(go.Scatter(x=x_vals_int, y=p50_int, name="Cenário conservador (P50)", mode="lines", line=dict(color="#f5a623", width=2)))
+                                fig_int_mc.add_trace(go.Scatter(x=x_vals_int, y=p90_int, name="Cenário otimista (P90)", mode="lines", line=dict(color="#8cc63f", width=2)))
+                                # Benchmark line for international portfolio: T-Bill at 4% per annum
+                                benchmark_int = [intl_endowment_usd * ((1 + 0.04) ** j) for j in range(1, years_mc + 1)]
+                                fig_int_mc.add_trace(go.Scatter(x=x_vals_int, y=benchmark_int, name="T-Bill 4%", mode="lines", line=dict(color="#ffffff", width=2, dash="dash")))
+                                fig_int_mc.update_layout(
+                                    title="Carteira Internacional - Benchmark: Treasury",
+                                    xaxis_title="Ano",
+                                    yaxis_title="Valor (USD)",
+                                    plot_bgcolor="#071d2b",
+                                    paper_bgcolor="#071d2b",
+                                    font=dict(color="#f2f2f2"),
+                                    xaxis=dict(gridcolor="#143857"),
+                                    yaxis=dict(gridcolor="#143857", tickformat=".2s"),
+                                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                                )
+                                st.plotly_chart(fig_int_mc, use_container_width=True)
+                    except Exception as exc:
+                        PIPELINE_LOGGER.exception("endowment Monte Carlo failed")
+                        st.error("Não foi possível simular o endowment.")
+                        st.exception(exc)
         # Tab 2: results (cash flow and graphs)
         with tab2:
-            st.subheader("Fluxo de Caixa Completo")
-            # Build per-year arrays for the patrimony components
-            years_cols = df_cf.columns.tolist()
-            caps = df_pat["Capital Guard (R$)"].values
-            ends = df_pat["Endowment (R$)"].values
-            asps = df_pat["Aspirational (R$)"].values
-            tots = df_pat["Patrimônio Total (R$)"].values
-            # Load the net cash series and required capital guard from session state
-            net_cash = st.session_state.get("net_cash_series", [0.0] * len(tots))
-            req_caps = st.session_state.get("capital_guard_list", [0.0] * len(tots))
-            # Expected return for endowment
-            prof_for_returns = PORTFOLIOS.get(st.session_state.risk_profile, PORTFOLIOS["moderado"])
-            exp_dom = prof_for_returns["dom"]["expected_return"]
-            exp_int = prof_for_returns["intl"]["expected_return"]
-            expected_total_ret = 0.7 * exp_dom + 0.3 * exp_int
-            # Compute the annual appreciation of the aspirational bucket (illiquid patrimony).
-            # Rather than calculating appreciation from individual illiquid assets, we derive
-            # it directly from the change in the aspirational values recorded in the
-            # patrimony projection.  This ensures that the line "Valorização dos patrimônios
-            # ilíquidos" matches exactly the growth of the aspirational bucket and the
-            # total patrimony appreciation reflects the actual change in value.
-            asp_vals = df_pat["Aspirational (R$)"].values
-            valuations_ilq_growth = []
-            # Calculate annual appreciation as the change in aspirational values between
-            # consecutive years.  For year 0, use the difference between year 1 and year 0.
-            # For the final year, repeat the previous year's growth to preserve the length.
-            for idx in range(len(asp_vals)):
-                if idx < len(asp_vals) - 1:
-                    valuations_ilq_growth.append(asp_vals[idx + 1] - asp_vals[idx])
-                else:
-                    # Last year: repeat the last known growth or zero if only one year
-                    if len(asp_vals) > 1:
-                        valuations_ilq_growth.append(asp_vals[-1] - asp_vals[-2])
-                    else:
-                        valuations_ilq_growth.append(0.0)
-            # Compute financial returns for each year: return from capital guard and endowment
-            financial_returns = []
-            for idx in range(len(tots)):
-                cap_i = caps[idx]
-                end_i = ends[idx]
-                req = req_caps[idx] if idx < len(req_caps) else req_caps[-1]
-                matured_cap = cap_i * (1 + 0.1185)
-                diff = req - matured_cap
-                end_before = end_i + (net_cash[idx] if idx < len(net_cash) else 0.0) - diff
-                if end_before < 0.0:
-                    end_before = 0.0
-                ret_cap = cap_i * 0.1185
-                ret_end = end_before * expected_total_ret
-                financial_returns.append(ret_cap + ret_end)
-            # Compute total patrimony growth per year
-            total_growth = []
-            for idx in range(len(tots)):
-                nc = net_cash[idx] if idx < len(net_cash) else 0.0
-                fin_ret = financial_returns[idx] if idx < len(financial_returns) else 0.0
-                illiq = valuations_ilq_growth[idx] if idx < len(valuations_ilq_growth) else 0.0
-                total_growth.append(nc + fin_ret + illiq)
-            # First table: display only totals and major buckets (no percentages)
-            overview_rows = [
-                [format_brl_value(v) for v in tots],
-                [format_brl_value(v) for v in caps],
-                [format_brl_value(v) for v in ends],
-                [format_brl_value(v) for v in asps],
-            ]
-            overview_idx = [
-                "Patrimônio total (R$)",
-                "Capital Guard (R$)",
-                "Endowment (R$)",
-                "Aspirational (R$)",
-            ]
-            df_pat_overview = pd.DataFrame(overview_rows, index=overview_idx, columns=years_cols)
-            st.dataframe(df_pat_overview, use_container_width=True)
-            # Second table: append financial results and illiquid appreciation to cash flow table
-            df_cf_full = df_cf.copy()
-            df_cf_full.loc["Resultados financeiros (R$)"] = financial_returns
-            df_cf_full.loc["Valorização dos patrimônios ilíquidos (R$)"] = valuations_ilq_growth
-            df_cf_full.loc["Crescimento total do patrimônio (R$)"] = total_growth
-            # Convert numeric values to formatted strings for display
-            df_cf_display = df_cf_full.astype(object).copy()
-            for row in df_cf_display.index:
-                for col in df_cf_display.columns:
-                    val = df_cf_display.loc[row, col]
-                    if isinstance(val, (int, float, np.number)):
-                        df_cf_display.loc[row, col] = format_brl_value(val)
-            st.dataframe(df_cf_display, use_container_width=True)
-            # Detailed expenses table right after cash flow
-            st.subheader("Detalhe de Gastos")
-            col_exp1, col_exp2 = st.columns(2)
-            with col_exp1:
-                st.write("**Gastos em BRL (por categoria)**")
-                years = (df_brl["Ano"] - 1).astype(int)
-                # Build BRL category table with years horizontal
-                # Convert the USD portion of education expenses to BRL using the projected FX for each year.
-                n_years_ed = len(df_usd)
-                cot_init_ed = st.session_state.cotacao_usd if hasattr(st.session_state, "cotacao_usd") else 1.0
+            if tab2.open:
+                st.subheader("Fluxo de Caixa Completo")
+                # Build per-year arrays for the patrimony components
+                with pipeline_stage("tabelas_resultados"):
+                    years_cols = df_cf.columns.tolist()
+                    caps = df_pat["Capital Guard (R$)"].values
+                    ends = df_pat["Endowment (R$)"].values
+                    asps = df_pat["Aspirational (R$)"].values
+                    tots = df_pat["Patrimônio Total (R$)"].values
+                    # Load the net cash series and required capital guard from session state
+                    net_cash = st.session_state.get("net_cash_series", [0.0] * len(tots))
+                    req_caps = st.session_state.get("capital_guard_list", [0.0] * len(tots))
+                    # Expected return for endowment
+                    prof_for_returns = PORTFOLIOS.get(st.session_state.risk_profile, PORTFOLIOS["moderado"])
+                    exp_dom = prof_for_returns["dom"]["expected_return"]
+                    exp_int = prof_for_returns["intl"]["expected_return"]
+                    expected_total_ret = 0.7 * exp_dom + 0.3 * exp_int
+                    # Compute the annual appreciation of the aspirational bucket (illiquid patrimony).
+                    # Rather than calculating appreciation from individual illiquid assets, we derive
+                    # it directly from the change in the aspirational values recorded in the
+                    # patrimony projection.  This ensures that the line "Valorização dos patrimônios
+                    # ilíquidos" matches exactly the growth of the aspirational bucket and the
+                    # total patrimony appreciation reflects the actual change in value.
+                    asp_vals = df_pat["Aspirational (R$)"].values
+                    valuations_ilq_growth = []
+                    # Calculate annual appreciation as the change in aspirational values between
+                    # consecutive years.  For year 0, use the difference between year 1 and year 0.
+                    # For the final year, repeat the previous year's growth to preserve the length.
+                    for idx in range(len(asp_vals)):
+                        if idx < len(asp_vals) - 1:
+                            valuations_ilq_growth.append(asp_vals[idx + 1] - asp_vals[idx])
+                        else:
+                            # Last year: repeat the last known growth or zero if only one year
+                            if len(asp_vals) > 1:
+                                valuations_ilq_growth.append(asp_vals[-1] - asp_vals[-2])
+                            else:
+                                valuations_ilq_growth.append(0.0)
+                    # Compute financial returns for each year: return from capital guard and endowment
+                    financial_returns = []
+                    for idx in range(len(tots)):
+                        cap_i = caps[idx]
+                        end_i = ends[idx]
+                        req = req_caps[idx] if idx < len(req_caps) else req_caps[-1]
+                        matured_cap = cap_i * (1 + 0.1185)
+                        diff = req - matured_cap
+                        end_before = end_i + (net_cash[idx] if idx < len(net_cash) else 0.0) - diff
+                        if end_before < 0.0:
+                            end_before = 0.0
+                        ret_cap = cap_i * 0.1185
+                        ret_end = end_before * expected_total_ret
+                        financial_returns.append(ret_cap + ret_end)
+                    # Compute total patrimony growth per year
+                    total_growth = []
+                    for idx in range(len(tots)):
+                        nc = net_cash[idx] if idx < len(net_cash) else 0.0
+                        fin_ret = financial_returns[idx] if idx < len(financial_returns) else 0.0
+                        illiq = valuations_ilq_growth[idx] if idx < len(valuations_ilq_growth) else 0.0
+                        total_growth.append(nc + fin_ret + illiq)
+                    # First table: display only totals and major buckets (no percentages).
+                    # Tables are sent as numbers and formatted in the browser.
+                    overview_rows = np.vstack([tots, caps, ends, asps])
+                    overview_idx = [
+                        "Patrimônio total (R$)",
+                        "Capital Guard (R$)",
+                        "Endowment (R$)",
+                        "Aspirational (R$)",
+                    ]
+                    df_pat_overview = pd.DataFrame(overview_rows, index=overview_idx, columns=years_cols)
+                    st.dataframe(df_pat_overview, use_container_width=True, column_config=currency_column_config(years_cols))
+                    # Second table: append financial results and illiquid appreciation to cash flow table
+                    df_cf_full = df_cf.copy()
+                    df_cf_full.loc["Resultados financeiros (R$)"] = financial_returns
+                    df_cf_full.loc["Valorização dos patrimônios ilíquidos (R$)"] = valuations_ilq_growth
+                    df_cf_full.loc["Crescimento total do patrimônio (R$)"] = total_growth
+                    st.dataframe(df_cf_full, use_container_width=True, column_config=currency_column_config(years_cols))
+                # Detailed expenses table right after cash flow
+                st.subheader("Detalhe de Gastos")
+                col_exp1, col_exp2 = st.columns(2)
+                with col_exp1:
+                    st.write("**Gastos em BRL (por categoria)**")
+                    years = (df_brl["Ano"] - 1).astype(int)
+                    # Build BRL category table with years horizontal
+                    # Convert the USD portion of education expenses to BRL using the projected FX for each year.
+                    fx_series_ed = macro_path(
+                        st.session_state.infl_brl_pct, st.session_state.infl_usd_pct, st.session_state.cotacao_usd, len(df_usd)
+                    ).cotacoes
+                    educ_brl_only = df_brl["Educação (R$)"].values - df_usd["Educação Exterior ($)"].values * fx_series_ed
+                    gastos_brl_dict = {
+                        "Moradia (R$)": df_brl["Moradia (R$)"].values,
+                        "Educação BRL (R$)": educ_brl_only,
+                        "Saúde (R$)": df_brl["Saúde (R$)"].values,
+                        "Veículos (R$)": df_brl["Veículos (R$)"].values,
+                        "Lifestyle (R$)": df_brl["Lifestyle (R$)"].values,
+                        "Ativos de Luxo (R$)": df_brl["Ativos de Luxo (R$)"].values,
+                        "Filantropia (R$)": df_brl["Filantropia (R$)"].values,
+                    }
+                    df_gastos_brl_table = pd.DataFrame(gastos_brl_dict).T
+                    df_gastos_brl_table.columns = [f"Ano {int(y)}" for y in years]
+                    st.dataframe(
+                        df_gastos_brl_table,
+                        use_container_width=True,
+                        column_config=currency_column_config(df_gastos_brl_table.columns),
+                    )
+                with col_exp2:
+                    st.write("**Gastos em USD (por categoria)**")
+                    years = (df_usd["Ano"] - 1).astype(int)
+                    gastos_usd_dict = {
+                        "Educação USD ($)": df_usd["Educação Exterior ($)"].values,
+                        "Viagens Internacionais ($)": df_usd["Viagens Internacionais ($)"].values,
+                    }
+                    df_gastos_usd_table = pd.DataFrame(gastos_usd_dict).T
+                    df_gastos_usd_table.columns = [f"Ano {int(y)}" for y in years]
+                    st.dataframe(
+                        df_gastos_usd_table,
+                        use_container_width=True,
+                        column_config=currency_column_config(df_gastos_usd_table.columns),
+                    )
+                # After presenting the detailed expenses, include a notes section that
+                # highlights significant future events related to the children.  These
+                # annotations help the user understand upcoming changes in the cash flow
+                # such as schooling transitions, car purchases and when each child
+                # leaves the household budget.  The events are computed relative to
+                # the current ages of the children and will only be displayed if
+                # they occur within the projection horizon.
                 try:
-                    ratio_ed = (1 + st.session_state.infl_brl_pct / 100.0) / (1 + st.session_state.infl_usd_pct / 100.0)
-                except Exception:
-                    ratio_ed = 1.0
-                fx_series_ed = np.array([cot_init_ed * (ratio_ed ** i) for i in range(n_years_ed)])
-                educ_brl_only = df_brl["Educação (R$)"].values - df_usd["Educação Exterior ($)"].values * fx_series_ed
-                gastos_brl_dict = {
-                    "Moradia (R$)": df_brl["Moradia (R$)"].values,
-                    "Educação BRL (R$)": educ_brl_only,
-                    "Saúde (R$)": df_brl["Saúde (R$)"].values,
-                    "Veículos (R$)": df_brl["Veículos (R$)"].values,
-                    "Lifestyle (R$)": df_brl["Lifestyle (R$)"].values,
-                    "Ativos de Luxo (R$)": df_brl["Ativos de Luxo (R$)"].values,
-                    "Filantropia (R$)": df_brl["Filantropia (R$)"].values,
-                }
-                df_gastos_brl_table = pd.DataFrame(gastos_brl_dict).T
-                df_gastos_brl_table.columns = [f"Ano {int(y)}" for y in years]
-                st.dataframe(
-                    df_gastos_brl_table.style.format(format_brl_value),
-                    use_container_width=True,
-                )
-            with col_exp2:
-                st.write("**Gastos em USD (por categoria)**")
-                years = (df_usd["Ano"] - 1).astype(int)
-                gastos_usd_dict = {
-                    "Educação USD ($)": df_usd["Educação Exterior ($)"].values,
-                    "Viagens Internacionais ($)": df_usd["Viagens Internacionais ($)"].values,
-                }
-                df_gastos_usd_table = pd.DataFrame(gastos_usd_dict).T
-                df_gastos_usd_table.columns = [f"Ano {int(y)}" for y in years]
-                st.dataframe(
-                    df_gastos_usd_table.style.format(format_usd_value),
-                    use_container_width=True,
-                )
-            # After presenting the detailed expenses, include a notes section that
-            # highlights significant future events related to the children.  These
-            # annotations help the user understand upcoming changes in the cash flow
-            # such as schooling transitions, car purchases and when each child
-            # leaves the household budget.  The events are computed relative to
-            # the current ages of the children and will only be displayed if
-            # they occur within the projection horizon.
-            try:
-                eventos = []
-                idades_ini = st.session_state.get("idades_filhos", []) or []
-                anos_total = len(df_pat)
-                for idx_child, idade_ini in enumerate(idades_ini):
-                    # Age 17: school to university transition
-                    off17 = 17 - int(idade_ini)
-                    if 0 <= off17 < anos_total:
-                        eventos.append(f"Filho {idx_child+1} sai da escola e entra na faculdade no ano {off17} (aos 17 anos)")
-                    # Age 18: receives a car
-                    off18 = 18 - int(idade_ini)
-                    if 0 <= off18 < anos_total:
-                        eventos.append(f"Filho {idx_child+1} ganha carro no ano {off18} (aos 18 anos)")
-                    # Age 22: finishes university (four-year course starting at 18)
-                    off22 = 22 - int(idade_ini)
-                    if 0 <= off22 < anos_total:
-                        eventos.append(f"Filho {idx_child+1} sai da faculdade no ano {off22} (aos 22 anos)")
-                    # Age 26: leaves cash flow
-                    off26 = 26 - int(idade_ini)
-                    if 0 <= off26 < anos_total:
-                        eventos.append(f"Filho {idx_child+1} sai do fluxo de caixa no ano {off26} (aos 26 anos)")
-                # Display events if any were generated
-                if eventos:
-                    st.markdown("**Eventos previstos no fluxo de caixa:**")
-                    for ev in eventos:
-                        st.write(f"- {ev}")
-            except Exception:
-                # If any error occurs (e.g. no child data), silently ignore to avoid
-                # interrupting the user experience.
-                pass
-            # Display separate charts for nominal and real patrimony.  Real values are
-            # discounted by BRL inflation to reflect present value (ano 0).
-            # Nominal patrimony: show the evolution of each block (Capital Guard, Endowment, Aspirational)
-            st.subheader("Evolução do Patrimônio Nominal")
-            fig_nominal = go.Figure()
-            # Add each patrimony component as a separate line
-            fig_nominal.add_trace(
-                go.Scatter(
-                    x=df_pat["Ano"],
-                    y=df_pat["Capital Guard (R$)"],
-                    name="Capital Guard",
-                    mode="lines",
-                    line=dict(color="#00b8d9", width=3),
-                )
-            )
-            fig_nominal.add_trace(
-                go.Scatter(
-                    x=df_pat["Ano"],
-                    y=df_pat["Endowment (R$)"],
-                    name="Endowment",
-                    mode="lines",
-                    line=dict(color="#0072a8", width=3),
-                )
-            )
-            fig_nominal.add_trace(
-                go.Scatter(
-                    x=df_pat["Ano"],
-                    y=df_pat["Aspirational (R$)"],
-                    name="Aspirational",
-                    mode="lines",
-                    line=dict(color="#8cc63f", width=3),
-                )
-            )
-            # Add a trace for total patrimony (sum of the three buckets)
-            fig_nominal.add_trace(
-                go.Scatter(
-                    x=df_pat["Ano"],
-                    y=df_pat["Patrimônio Total (R$)"],
-                    name="Patrimônio total",
-                    mode="lines",
-                    line=dict(color="#f5a623", width=3, dash="dash"),
+                    eventos = []
+                    idades_ini = st.session_state.get("idades_filhos", []) or []
+                    anos_total = len(df_pat)
+                    for idx_child, idade_ini in enumerate(idades_ini):
+                        # Age 17: school to university transition
+                        off17 = 17 - int(idade_ini)
+                        if 0 <= off17 < anos_total:
+                            eventos.append(f"Filho {idx_child+1} sai da escola e entra na faculdade no ano {off17} (aos 17 anos)")
+                        # Age 18: receives a car
+                        off18 = 18 - int(idade_ini)
+                        if 0 <= off18 < anos_total:
+                            eventos.append(f"Filho {idx_child+1} ganha carro no ano {off18} (aos 18 anos)")
+                        # Age 22: finishes university (four-year course starting at 18)
+                        off22 = 22 - int(idade_ini)
+                        if 0 <= off22 < anos_total:
+                            eventos.append(f"Filho {idx_child+1} sai da faculdade no ano {off22} (aos 22 anos)")
+                        # Age 26: leaves cash flow
+                        off26 = 26 - int(idade_ini)
+                        if 0 <= off26 < anos_total:
+                            eventos.append(f"Filho {idx_child+1} sai do fluxo de caixa no ano {off26} (aos 26 anos)")
+                    # Display events if any were generated
+                    if eventos:
+                        st.markdown("**Eventos previstos no fluxo de caixa:**")
+                        for ev in eventos:
+                            st.write(f"- {ev}")
+                except (TypeError, ValueError) as exc:
+                    # Malformed child ages only cost the event list, not the rest of the tab
+                    PIPELINE_LOGGER.exception("could not list the cash-flow events")
+                    st.warning(f"Não foi possível listar os eventos do fluxo de caixa: {exc}")
+                # Display separate charts for nominal and real patrimony.  Real values are
+                # discounted by BRL inflation to reflect present value (ano 0).
+                # Nominal patrimony: show the evolution of each block (Capital Guard, Endowment, Aspirational)
+                st.subheader("Evolução do Patrimônio Nominal")
+                with pipeline_stage("grafico_patrimonio_nominal"):
+                    fig_nominal = go.Figure()
+                    # Add each patrimony component as a separate line
+                    fig_nominal.add_trace(
+                        go.Scatter(
+                            x=df_pat["Ano"],
+                            y=df_pat["Capital Guard (R$)"],
+                            name="Capital Guard",
+                            mode="lines",
+                            line=dict(color="#00b8d9", width=3),
+                        )
+                    )
+                    fig_nominal.add_trace(
+                        go.Scatter(
+                            x=df_pat["Ano"],
+                            y=df_pat["Endowment (R$)"],
+                            name="Endowment",
+                            mode="lines",
+                            line=dict(color="#0072a8", width=3),
+                        )
+                    )
+                    fig_nominal.add_trace(
+                        go.Scatter(
+                            x=df_pat["Ano"],
+                            y=df_pat["Aspirational (R$)"],
+                            name="Aspirational",
+                            mode="lines",
+                            line=dict(color="#8cc63f", width=3),
+                        )
+                    )
+                    # Add a trace for total patrimony (sum of the three buckets)
+                    fig_nominal.add_trace(
+                        go.Scatter(
+                            x=df_pat["Ano"],
+                            y=df_pat["Patrimônio Total (R$)"],
+                            name="Patrimônio total",
+                            mode="lines",
+                            line=dict(color="#f5a623", width=3, dash="dash"),
+                        )
+                    )
+                    fig_nominal.update_layout(
+                        xaxis_title="Ano",
+                        yaxis_title="Valor (R$)",
+                        plot_bgcolor="#071d2b",
+                        paper_bgcolor="#071d2b",
+                        font=dict(color="#f2f2f2"),
+                        xaxis=dict(gridcolor="#143857"),
+                        yaxis=dict(gridcolor="#143857", tickformat=".2s"),
+                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                    )
+                    st.plotly_chart(fig_nominal, use_container_width=True)
+                # Real patrimony: deflate each block by the BRL inflation path
+                st.subheader("Evolução do Patrimônio Real")
+                with pipeline_stage("grafico_patrimonio_real"):
+                    deflator = macro_path(
+                        st.session_state.infl_brl_pct, st.session_state.infl_usd_pct, st.session_state.cotacao_usd, len(df_pat)
+                    ).deflator
+                    real_cap = df_pat["Capital Guard (R$)"].to_numpy() * deflator
+                    real_end = df_pat["Endowment (R$)"].to_numpy() * deflator
+                    real_asp = df_pat["Aspirational (R$)"].to_numpy() * deflator
+                    real_tot = df_pat["Patrimônio Total (R$)"].to_numpy() * deflator
+                    fig_real = go.Figure()
+                    fig_real.add_trace(
+                        go.Scatter(
+                            x=df_pat["Ano"],
+                            y=real_cap,
+                            name="Capital Guard",
+                            mode="lines",
+                            line=dict(color="#00b8d9", width=3),
+                        )
+                    )
+                    fig_real.add_trace(
+                        go.Scatter(
+                            x=df_pat["Ano"],
+                            y=real_end,
+                            name="Endowment",
+                            mode="lines",
+                            line=dict(color="#0072a8", width=3),
+                        )
+                    )
+                    fig_real.add_trace(
+                        go.Scatter(
+                            x=df_pat["Ano"],
+                            y=real_asp,
+                            name="Aspirational",
+                            mode="lines",
+                            line=dict(color="#8cc63f", width=3),
+                        )
+                    )
+                    # Add total real patrimony line
+                    fig_real.add_trace(
+                        go.Scatter(
+                            x=df_pat["Ano"],
+                            y=real_tot,
+                            name="Patrimônio total",
+                            mode="lines",
+                            line=dict(color="#f5a623", width=3, dash="dash"),
+                        )
+                    )
+                    fig_real.update_layout(
+                        xaxis_title="Ano",
+                        yaxis_title="Valor (R$)",
+                        plot_bgcolor="#071d2b",
+                        paper_bgcolor="#071d2b",
+                        font=dict(color="#f2f2f2"),
+                        xaxis=dict(gridcolor="#143857"),
+                        yaxis=dict(gridcolor="#143857", tickformat=".2s"),
+                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                    )
+                    st.plotly_chart(fig_real, use_container_width=True)
+                # The unified chart has been removed because the nominal and real charts above
+                # now display the evolution of each patrimonial block separately.
+                # Bar chart for expenses with dark theme
+                st.subheader("Gastos Totais (BRL) por Ano")
+                with pipeline_stage("grafico_gastos"):
+                    fig_gastos = go.Figure()
+                    fig_gastos.add_trace(
+                        go.Bar(
+                            x=df_brl["Ano"],
+                            y=df_brl["Total (R$)"],
+                            name="Gastos Totais",
+                            marker_color="#00b8d9",
+                        )
+                    )
+                    fig_gastos.update_layout(
+                        xaxis_title="Ano",
+                        yaxis_title="Gastos (R$)",
+                        plot_bgcolor="#071d2b",
+                        paper_bgcolor="#071d2b",
+                        font=dict(color="#f2f2f2"),
+                        xaxis=dict(gridcolor="#143857"),
+                        yaxis=dict(gridcolor="#143857", tickformat=".2s"),
+                        showlegend=False,
+                    )
+                    st.plotly_chart(fig_gastos, use_container_width=True)
+                # Download
+                # The workbook is only built when the button is clicked (Streamlit runs
+                # the callable in its own thread, outside the session) and is cached by
+                # the content of its sheets.
+                inputs_excel = {key: st.session_state.get(key) for key in PROJECTION_INPUT_KEYS}
+                extras_excel = [("Fluxo de Caixa", df_cf_full), ("Visão Patrimonial", df_pat_overview)]
+
+                def gerar_excel() -> bytes:
+                    extras = list(extras_excel)
+                    if int(inputs_excel["anos_proj"]) > 0 and not df_pat.empty:
+                        extras.append(("Monte Carlo", projection_monte_carlo(inputs_excel, n_sim=10000, seed=MC_SEED)["df_mc"]))
+                    return excel_download(df_brl, df_usd, df_incomes, df_pat, extras)[1]
+
+                st.download_button(
+                    "📥 Baixar projeção em Excel",
+                    data=gerar_excel,
+                    file_name=EXCEL_FILE_NAME,
+                    mime=EXCEL_MIME,
+                    on_click="ignore",
                 )
-            )
-            fig_nominal.update_layout(
-                xaxis_title="Ano",
-                yaxis_title="Valor (R$)",
-                plot_bgcolor="#071d2b",
-                paper_bgcolor="#071d2b",
-                font=dict(color="#f2f2f2"),
-                xaxis=dict(gridcolor="#143857"),
-                yaxis=dict(gridcolor="#143857", tickformat=".2s"),
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-            )
-            st.plotly_chart(fig_nominal, use_container_width=True)
-            # Real patrimony: adjust each block by inflation factor
-            st.subheader("Evolução do Patrimônio Real")
-            infl_factor = 1 + st.session_state.infl_brl_pct / 100.0
-            real_cap = []
-            real_end = []
-            real_asp = []
-            real_tot = []
-            for idx in range(len(df_pat)):
-                real_cap.append(df_pat["Capital Guard (R$)"].iloc[idx] / (infl_factor ** idx))
-                real_end.append(df_pat["Endowment (R$)"].iloc[idx] / (infl_factor ** idx))
-                real_asp.append(df_pat["Aspirational (R$)"].iloc[idx] / (infl_factor ** idx))
-                real_tot.append(df_pat["Patrimônio Total (R$)"].iloc[idx] / (infl_factor ** idx))
-            fig_real = go.Figure()
-            fig_real.add_trace(
-                go.Scatter(
-                    x=df_pat["Ano"],
-                    y=real_cap,
-                    name="Capital Guard",
-                    mode="lines",
-                    line=dict(color="#00b8d9", width=3),
+        # Tab 3: adjustments
+        with tab3:
+            if tab3.open:
+                st.subheader("Ajustes de Premissas")
+                # General assumptions
+                colX, colY, colZ = st.columns(3)
+                new_infl_brl = colX.number_input(
+                    "Inflação BRL (%)",
+                    min_value=0.0,
+                    max_value=20.0,
+                    value=st.session_state.infl_brl_pct,
+                    step=0.1,
+                    key="adj_infl_brl",
                 )
-            )
-            fig_real.add_trace(
-                go.Scatter(
-                    x=df_pat["Ano"],
-                    y=real_end,
-                    name="Endowment",
-                    mode="lines",
-                    line=dict(color="#0072a8", width=3),
+                new_infl_usd = colY.number_input(
+                    "Inflação USD (%)",
+                    min_value=0.0,
+                    max_value=20.0,
+                    value=st.session_state.infl_usd_pct,
+                    step=0.1,
+                    key="adj_infl_usd",
                 )
-            )
-            fig_real.add_trace(
-                go.Scatter(
-                    x=df_pat["Ano"],
-                    y=real_asp,
-                    name="Aspirational",
-                    mode="lines",
-                    line=dict(color="#8cc63f", width=3),
+                new_cot = colZ.number_input(
+                    "Cotação USD/BRL",
+                    min_value=1.0,
+                    max_value=20.0,
+                    value=st.session_state.cotacao_usd,
+                    step=0.01,
+                    key="adj_cotacao",
                 )
-            )
-            # Add total real patrimony line
-            fig_real.add_trace(
-                go.Scatter(
-                    x=df_pat["Ano"],
-                    y=real_tot,
-                    name="Patrimônio total",
-                    mode="lines",
-                    line=dict(color="#f5a623", width=3, dash="dash"),
+                new_n_viagens = st.number_input(
+                    "Número de viagens internacionais por ano",
+                    min_value=0,
+                    max_value=12,
+                    value=st.session_state.n_viagens,
+                    step=1,
+                    key="adj_n_viagens",
                 )
-            )
-            fig_real.update_layout(
-                xaxis_title="Ano",
-                yaxis_title="Valor (R$)",
-                plot_bgcolor="#071d2b",
-                paper_bgcolor="#071d2b",
-                font=dict(color="#f2f2f2"),
-                xaxis=dict(gridcolor="#143857"),
-                yaxis=dict(gridcolor="#143857", tickformat=".2s"),
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-            )
-            st.plotly_chart(fig_real, use_container_width=True)
-            # The unified chart has been removed because the nominal and real charts above
-            # now display the evolution of each patrimonial block separately.
-            # Bar chart for expenses with dark theme
-            st.subheader("Gastos Totais (BRL) por Ano")
-            fig_gastos = go.Figure()
-            fig_gastos.add_trace(
-                go.Bar(
-                    x=df_brl["Ano"],
-                    y=df_brl["Total (R$)"],
-                    name="Gastos Totais",
-                    marker_color="#00b8d9",
+                new_luxo = st.number_input(
+                    "Gasto mensal com ativos de luxo (R$)",
+                    min_value=0.0,
+                    max_value=10_000_000.0,
+                    value=st.session_state.luxo_mensal,
+                    step=1000.0,
+                    key="adj_luxo",
                 )
-            )
-            fig_gastos.update_layout(
-                xaxis_title="Ano",
-                yaxis_title="Gastos (R$)",
-                plot_bgcolor="#071d2b",
-                paper_bgcolor="#071d2b",
-                font=dict(color="#f2f2f2"),
-                xaxis=dict(gridcolor="#143857"),
-                yaxis=dict(gridcolor="#143857", tickformat=".2s"),
-                showlegend=False,
-            )
-            st.plotly_chart(fig_gastos, use_container_width=True)
-            # Download
-            fname, excel_bytes = build_excel_download(df_brl, df_usd, df_incomes, df_pat)
-            st.download_button(
-                "📥 Baixar projeção em Excel",
-                data=excel_bytes,
-                file_name=fname,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
-        # Tab 3: adjustments
-        with tab3:
-            st.subheader("Ajustes de Premissas")
-            # General assumptions
-            colX, colY, colZ = st.columns(3)
-            new_infl_brl = colX.number_input(
-                "Inflação BRL (%)",
-                min_value=0.0,
-                max_value=20.0,
-                value=st.session_state.infl_brl_pct,
-                step=0.1,
-                key="adj_infl_brl",
-            )
-            new_infl_usd = colY.number_input(
-                "Inflação USD (%)",
-                min_value=0.0,
-                max_value=20.0,
-                value=st.session_state.infl_usd_pct,
-                step=0.1,
-                key="adj_infl_usd",
-            )
-            new_cot = colZ.number_input(
-                "Cotação USD/BRL",
-                min_value=1.0,
-                max_value=20.0,
-                value=st.session_state.cotacao_usd,
-                step=0.01,
-                key="adj_cotacao",
-            )
-            new_n_viagens = st.number_input(
-                "Número de viagens internacionais por ano",
-                min_value=0,
-                max_value=12,
-                value=st.session_state.n_viagens,
-                step=1,
-                key="adj_n_viagens",
-            )
-            new_luxo = st.number_input(
-                "Gasto mensal com ativos de luxo (R$)",
-                min_value=0.0,
-                max_value=10_000_000.0,
-                value=st.session_state.luxo_mensal,
-                step=1000.0,
-                key="adj_luxo",
-            )
-            # As alocações de dividendos e suas taxas de crescimento são agora
-            # definidas nas etapas de entrada e não precisam ser ajustadas
-            # manualmente aqui.  Por isso, removemos os campos de ajuste para
-            # dividendos e suas taxas de crescimento.
-            new_fil = st.number_input(
-                "Gasto anual com filantropia (R$)",
-                min_value=0.0,
-                max_value=10_000_000.0,
-                value=st.session_state.filantropia_anual,
-                step=1000.0,
-                key="adj_filantropia",
-            )
-            # O valor do aspirational é calculado automaticamente a partir dos
-            # aluguéis, dividendos e patrimônios ilíquidos informados pelo usuário;
-            # não permitimos sua edição manual nesta aba.
-            # Baseline costs for subjective categories
-            # Initialize baseline and slider values once
-            if "baseline_costs" not in st.session_state or st.session_state.baseline_costs is None:
-                # Compute baseline from first year (index 0) of current projections
-                idx0 = 0
-                # Avoid recomputing if projections empty
-                try:
-                    baseline_educ_usd = df_usd.loc[idx0, "Educação Exterior ($)"]
-                    baseline_educ_brl = df_brl.loc[idx0, "Educação (R$)"] - baseline_educ_usd * st.session_state.cotacao_usd
-                    st.session_state.baseline_costs = {
-                        "moradia": float(df_brl.loc[idx0, "Moradia (R$)"]),
-                        "veiculos": float(df_brl.loc[idx0, "Veículos (R$)"]),
-                        "lifestyle": float(df_brl.loc[idx0, "Lifestyle (R$)"]),
-                        "educacao_brl": float(baseline_educ_brl),
-                        "educacao_usd": float(baseline_educ_usd),
-                        "viagens_usd": float(df_usd.loc[idx0, "Viagens Internacionais ($)"]),
-                    }
-                except Exception:
-                    st.session_state.baseline_costs = {}
-            # Initialise scales dict if not present
-            if "scales" not in st.session_state or st.session_state.scales is None:
-                st.session_state.scales = {k: 1.0 for k in st.session_state.baseline_costs.keys()}
-            # Slider controls for subjective expenses
-            st.markdown("### Ajustar gastos anuais (ano 0)")
-            slider_values = {}
-            for cat, base_val in st.session_state.baseline_costs.items():
-                # Determine display name
-                display_name = {
-                    "moradia": "Moradia (R$)",
-                    "veiculos": "Veículos (R$)",
-                    "lifestyle": "Lifestyle (R$)",
-                    "educacao_brl": "Educação BRL (R$)",
-                    "educacao_usd": "Educação USD ($)",
-                    "viagens_usd": "Viagens Internacionais USD ($)",
-                }.get(cat, cat)
-                # Determine min and max; allow 0 to 2x baseline
-                min_val = 0.0
-                max_val = base_val * 2 if base_val > 0 else 1.0
-                step = base_val / 20 if base_val != 0 else 1.0
-                if cat.endswith("usd"):
-                    fmt = "$ %,.0f"
-                else:
-                    fmt = "R$ %,.0f"
-                slider_values[cat] = st.slider(
-                    display_name,
-                    min_value=min_val,
-                    max_value=max_val,
-                    value=base_val,
-                    step=step,
-                    key=f"slider_{cat}",
+                # As alocações de dividendos e suas taxas de crescimento são agora
+                # definidas nas etapas de entrada e não precisam ser ajustadas
+                # manualmente aqui.  Por isso, removemos os campos de ajuste para
+                # dividendos e suas taxas de crescimento.
+                new_fil = st.number_input(
+                    "Gasto anual com filantropia (R$)",
+                    min_value=0.0,
+                    max_value=10_000_000.0,
+                    value=st.session_state.filantropia_anual,
+                    step=1000.0,
+                    key="adj_filantropia",
                 )
-            # Update button
-            if st.button("Atualizar Projeções", key="update_projections"):
-                # Update general assumptions
-                st.session_state.infl_brl_pct = new_infl_brl
-                st.session_state.infl_usd_pct = new_infl_usd
-                st.session_state.cotacao_usd = new_cot
-                st.session_state.n_viagens = new_n_viagens
-                st.session_state.luxo_mensal = new_luxo
-                # Actualize only the assumptions that remain user‑adjustable.  Dividend and
-                # aspirational values are computed automatically from the income inputs and
-                # are therefore not set here.  Philanthropy remains adjustable.
-                st.session_state.filantropia_anual = new_fil
-                # Recompute scales based on slider values
-                new_scales = {}
+                # O valor do aspirational é calculado automaticamente a partir dos
+                # aluguéis, dividendos e patrimônios ilíquidos informados pelo usuário;
+                # não permitimos sua edição manual nesta aba.
+                # Baseline costs for subjective categories
+                # Initialize baseline and slider values once
+                if "baseline_costs" not in st.session_state or st.session_state.baseline_costs is None:
+                    # Compute baseline from first year (index 0) of current projections
+                    idx0 = 0
+                    # Avoid recomputing if projections empty
+                    try:
+                        baseline_educ_usd = df_usd.loc[idx0, "Educação Exterior ($)"]
+                        baseline_educ_brl = df_brl.loc[idx0, "Educação (R$)"] - baseline_educ_usd * st.session_state.cotacao_usd
+                        st.session_state.baseline_costs = {
+                            "moradia": float(df_brl.loc[idx0, "Moradia (R$)"]),
+                            "veiculos": float(df_brl.loc[idx0, "Veículos (R$)"]),
+                            "lifestyle": float(df_brl.loc[idx0, "Lifestyle (R$)"]),
+                            "educacao_brl": float(baseline_educ_brl),
+                            "educacao_usd": float(baseline_educ_usd),
+                            "viagens_usd": float(df_usd.loc[idx0, "Viagens Internacionais ($)"]),
+                        }
+                    except Exception:
+                        st.session_state.baseline_costs = {}
+                # Initialise scales dict if not present
+                if "scales" not in st.session_state or st.session_state.scales is None:
+                    st.session_state.scales = {k: 1.0 for k in st.session_state.baseline_costs.keys()}
+                # Slider controls for subjective expenses
+                st.markdown("### Ajustar gastos anuais (ano 0)")
+                slider_values = {}
                 for cat, base_val in st.session_state.baseline_costs.items():
-                    slider_val = slider_values.get(cat, base_val)
-                    if base_val != 0:
-                        new_scales[cat] = slider_val / base_val
+                    # Determine display name
+                    display_name = {
+                        "moradia": "Moradia (R$)",
+                        "veiculos": "Veículos (R$)",
+                        "lifestyle": "Lifestyle (R$)",
+                        "educacao_brl": "Educação BRL (R$)",
+                        "educacao_usd": "Educação USD ($)",
+                        "viagens_usd": "Viagens Internacionais USD ($)",
+                    }.get(cat, cat)
+                    # Determine min and max; allow 0 to 2x baseline
+                    min_val = 0.0
+                    max_val = base_val * 2 if base_val > 0 else 1.0
+                    step = base_val / 20 if base_val != 0 else 1.0
+                    if cat.endswith("usd"):
+                        fmt = "$ %,.0f"
                     else:
-                        new_scales[cat] = 1.0
-                st.session_state.scales = new_scales
-                # Reset projections to force recalculation
-                st.session_state.projections = None
-                # No explicit rerun call; the session state update triggers a rerun automatically
+                        fmt = "R$ %,.0f"
+                    slider_values[cat] = st.slider(
+                        display_name,
+                        min_value=min_val,
+                        max_value=max_val,
+                        value=base_val,
+                        step=step,
+                        key=f"slider_{cat}",
+                    )
+                # Update button
+                if st.button("Atualizar Projeções", key="update_projections"):
+                    # Update general assumptions
+                    st.session_state.infl_brl_pct = new_infl_brl
+                    st.session_state.infl_usd_pct = new_infl_usd
+                    st.session_state.cotacao_usd = new_cot
+                    st.session_state.n_viagens = new_n_viagens
+                    st.session_state.luxo_mensal = new_luxo
+                    # Actualize only the assumptions that remain user‑adjustable.  Dividend and
+                    # aspirational values are computed automatically from the income inputs and
+                    # are therefore not set here.  Philanthropy remains adjustable.
+                    st.session_state.filantropia_anual = new_fil
+                    # Recompute scales based on slider values
+                    new_scales = {}
+                    for cat, base_val in st.session_state.baseline_costs.items():
+                        slider_val = slider_values.get(cat, base_val)
+                        if base_val != 0:
+                            new_scales[cat] = slider_val / base_val
+                        else:
+                            new_scales[cat] = 1.0
+                    st.session_state.scales = new_scales
+                    # Reset projections to force recalculation
+                    st.session_state.projections = None
+                    # No explicit rerun call; the session state update triggers a rerun automatically
+        timings.finish()
+        if debug_pipeline:
+            with st.expander("Diagnóstico de desempenho"):
+                st.dataframe(
+                    timings.table().style.format(
+                        {"Tempo (ms)": "{:.1f}", "CPU (ms)": "{:.1f}", "Pico de memória (MiB)": "{:.2f}"}, na_rep="–"
+                    ),
+                    use_container_width=True,
+                )
+                st.code(timings.openmetrics(), language="text")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,41 @@
+"""Path count needed by each Monte Carlo variance-reduction mode.
+
+Usage::
+
+    python benchmarks/mc_convergence.py --target 1.0 --reps 20
+
+Prints the standard error of the final-year P10/P50/P90 of the monthly
+endowment simulation for every mode and path count, and the smallest path
+count reaching the target error.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from JeraOnboarding import VARIANCE_REDUCTION_MODES, monte_carlo_convergence  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", type=float, default=1.0, help="erro padrão alvo (%% da média)")
+    parser.add_argument("--reps", type=int, default=20, help="repetições por contagem de caminhos")
+    parser.add_argument("--anos", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", default=list(VARIANCE_REDUCTION_MODES), choices=VARIANCE_REDUCTION_MODES)
+    parser.add_argument(
+        "--paths", nargs="+", type=int, default=[256, 512, 1024, 2048, 4096, 8192, 16384], help="contagens de caminhos"
+    )
+    args = parser.parse_args()
+    tabela, necessarios = monte_carlo_convergence(
+        target_se_pct=args.target, path_counts=args.paths, modes=args.modes, n_reps=args.reps, anos=args.anos
+    )
+    print(tabela.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print()
+    for modo, n in necessarios.items():
+        print(f"{modo:>16}: {n if n is not None else 'não atingido'} caminhos para EP <= {args.target}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Benchmark harness for the projection and simulation hot paths.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py                 # compare against the baseline
+    python benchmarks/run_benchmarks.py --save          # record a new baseline
+    python benchmarks/run_benchmarks.py -k monte_carlo  # only matching cases
+
+Every case runs on synthetic families (0 to 10 children) over horizons of
+10 to 80 years and is timed with several repeats; the fastest round (the
+least noisy statistic, as in :mod:`timeit`) is compared with
+``benchmarks/baseline.json`` and cases slower than the baseline by more than
+``--tolerance`` are flagged as regressions (exit status 1).  Baselines
+are machine dependent, so the host and CPU are stored with them; against a
+baseline recorded elsewhere the ratios are only printed, with a warning,
+and never fail the run.  Record one on the machine that runs the comparison.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import JeraOnboarding as jera  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+N_FILHOS = (0, 2, 5, 10)
+HORIZONTES = (10, 40, 80)
+
+
+def synthetic_family(n_filhos: int, anos: int, seed: int = 0) -> Dict[str, object]:
+    """Deterministic client profile (keys of ``PROJECTION_INPUT_KEYS``) with ``n_filhos`` children."""
+    r = random.Random(seed * 1000 + n_filhos * 100 + anos)
+    escolas = sorted({e["nome"] for e in jera.PREMISES["educacao"]["escolas"]})
+    k = r.randint(0, 4)
+    return {
+        "idade_cliente": r.randint(30, 60),
+        "idade_conjuge": r.randint(30, 60),
+        "idades_filhos": [r.randint(0, 20) for _ in range(n_filhos)],
+        "escolas_filhos": [r.choice(escolas + [""]) for _ in range(n_filhos)],
+        "estudam_fora": [r.random() < 0.5 for _ in range(n_filhos)],
+        "bairro": r.choice([b["nome"] for b in jera.PREMISES["moradia"]["bairros"]]),
+        "metragem": r.uniform(100, 800),
+        "n_carros": r.randint(0, 4),
+        "estilo_vida": r.choice([1, 2, 3]),
+        "n_viagens": r.randint(0, 6),
+        "n_funcionarios": r.randint(0, 5),
+        "luxo_mensal": r.uniform(0, 50_000),
+        "segunda_resid_mensal": r.uniform(0, 20_000),
+        "aluguel_mensal_brl": r.uniform(0, 50_000),
+        "aluguel_growth_brl": r.uniform(0, 8),
+        "aluguel_mensal_usd": r.uniform(0, 10_000),
+        "aluguel_growth_usd": r.uniform(0, 5),
+        "dividendos_brl": r.uniform(0, 500_000),
+        "divid_growth_brl": r.uniform(0, 8),
+        "dividendos_usd": r.uniform(0, 50_000),
+        "divid_growth_usd": r.uniform(0, 5),
+        "has_iliquido": k > 0,
+        "iliquido_vals_brl": [r.uniform(0, 2e6) for _ in range(k)],
+        "iliquido_growth_brl": [r.uniform(0, 10) for _ in range(k)],
+        "iliquido_vals_usd": [r.uniform(0, 5e5) for _ in range(k)],
+        "iliquido_growth_usd": [r.uniform(0, 6) for _ in range(k)],
+        "patrimonio_inicial": r.uniform(2e6, 5e7),
+        "filantropia_anual": r.uniform(0, 100_000),
+        "anos_proj": anos,
+        "infl_brl_pct": 4.5,
+        "infl_usd_pct": 2.5,
+        "cotacao_usd": 5.0,
+        "salario_anual0": r.uniform(2e5, 2e6),
+        "idade_aposentadoria": r.randint(55, 70),
+        "nao_tem_conjuge": r.random() < 0.2,
+        "risk_profile": r.choice(list(jera.PORTFOLIOS)),
+        "scales": None,
+    }
+
+
+def _costs_args(perfil: Dict[str, object]) -> Dict[str, object]:
+    args = {
+        k: v
+        for k, v in perfil.items()
+        if k not in ("has_iliquido", "nao_tem_conjuge", "risk_profile") and not k.startswith("iliquido_")
+    }
+    args["no_conjuge"] = perfil["nao_tem_conjuge"]
+    return args
+
+
+def build_cases() -> List[Tuple[str, Callable[[], object]]]:
+    """(name, zero-argument callable) for every benchmarked function and grid point."""
+    casos: List[Tuple[str, Callable[[], object]]] = []
+    for anos in HORIZONTES:
+        for n_filhos in N_FILHOS:
+            perfil = synthetic_family(n_filhos, anos)
+            args = _costs_args(perfil)
+            sufixo = f"[filhos={n_filhos},anos={anos}]"
+            casos.append((f"compute_costs_and_incomes{sufixo}", lambda a=args: jera.compute_costs_and_incomes(**a)))
+            casos.append(
+                (f"compute_costs_and_incomes_vectorized{sufixo}", lambda a=args: jera.compute_costs_and_incomes_vectorized(**a))
+            )
+        perfil = synthetic_family(2, anos)
+        proj = jera.run_projections(perfil)
+        df_brl, df_usd, df_incomes, df_pat = proj["df_brl"], proj["df_usd"], proj["df_incomes"], proj["df_pat"]
+        asp = df_pat["Aspirational (R$)"].tolist()
+        totais = df_brl["Total (R$)"].tolist()
+        rendas = df_incomes["Total Renda (R$)"].tolist()
+        sufixo = f"[anos={anos}]"
+        casos.append((
+            f"compute_patrimony_dynamic{sufixo}",
+            lambda p=perfil, a=asp, t=totais, r=rendas, n=proj["net_cash_series"]: jera.compute_patrimony_dynamic(
+                p["patrimonio_inicial"], a[0], 5.0, 11.85, p["anos_proj"], p["risk_profile"], t, r,
+                p["infl_brl_pct"], p["infl_usd_pct"], p["cotacao_usd"], net_cash=n, aspirational_series=a,
+            ),
+        ))
+        casos.append((f"aspirational_projection{sufixo}", lambda p=perfil: jera._aspirational_projection(p)))
+        carteira = {
+            "dom": {"peso": 0.7, "media": 0.188, "vol": 0.049},
+            "intl": {"peso": 0.3, "media": 0.081, "vol": 0.045},
+        }
+        casos.append((f"simular_monte_carlo{sufixo}", lambda anos=anos: jera.simular_monte_carlo(1e7, carteira, anos)))
+        casos.append((
+            f"simular_endowment_mensal{sufixo}",
+            lambda anos=anos: jera.simular_endowment_mensal(1e7, 0.188, 0.049, anos, n_sim=10000, seed=jera.MC_SEED),
+        ))
+        casos.append((
+            f"simular_patrimonio_monte_carlo{sufixo}",
+            lambda p=perfil, a=asp, t=totais, r=rendas, n=proj["net_cash_series"]: jera.simular_patrimonio_monte_carlo(
+                p["patrimonio_inicial"], a, 11.85, p["anos_proj"], p["risk_profile"], t, r,
+                p["infl_brl_pct"], p["infl_usd_pct"], net_cash=n, n_sim=10000,
+            ),
+        ))
+        casos.append((
+            f"simular_despesas_macro{sufixo}",
+            lambda p=perfil: jera.simular_despesas_macro(p, n_sim=5000, seed=jera.MC_SEED),
+        ))
+        casos.append((
+            f"build_excel_download{sufixo}",
+            lambda b=df_brl, u=df_usd, i=df_incomes, pat=df_pat: jera.build_excel_download(b, u, i, pat),
+        ))
+    return casos
+
+
+def time_case(fn: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    """Median/min seconds per call over ``repeat`` rounds of at least ``min_time`` each."""
+    fn()  # warm-up (imports, caches of premises tables)
+    inicio = time.perf_counter()
+    fn()
+    uma = max(time.perf_counter() - inicio, 1e-7)
+    numero = max(1, int(min_time / uma))
+    tempos = []
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        for _ in range(numero):
+            fn()
+        tempos.append((time.perf_counter() - inicio) / numero)
+    return {"median": statistics.median(tempos), "min": min(tempos), "number": numero, "repeat": repeat}
+
+
+# Keys of machine_info that must match for timings to be comparable.
+MACHINE_KEYS = ("host", "cpu", "cpus", "machine")
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as fh:
+            for linha in fh:
+                if linha.startswith("model name"):
+                    return linha.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def machine_info() -> Dict[str, str]:
+    return {
+        "host": platform.node(),
+        "cpu": _cpu_model(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.platform(),
+        "cpus": str(os.cpu_count()),
+    }
+
+
+def machine_mismatch(atual: Dict[str, str], gravada: Dict[str, str]) -> List[str]:
+    """Messages for each of ``MACHINE_KEYS`` that differs (or was not recorded) in the baseline."""
+    return [
+        f"{chave}: baseline {gravada.get(chave, '(não gravado)')}, atual {atual.get(chave)}"
+        for chave in MACHINE_KEYS
+        if gravada.get(chave) != atual.get(chave)
+    ]
+
+
+def compare(
+    resultados: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float
+) -> Tuple[Dict[str, float], List[str]]:
+    """Ratio of each case's fastest round to its baseline, and the cases slower than ``1 + tolerance``."""
+    razoes = {nome: res["min"] / baseline[nome]["min"] for nome, res in resultados.items() if nome in baseline}
+    return razoes, [nome for nome, razao in razoes.items() if razao > 1 + tolerance]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="filtro", default="", help="only cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per round")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. baseline (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    baseline: Dict[str, Dict[str, float]] = {}
+    diferencas: List[str] = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            gravado = json.load(fh)
+        baseline = gravado.get("results", {})
+        diferencas = machine_mismatch(machine_info(), gravado.get("machine", {}))
+    if diferencas and not args.save:
+        print("AVISO: a baseline foi gravada em outra máquina; as razões não indicam regressões.")
+        for diferenca in diferencas:
+            print(f"  {diferenca}")
+
+    resultados: Dict[str, Dict[str, float]] = {}
+    for nome, fn in build_cases():
+        if args.filtro not in nome:
+            continue
+        res = resultados[nome] = time_case(fn, args.repeat, args.min_time)
+        razoes, lentos = compare({nome: res}, baseline, args.tolerance)
+        status = f"{razoes[nome]:6.2f}x" if nome in razoes else ""
+        if lentos:
+            status += "  REGRESSÃO"
+        print(f"{nome:<65} {res['min'] * 1000:10.3f} ms (mediana {res['median'] * 1000:10.3f})  {status}")
+    _, regressoes = compare(resultados, baseline, args.tolerance)
+
+    if args.save:
+        salvos = baseline if args.filtro else {}
+        salvos.update(resultados)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump({"machine": machine_info(), "results": salvos}, fh, indent=1, sort_keys=True)
+            fh.write("\n")
+        print(f"Baseline gravada em {args.baseline}")
+        return 0
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerance:.0%}: " + ", ".join(regressoes))
+        return 0 if diferencas else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
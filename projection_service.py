@@ -0,0 +1,319 @@
+"""Stateless HTTP projection service for the Jera onboarding engine.
+
+Exposes the calculation functions of :mod:`JeraOnboarding` as an ASGI app,
+without any Streamlit session: every request carries the full client
+profile as JSON (the keys of ``PROJECTION_INPUT_KEYS``) and gets the
+projections back.  Deterministic projections run in the server's thread
+pool; Monte Carlo requests are sent to a process pool so a few heavy
+simulations cannot starve the event loop or each other.
+
+Run with, e.g.::
+
+    uvicorn projection_service:app --workers 4
+
+``JERA_MC_WORKERS`` sets the size of the Monte Carlo process pool (defaults
+to the number of CPUs), ``JERA_MC_MAX_SIM`` the largest accepted ``n_sim``
+and ``JERA_MC_CHUNK_SIZE`` the paths a request draws at once (reduced to
+fit ``JERA_MC_MEMORY_BUDGET``).  Each pool process runs one request at a
+time, so the pool may hold up to ``JERA_MC_WORKERS`` budgets at once.
+
+Endpoints
+---------
+``GET /health``
+    Liveness check.
+``POST /projections``
+    Body: client profile.  Returns the expense, income and patrimony tables
+    (as lists of records), the net cash series and the capital guard.
+``POST /monte-carlo``
+    Body: ``{"profile": {...}, "n_sim": 10000, "seed": 42, "precision":
+    "float64"}``.  Returns the P10/P50/P90 patrimony table, the probability
+    of ruin and the estimated memory of the run.  Requests that cannot fit
+    in ``JERA_MC_MEMORY_BUDGET`` are answered with 413.
+
+Bodies with missing, unknown, mistyped or out-of-range fields are answered
+with 422.  NaN and infinite values in a response are sent as ``null``.
+"""
+
+import asyncio
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple
+
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from JeraOnboarding import (
+    MC_MEMORY_BUDGET,
+    MC_PRECISIONS,
+    OPTIONAL_INPUT_DEFAULTS,
+    PORTFOLIOS,
+    PROJECTION_CACHE,
+    PROJECTION_INPUT_KEYS,
+    MonteCarloBudgetError,
+    json_default,
+    projection_monte_carlo,
+)
+
+MC_WORKERS = int(os.environ.get("JERA_MC_WORKERS", os.cpu_count() or 1))
+MC_MAX_SIM = int(os.environ.get("JERA_MC_MAX_SIM", 200_000))
+# Paths drawn at once by a request, before fitting to MC_MEMORY_BUDGET.
+MC_CHUNK_SIZE = int(os.environ.get("JERA_MC_CHUNK_SIZE", 5000))
+# Each request already runs in its own process of the pool, so it simulates
+# its paths in that process instead of sharding them over another pool.
+MC_REQUEST_WORKERS = 1
+
+# Whole-number profile fields and their accepted (inclusive) range.
+PROFILE_INTEGERS = {
+    "idade_cliente": (0, 120),
+    "idade_conjuge": (0, 120),
+    "idade_aposentadoria": (0, 120),
+    "n_carros": (0, 50),
+    "estilo_vida": (1, 3),
+    "n_viagens": (0, 365),
+    "n_funcionarios": (0, 100),
+    "anos_proj": (1, 100),
+    "capital_guard_anos": (1, 100),
+}
+# Amounts and areas, which may not be negative.
+PROFILE_AMOUNTS = (
+    "metragem", "luxo_mensal", "segunda_resid_mensal", "aluguel_mensal_brl", "aluguel_mensal_usd",
+    "dividendos_brl", "dividendos_usd", "patrimonio_inicial", "filantropia_anual", "salario_anual0",
+)
+# Yearly rates in percent, which must stay above -100%.
+PROFILE_RATES = (
+    "aluguel_growth_brl", "aluguel_growth_usd", "divid_growth_brl", "divid_growth_usd",
+    "infl_brl_pct", "infl_usd_pct",
+)
+PROFILE_FLAGS = ("has_iliquido", "nao_tem_conjuge")
+
+
+class ProfileError(ValueError):
+    """Raised when a client profile cannot be projected."""
+
+
+class NumpyJSONResponse(JSONResponse):
+    """JSON response that also serialises NumPy scalars and arrays."""
+
+    def render(self, content: object) -> bytes:
+        return json.dumps(
+            _finite(content), ensure_ascii=False, allow_nan=False, default=json_default
+        ).encode("utf-8")
+
+
+def _finite(obj: object) -> object:
+    """``obj`` with NaN and infinities (e.g. a failed salary estimate) replaced by ``None``."""
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if hasattr(obj, "tolist"):
+        return _finite(obj.tolist())
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+def _is_number(value: object) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _check_number(nome: str, value: object, minimo: float | None = None, acima_de: float | None = None) -> None:
+    if not _is_number(value):
+        raise ProfileError(f"{nome} deve ser um número.")
+    if minimo is not None and value < minimo:
+        raise ProfileError(f"{nome} deve ser pelo menos {minimo}.")
+    if acima_de is not None and value <= acima_de:
+        raise ProfileError(f"{nome} deve ser maior que {acima_de}.")
+
+
+def _check_integer(nome: str, value: object, minimo: int, maximo: int) -> None:
+    if not _is_number(value) or value != int(value):
+        raise ProfileError(f"{nome} deve ser um número inteiro.")
+    if not minimo <= value <= maximo:
+        raise ProfileError(f"{nome} deve estar entre {minimo} e {maximo}.")
+
+
+def _check_list(nome: str, value: object, tipo: type) -> list:
+    if not isinstance(value, list) or not all(isinstance(v, tipo) for v in value):
+        raise ProfileError(f"{nome} deve ser uma lista de {tipo.__name__}.")
+    return value
+
+
+def validate_profile(profile: Dict[str, object]) -> None:
+    """Check the types and ranges of a complete client profile.
+
+    Raises :class:`ProfileError` naming the first offending field, so a bad
+    request is answered with 422 instead of failing inside the engine.
+    """
+    for nome, (minimo, maximo) in PROFILE_INTEGERS.items():
+        _check_integer(nome, profile[nome], minimo, maximo)
+    for nome in PROFILE_AMOUNTS:
+        _check_number(nome, profile[nome], minimo=0)
+    for nome in PROFILE_RATES:
+        _check_number(nome, profile[nome], acima_de=-100)
+    _check_number("cotacao_usd", profile["cotacao_usd"], acima_de=0)
+    for nome in PROFILE_FLAGS:
+        if not isinstance(profile[nome], bool):
+            raise ProfileError(f"{nome} deve ser true ou false.")
+    for nome in ("bairro", "risk_profile"):
+        if not isinstance(profile[nome], str):
+            raise ProfileError(f"{nome} deve ser um texto.")
+    if profile["risk_profile"] not in PORTFOLIOS:
+        raise ProfileError(f"risk_profile deve ser um de: {', '.join(PORTFOLIOS)}.")
+    for idade in _check_list("idades_filhos", profile["idades_filhos"], object):
+        _check_integer("idades_filhos", idade, 0, 120)
+    _check_list("escolas_filhos", profile["escolas_filhos"], str)
+    _check_list("estudam_fora", profile["estudam_fora"], bool)
+    for nome in ("iliquido_vals_brl", "iliquido_vals_usd"):
+        for valor in _check_list(nome, profile[nome], object):
+            _check_number(nome, valor, minimo=0)
+    for nome in ("iliquido_growth_brl", "iliquido_growth_usd"):
+        for taxa in _check_list(nome, profile[nome], object):
+            _check_number(nome, taxa, acima_de=-100)
+    scales = profile["scales"]
+    if scales is not None:
+        if not isinstance(scales, dict):
+            raise ProfileError("scales deve ser um objeto ou null.")
+        for nome, fator in scales.items():
+            _check_number(f"scales.{nome}", fator, minimo=0)
+
+
+def parse_profile(payload: object) -> Dict[str, object]:
+    """Validate a JSON client profile and fill in the optional keys."""
+    if not isinstance(payload, dict):
+        raise ProfileError("O perfil do cliente deve ser um objeto JSON.")
+    missing = [k for k in PROJECTION_INPUT_KEYS if k not in payload and k not in OPTIONAL_INPUT_DEFAULTS]
+    if missing:
+        raise ProfileError(f"Campos obrigatórios ausentes: {', '.join(missing)}")
+    unknown = sorted(set(payload) - set(PROJECTION_INPUT_KEYS))
+    if unknown:
+        raise ProfileError(f"Campos desconhecidos: {', '.join(unknown)}")
+    profile = {key: payload.get(key, OPTIONAL_INPUT_DEFAULTS.get(key)) for key in PROJECTION_INPUT_KEYS}
+    validate_profile(profile)
+    n_filhos = len(profile["idades_filhos"])
+    if len(profile["escolas_filhos"]) != n_filhos or len(profile["estudam_fora"]) != n_filhos:
+        raise ProfileError("idades_filhos, escolas_filhos e estudam_fora devem ter o mesmo tamanho.")
+    return profile
+
+
+def _frame_records(df: pd.DataFrame) -> list:
+    return df.to_dict(orient="records")
+
+
+def projection_payload(profile: Dict[str, object]) -> Dict[str, object]:
+    """Run (or fetch from cache) the deterministic projections of ``profile``."""
+    proj = PROJECTION_CACHE.get_or_compute(profile)
+    return {
+        "despesas_brl": _frame_records(proj["df_brl"]),
+        "despesas_usd": _frame_records(proj["df_usd"]),
+        "rendas": _frame_records(proj["df_incomes"]),
+        "patrimonio": _frame_records(proj["df_pat"]),
+        "net_cash": proj["net_cash_series"],
+        "capital_guard": proj["capital_guard"],
+        "required_caps": proj["required_caps"],
+        "aspirational_inicial": proj["aspirational_inicial"],
+        "aspirational_growth_rate": proj["aspirational_growth_rate"],
+    }
+
+
+def monte_carlo_payload(
+    profile: Dict[str, object], n_sim: int, seed: int, precision: str = "float64"
+) -> Dict[str, object]:
+    """Patrimony Monte Carlo of ``profile``; runs inside the process pool.
+
+    ``memoria_estimada`` is estimated from the chunk size the run actually
+    used once fitted to ``MC_MEMORY_BUDGET`` and its worker count.
+    """
+    mc = projection_monte_carlo(
+        profile,
+        n_sim=n_sim,
+        seed=seed,
+        precision=precision,
+        chunk_size=MC_CHUNK_SIZE,
+        workers=MC_REQUEST_WORKERS,
+        memory_budget=MC_MEMORY_BUDGET,
+    )
+    return {
+        "percentis": _frame_records(mc["df_mc"]),
+        "prob_ruina": mc["prob_ruina"],
+        "n_sim": n_sim,
+        "seed": seed,
+        "memoria_estimada": mc["memoria_estimada"],
+    }
+
+
+def parse_monte_carlo_request(payload: object) -> Tuple[Dict[str, object], int, int, str]:
+    if not isinstance(payload, dict):
+        raise ProfileError("O corpo da requisição deve ser um objeto JSON.")
+    profile = parse_profile(payload.get("profile"))
+    n_sim = payload.get("n_sim", 10000)
+    _check_integer("n_sim", n_sim, 1, MC_MAX_SIM)
+    seed = payload.get("seed", 42)
+    _check_integer("seed", seed, 0, 2**63 - 1)
+    precision = payload.get("precision", "float64")
+    if precision not in MC_PRECISIONS:
+        raise ProfileError(f"precision deve ser um de: {', '.join(MC_PRECISIONS)}.")
+    return profile, int(n_sim), int(seed), precision
+
+
+async def _read_json(request: Request) -> object:
+    try:
+        return await request.json()
+    except ValueError as exc:
+        raise ProfileError(f"JSON inválido: {exc}") from exc
+
+
+def _error(exc: Exception) -> JSONResponse:
+    return JSONResponse({"erro": str(exc)}, status_code=422)
+
+
+async def health(request: Request) -> JSONResponse:
+    return JSONResponse({"status": "ok"})
+
+
+async def projections(request: Request) -> JSONResponse:
+    try:
+        profile = parse_profile(await _read_json(request))
+        return NumpyJSONResponse(await run_in_threadpool(projection_payload, profile))
+    except (ProfileError, KeyError, TypeError, ValueError) as exc:
+        return _error(exc)
+
+
+async def monte_carlo(request: Request) -> JSONResponse:
+    try:
+        profile, n_sim, seed, precision = parse_monte_carlo_request(await _read_json(request))
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            request.app.state.mc_pool, monte_carlo_payload, profile, n_sim, seed, precision
+        )
+        return NumpyJSONResponse(result)
+    except MonteCarloBudgetError as exc:
+        return JSONResponse({"erro": str(exc)}, status_code=413)
+    except (ProfileError, KeyError, TypeError, ValueError) as exc:
+        return _error(exc)
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    app.state.mc_pool = ProcessPoolExecutor(max_workers=max(1, MC_WORKERS))
+    try:
+        yield
+    finally:
+        app.state.mc_pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/projections", projections, methods=["POST"]),
+        Route("/monte-carlo", monte_carlo, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
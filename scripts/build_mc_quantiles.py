@@ -0,0 +1,38 @@
+"""Regenerate data/mc_growth_quantiles.json, the shipped endowment growth-factor table.
+
+Usage::
+
+    python scripts/build_mc_quantiles.py [--anos 80] [--n-sim 200000] [--workers 4]
+
+Run it whenever PORTFOLIOS or the monthly endowment engine change (and bump
+GROWTH_QUANTILE_TABLE_VERSION in the latter case).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from JeraOnboarding import GROWTH_QUANTILE_TABLE_PATH, MC_SEED, build_growth_quantile_table  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--anos", type=int, default=80)
+    parser.add_argument("--n-sim", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=MC_SEED)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--out", default=GROWTH_QUANTILE_TABLE_PATH)
+    args = parser.parse_args()
+    tabela = build_growth_quantile_table(anos=args.anos, n_sim=args.n_sim, seed=args.seed, workers=args.workers)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(tabela, fh, indent=1)
+        fh.write("\n")
+    print(f"Tabela v{tabela['version']} gravada em {args.out}")
+
+
+if __name__ == "__main__":
+    main()
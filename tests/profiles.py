@@ -0,0 +1,70 @@
+"""Randomized client profiles shared by the tests."""
+
+import random
+
+import JeraOnboarding as jera
+
+
+def random_costs_args(seed: int) -> dict:
+    """Random arguments of ``compute_costs_and_incomes`` covering every rule.
+
+    Children span school, university (Brazil and abroad), car and health
+    ages; clients span every saúde band; spouse, USD incomes, FX and
+    ``scales`` vary.
+    """
+    r = random.Random(seed)
+    escolas = sorted({e["nome"] for e in jera.PREMISES["educacao"]["escolas"]})
+    n_filhos = r.randint(0, 6)
+    return {
+        "idade_cliente": r.randint(18, 95),
+        "idade_conjuge": r.randint(18, 95),
+        "idades_filhos": [r.randint(0, 30) for _ in range(n_filhos)],
+        "escolas_filhos": [r.choice(escolas + ["", "Escola inexistente"]) for _ in range(n_filhos)],
+        "estudam_fora": [r.random() < 0.5 for _ in range(n_filhos)],
+        "bairro": r.choice([b["nome"] for b in jera.PREMISES["moradia"]["bairros"]] + ["Bairro inexistente"]),
+        "metragem": r.uniform(50, 1500),
+        "n_carros": r.randint(0, 5),
+        "estilo_vida": r.choice([1, 2, 3]),
+        "n_viagens": r.randint(0, 8),
+        "n_funcionarios": r.randint(0, 6),
+        "luxo_mensal": r.uniform(0, 80_000),
+        "segunda_resid_mensal": r.uniform(0, 30_000),
+        "aluguel_mensal_brl": r.uniform(0, 60_000),
+        "aluguel_growth_brl": r.uniform(-2, 10),
+        "aluguel_mensal_usd": r.uniform(0, 15_000),
+        "aluguel_growth_usd": r.uniform(-2, 6),
+        "dividendos_brl": r.uniform(0, 800_000),
+        "divid_growth_brl": r.uniform(-2, 10),
+        "dividendos_usd": r.uniform(0, 90_000),
+        "divid_growth_usd": r.uniform(-2, 6),
+        "patrimonio_inicial": r.uniform(1e6, 1e8),
+        "filantropia_anual": r.uniform(0, 200_000),
+        "anos_proj": r.choice([1, 5, 20, 45, 80]),
+        "infl_brl_pct": r.uniform(0, 12),
+        "infl_usd_pct": r.uniform(0, 6),
+        "cotacao_usd": r.uniform(3, 8),
+        "salario_anual0": r.uniform(0, 3e6),
+        "idade_aposentadoria": r.randint(40, 75),
+        "no_conjuge": r.random() < 0.3,
+        "scales": r.choice([None, {k: r.uniform(0.5, 1.5) for k in jera.EXPENSE_SCALE_KEYS}]),
+        "capital_guard_anos": r.choice([4, 6, 8]),
+    }
+
+
+def random_profile(seed: int, anos_proj: int | None = None) -> dict:
+    """Random projection inputs (keys of ``PROJECTION_INPUT_KEYS``), as in the session state."""
+    r = random.Random(seed + 10_000)
+    perfil = random_costs_args(seed)
+    perfil["nao_tem_conjuge"] = perfil.pop("no_conjuge")
+    if anos_proj is not None:
+        perfil["anos_proj"] = anos_proj
+    k = r.randint(0, 3)
+    perfil.update(
+        has_iliquido=r.random() < 0.7,
+        iliquido_vals_brl=[r.uniform(0, 2e6) for _ in range(k)],
+        iliquido_growth_brl=[r.uniform(0, 10) for _ in range(k)],
+        iliquido_vals_usd=[r.uniform(0, 5e5) for _ in range(k)],
+        iliquido_growth_usd=[r.uniform(0, 6) for _ in range(k)],
+        risk_profile=r.choice(list(jera.PORTFOLIOS)),
+    )
+    return {key: perfil[key] for key in jera.PROJECTION_INPUT_KEYS}
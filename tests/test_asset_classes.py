@@ -0,0 +1,74 @@
+"""AssetClassModel: Cholesky factor, validation of the correlations and the single-class case."""
+
+import numpy as np
+import pytest
+
+import JeraOnboarding as jera
+
+ANOS = 20
+
+
+def _correlacao(modelo):
+    vol = np.sqrt(np.diag(modelo.covariance))
+    return modelo.covariance / np.outer(vol, vol)
+
+
+@pytest.mark.parametrize("perfil", list(jera.PORTFOLIOS))
+def test_cholesky_reproduces_the_correlation(perfil):
+    modelo = jera.AssetClassModel(perfil)
+    assert np.allclose(modelo.cholesky @ modelo.cholesky.T, modelo.covariance, atol=1e-10)
+    # An explicit valid matrix comes back unchanged
+    k = len(modelo.classes)
+    rng = np.random.default_rng(k)
+    a = rng.normal(size=(k, 3 * k))
+    cov = a @ a.T
+    d = np.sqrt(np.diag(cov))
+    alvo = cov / np.outer(d, d)
+    explicito = jera.AssetClassModel(perfil, calibrar=False, correlacao=alvo)
+    assert np.allclose(explicito.cholesky @ explicito.cholesky.T, explicito.covariance, atol=1e-10)
+    assert np.allclose(_correlacao(explicito), alvo, atol=1e-9)
+
+
+@pytest.mark.parametrize(
+    "matriz",
+    [
+        [[1.0, 0.9, -0.9], [0.9, 1.0, 0.9], [-0.9, 0.9, 1.0]],  # not positive definite
+        [[1.0, 1.0, 0.0], [1.0, 1.0, 0.0], [0.0, 0.0, 1.0]],  # singular
+        [[1.0, 0.2, 0.0], [0.3, 1.0, 0.0], [0.0, 0.0, 1.0]],  # not symmetric
+        [[1.0, 0.2], [0.2, 1.0]],  # wrong size
+    ],
+)
+def test_invalid_correlation_is_rejected(matriz):
+    with pytest.raises(ValueError):
+        jera.MacroScenarioModel(5.0, 3.0, 5.0, ANOS, {"correlacao": matriz})
+    # The same block embedded in a class correlation matrix
+    k = len(jera.AssetClassModel("moderado").classes)
+    bloco = np.array(matriz)
+    classes = np.eye(k)
+    classes[: len(bloco), : len(bloco)] = bloco
+    with pytest.raises(ValueError):
+        jera.AssetClassModel("moderado", correlacao=classes if len(bloco) == 3 else bloco)
+
+
+def test_single_class_reduces_to_the_scalar_model(monkeypatch):
+    moderado = jera.PORTFOLIOS["moderado"]
+    # One uncorrelated class per segment: the dom/intl returns are the independent normals of PORTFOLIOS
+    monkeypatch.setitem(jera.PORTFOLIOS, "moderado", {
+        "dom": {**moderado["dom"], "classes": {"Liquidez CDI": 100.0}},
+        "intl": {**moderado["intl"], "classes": {"Commodities": 100.0}},
+    })
+    modelo = jera.AssetClassModel("moderado")
+    mu = [moderado["dom"]["expected_return"], moderado["intl"]["expected_return"]]
+    vol = [moderado["dom"]["vol"], moderado["intl"]["vol"]]
+    assert np.allclose(modelo.media_segmento, mu)
+    assert np.allclose(modelo.carga_segmento, np.diag(vol))
+
+    totais = 1e6 * 1.04 ** np.arange(ANOS)
+    rendas = np.full(ANOS, 3e5)
+    args = (2e7, np.full(ANOS, 1e6), 11.85, ANOS, "moderado", totais, rendas, 4.5, 2.5)
+    kwargs = {"net_cash": rendas - totais, "n_sim": 2000, "seed": 3}
+    agregado, prob_agregado = jera.simular_patrimonio_monte_carlo(*args, **kwargs)
+    classes, prob_classes = jera.simular_patrimonio_monte_carlo(*args, return_model="classes", **kwargs)
+    for col in ("P10 (R$)", "P50 (R$)", "P90 (R$)"):
+        assert np.allclose(agregado[col], classes[col], rtol=1e-6), col
+    assert prob_agregado == prob_classes
@@ -0,0 +1,44 @@
+"""Benchmark harness: regression comparison and the machine stored with the baseline."""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import run_benchmarks as bench  # noqa: E402
+
+
+def _res(segundos):
+    return {"min": segundos, "median": segundos, "number": 1, "repeat": 1}
+
+
+def test_compare_flags_cases_beyond_the_tolerance():
+    baseline = {"a": _res(1.0), "b": _res(1.0), "c": _res(2.0)}
+    resultados = {"a": _res(1.2), "b": _res(1.3), "c": _res(1.0), "novo": _res(9.0)}
+    razoes, regressoes = bench.compare(resultados, baseline, 0.25)
+    assert razoes == pytest.approx({"a": 1.2, "b": 1.3, "c": 0.5})
+    assert regressoes == ["b"]
+
+
+def test_machine_mismatch():
+    atual = bench.machine_info()
+    assert bench.machine_mismatch(atual, dict(atual)) == []
+    assert bench.machine_mismatch(atual, {**atual, "numpy": "0.0"}) == []
+    outra = bench.machine_mismatch(atual, {**atual, "host": "outra", "cpu": "outro"})
+    assert [m.split(":")[0] for m in outra] == ["host", "cpu"]
+    # Baselines recorded before the host and CPU were stored
+    antiga = {k: v for k, v in atual.items() if k not in ("host", "cpu")}
+    assert len(bench.machine_mismatch(atual, antiga)) == 2
+
+
+@pytest.mark.parametrize("mesma_maquina", [True, False])
+def test_regressions_only_fail_on_the_baseline_machine(tmp_path, monkeypatch, mesma_maquina):
+    maquina = bench.machine_info() if mesma_maquina else {**bench.machine_info(), "host": "outra"}
+    caminho = tmp_path / "baseline.json"
+    caminho.write_text(json.dumps({"machine": maquina, "results": {"caso": _res(1e-9)}}))
+    monkeypatch.setattr(bench, "build_cases", lambda: [("caso", lambda: sum(range(1000)))])
+    monkeypatch.setattr(sys, "argv", ["run_benchmarks", "--baseline", str(caminho), "--repeat", "1", "--min-time", "0"])
+    assert bench.main() == (1 if mesma_maquina else 0)
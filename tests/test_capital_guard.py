@@ -0,0 +1,78 @@
+"""Capital guard look-ahead window: prefix sums against brute force, on every code path."""
+
+import inspect
+
+import numpy as np
+import pandas as pd
+import pytest
+from profiles import random_profile
+
+import JeraOnboarding as jera
+
+ANOS = 25
+
+
+def _brute_force(gastos, rendas, w):
+    return [sum(gastos[i : i + w]) - rendas[i] for i in range(len(gastos))]
+
+
+@pytest.mark.parametrize("w", [4, 6, 8])
+def test_requirements_match_brute_force(w):
+    rng = np.random.default_rng(w)
+    gastos = rng.uniform(1e5, 1e6, size=(3, ANOS))
+    rendas = rng.uniform(0, 5e5, size=(3, ANOS))
+    assert np.allclose(jera.capital_guard_requirements(gastos[0], rendas[0], w), _brute_force(gastos[0], rendas[0], w))
+    # One window per client
+    janelas = np.array([w, 4, 8])
+    matriz = jera.capital_guard_requirements(gastos, rendas, janelas)
+    for linha, janela in enumerate(janelas):
+        assert np.allclose(matriz[linha], _brute_force(gastos[linha], rendas[linha], janela))
+
+
+@pytest.mark.parametrize("w", [6, 8])
+def test_projection_paths_use_the_window(w):
+    perfil = {**random_profile(11, ANOS), "capital_guard_anos": w, "scales": None}
+    proj = jera.run_projections(perfil)
+    gastos = proj["df_brl"]["Total (R$)"].tolist()
+    rendas = proj["df_incomes"]["Total Renda (R$)"].tolist()
+    esperado = _brute_force(gastos, rendas, w)
+    assert np.allclose(proj["required_caps"][1:], esperado[1:])
+    inicial = esperado[0] if esperado[0] >= gastos[0] else 0.10 * perfil["patrimonio_inicial"]
+    assert np.isclose(proj["capital_guard"], inicial)
+
+    # The loop engine takes the same window
+    parametros = inspect.signature(jera.compute_costs_and_incomes).parameters
+    args = {k: perfil[k] for k in parametros if k in perfil}
+    args["no_conjuge"] = perfil["nao_tem_conjuge"]
+    assert np.isclose(jera.compute_costs_and_incomes(**args)[3], inicial)
+
+    # The batch path, with another client on the default window, matches row by row
+    padrao = {**perfil, "capital_guard_anos": jera.CAPITAL_GUARD_YEARS}
+    out = jera.project_batch(pd.DataFrame([perfil, padrao]), ANOS)
+    assert np.allclose(out["capital_guard"][0], proj["df_pat"]["Capital Guard (R$)"])
+    assert np.allclose(out["capital_guard"][1], jera.run_projections(padrao)["df_pat"]["Capital Guard (R$)"])
+    assert not np.allclose(out["capital_guard"][0], out["capital_guard"][1])
+
+
+def test_monte_carlo_uses_the_window(monkeypatch):
+    # Without volatility every path follows the deterministic projection
+    portfolios = {nome: {s: {**p[s], "vol": 0.0} for s in ("dom", "intl")} for nome, p in jera.PORTFOLIOS.items()}
+    monkeypatch.setattr(jera, "PORTFOLIOS", portfolios)
+    perfil = {**random_profile(5, ANOS), "capital_guard_anos": 8}
+    proj = jera.run_projections(perfil)
+    for w in (4, 8):
+        df_mc, _ = jera.simular_patrimonio_monte_carlo(
+            perfil["patrimonio_inicial"], proj["df_pat"]["Aspirational (R$)"].tolist(), 11.85, ANOS,
+            perfil["risk_profile"], proj["df_brl"]["Total (R$)"].tolist(), proj["df_incomes"]["Total Renda (R$)"].tolist(),
+            perfil["infl_brl_pct"], perfil["infl_usd_pct"], net_cash=proj["net_cash_series"], n_sim=20,
+            capital_guard_anos=w,
+        )
+        igual = np.allclose(df_mc["P50 (R$)"], proj["df_pat"]["Patrimônio Total (R$)"], rtol=1e-9)
+        assert igual == (w == 8)
+
+
+def test_window_is_part_of_the_cache_key():
+    perfil = random_profile(2, ANOS)
+    assert jera.projection_cache_key({**perfil, "capital_guard_anos": 4}) != jera.projection_cache_key(
+        {**perfil, "capital_guard_anos": 6}
+    )
@@ -0,0 +1,64 @@
+"""The vectorized expense engine must match the loop engine it replaces."""
+
+import inspect
+import random
+
+import numpy as np
+import pytest
+from profiles import random_costs_args, random_profile
+
+import JeraOnboarding as jera
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_vectorized_engine_matches_loop_engine(seed):
+    args = random_costs_args(seed)
+    loop = jera.compute_costs_and_incomes(**args)
+    vec = jera.compute_costs_and_incomes_vectorized(**args)
+    for df_loop, df_vec in zip(loop[:3], vec[:3]):
+        assert list(df_loop.columns) == list(df_vec.columns)
+        for col in df_loop.columns:
+            assert np.allclose(df_loop[col].to_numpy(float), df_vec[col].to_numpy(float), rtol=1e-12, atol=1e-6), col
+    assert np.isclose(loop[3], vec[3], rtol=1e-12, atol=1e-6)
+
+
+def _loop_args(perfil: dict) -> dict:
+    args = {k: perfil[k] for k in inspect.signature(jera.compute_costs_and_incomes).parameters if k in perfil}
+    args["no_conjuge"] = perfil["nao_tem_conjuge"]
+    return args
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_rescaled_cached_base_matches_full_recompute(seed):
+    r = random.Random(seed)
+    perfil = random_profile(seed, r.choice([5, 20, 45]))
+    escalas = {k: r.choice([0.05, r.uniform(0.5, 1.5), 6.0]) for k in jera.EXPENSE_SCALE_KEYS}
+    perfil["scales"] = escalas
+    # Large dividends on odd seeds put the capital guard on the 10% rule
+    if seed % 2:
+        perfil["dividendos_brl"] = 2e7
+    base = jera._base_projection(perfil)["arrays"]
+    rescalado = jera._expense_frames(jera._apply_expense_scales(base, jera._scale_columns([escalas])))
+    completo = jera.compute_costs_and_incomes(**_loop_args(perfil))
+    for df_rescalado, df_completo in zip(rescalado[:3], completo[:3]):
+        for col in df_completo.columns:
+            assert np.allclose(
+                df_rescalado[col].to_numpy(float), df_completo[col].to_numpy(float), rtol=1e-12, atol=1e-6
+            ), col
+    # Capital guard from the scaled totals, not the unscaled ones
+    assert np.isclose(rescalado[3], completo[3], rtol=1e-12, atol=1e-6)
+
+
+def test_scale_change_is_a_base_cache_hit():
+    perfil = random_profile(21, 30)
+    jera.run_projections({**perfil, "scales": None})
+    antes = jera.EXPENSE_BASE_CACHE.stats()
+    for fator in (0.5, 1.3, 2.0):
+        escalado = {**perfil, "scales": {k: fator for k in jera.EXPENSE_SCALE_KEYS}}
+        proj = jera.run_projections(escalado)
+        esperado = jera.compute_costs_and_incomes(**_loop_args(escalado))
+        assert np.allclose(proj["df_brl"]["Total (R$)"], esperado[0]["Total (R$)"], rtol=1e-12)
+        assert np.isclose(proj["capital_guard"], esperado[3], rtol=1e-12)
+    depois = jera.EXPENSE_BASE_CACHE.stats()
+    assert depois["hits"] - antes["hits"] == 3
+    assert depois["misses"] == antes["misses"]
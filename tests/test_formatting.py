@@ -0,0 +1,33 @@
+"""``format_currency_array`` must render exactly like the scalar formatters."""
+
+import numpy as np
+import pytest
+
+import JeraOnboarding as jera
+
+
+def _valores() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    aleatorios = rng.choice([-1.0, 1.0], 20_000) * 10 ** rng.uniform(-3, 18, 20_000)
+    centavos = np.round(rng.uniform(-1e6, 1e6, 2_000), 2)
+    # Half-cent ties and values just around them
+    meios = (rng.integers(0, 10**7, 2_000) + 0.5) / 100.0
+    especiais = [
+        0.0, -0.0, 0.005, 0.015, 0.125, 2.675, 1.005, -2.675, 0.0049999, 999.995, 999_999.995,
+        9.2e16, 9.3e16, -1e17, 1e20, 1e300, np.inf, -np.inf, np.nan, 1e-300, -1e-9,
+    ]
+    return np.concatenate([aleatorios, centavos, meios, np.nextafter(meios, 0), np.nextafter(meios, np.inf), especiais])
+
+
+@pytest.mark.parametrize("simbolo, escalar", [("R$", jera.format_brl_value), ("$", jera.format_usd_value)])
+def test_array_formatter_matches_scalar(simbolo, escalar):
+    valores = _valores()
+    vetorizado = jera.format_currency_array(valores, simbolo)
+    esperado = [escalar(v) for v in valores]
+    divergentes = [(v, a, b) for v, a, b in zip(valores, vetorizado, esperado) if a != b]
+    assert not divergentes, divergentes[:5]
+
+
+def test_shape_is_kept():
+    valores = np.arange(6.0).reshape(2, 3) * 1234.5
+    assert jera.format_currency_array(valores).shape == (2, 3)
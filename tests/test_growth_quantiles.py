@@ -0,0 +1,72 @@
+"""Shipped growth-factor table: regeneration, version and shape."""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import JeraOnboarding as jera
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANOS = 5
+
+
+def _tabela_enviada():
+    with open(jera.GROWTH_QUANTILE_TABLE_PATH, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def test_shipped_table_matches_the_engine_version_and_shape():
+    tabela = _tabela_enviada()
+    assert tabela["version"] == jera.GROWTH_QUANTILE_TABLE_VERSION
+    assert jera._growth_quantile_table_ok(tabela)
+    assert set(tabela["perfis"]) == set(jera.PORTFOLIOS)
+    for nome, profile in jera.PORTFOLIOS.items():
+        for segmento in ("dom", "intl"):
+            entrada = tabela["perfis"][nome][segmento]
+            assert entrada["expected_return"] == profile[segmento]["expected_return"]
+            assert entrada["vol"] == profile[segmento]["vol"]
+
+
+def test_regenerated_cells_match_the_shipped_table(tmp_path):
+    saida = tmp_path / "tabela.json"
+    script = os.path.join(RAIZ, "scripts", "build_mc_quantiles.py")
+    resultado = subprocess.run(
+        [sys.executable, script, "--anos", str(ANOS), "--n-sim", "20000", "--out", str(saida)],
+        capture_output=True,
+        text=True,
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    with open(saida, encoding="utf-8") as fh:
+        nova = json.load(fh)
+    enviada = _tabela_enviada()
+    assert nova["version"] == enviada["version"]
+    for nome, segmentos in nova["perfis"].items():
+        for segmento, entrada in segmentos.items():
+            for k in jera.GROWTH_QUANTILE_KEYS:
+                # 20k paths against the shipped 200k: sampling noise well under 1% of a growth factor
+                esperado = enviada["perfis"][nome][segmento][k][:ANOS]
+                assert np.allclose(entrada[k], esperado, rtol=0.01), (nome, segmento, k)
+
+
+@pytest.mark.parametrize("defeito", ["versao", "encurtada", "sem_percentil"])
+def test_mismatched_table_is_not_used(defeito, tmp_path, monkeypatch):
+    tabela = _tabela_enviada()
+    entrada = tabela["perfis"]["moderado"]["dom"]
+    if defeito == "versao":
+        tabela["version"] = jera.GROWTH_QUANTILE_TABLE_VERSION + 1
+    elif defeito == "encurtada":
+        entrada["p50"] = entrada["p50"][:-1]
+    else:
+        del entrada["p90"]
+    caminho = tmp_path / "tabela.json"
+    caminho.write_text(json.dumps(tabela), encoding="utf-8")
+    monkeypatch.setattr(jera, "GROWTH_QUANTILE_TABLE_PATH", str(caminho))
+    monkeypatch.setitem(jera._GROWTH_QUANTILE_TABLE, "carregada", False)
+    assert jera.growth_quantile_table() is None
+    # Falls back to a live run instead of reading the bad table
+    p10, p50, p90 = jera.endowment_percentiles(1e6, "moderado", "dom", ANOS, n_sim=500, seed=3)
+    assert len(p50) == ANOS and np.all(p10 <= p50) and np.all(p50 <= p90)
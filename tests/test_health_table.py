@@ -0,0 +1,54 @@
+"""Compiled saúde lookup against the per-call band scan it replaced."""
+
+import numpy as np
+import pytest
+
+import JeraOnboarding as jera
+
+IDADES = range(0, jera.HEALTH_MAX_AGE + 1)
+
+
+def _health_band_scan(age, ranges):
+    """The original per-call scan over PREMISES["saude"]["gastoAnualPorFaixa"]."""
+    if not ranges:
+        return 0.0
+    last_cost = ranges[-1].get("gasto", 0)
+    for entry in ranges:
+        faixa = entry.get("faixa", "")
+        gasto = entry.get("gasto", 0)
+        try:
+            if "–" in faixa:
+                min_age, max_age = faixa.split("–")
+                min_age = int(min_age.strip())
+                max_age = int(max_age.strip())
+            elif "+" in faixa:
+                min_age = int(faixa.replace("+", "").strip())
+                max_age = 200
+            else:
+                min_age = max_age = int(faixa.strip())
+            if min_age <= age <= max_age:
+                return float(gasto)
+        except (ValueError, AttributeError):
+            continue
+    return float(last_cost)
+
+
+FAIXAS_EDITADAS = [
+    {"faixa": "0–18", "gasto": 1000.0},
+    {"faixa": "10–30", "gasto": 2000.0},  # overlaps the previous band, which wins
+    {"faixa": "faixa inválida", "gasto": 9.0},
+    {"faixa": "45", "gasto": 4500.0},
+    {"faixa": "70+", "gasto": 7000.0},
+    {"faixa": "50–60", "gasto": 5000.0},
+]
+
+
+@pytest.mark.parametrize("editada", [False, True])
+def test_health_lookup_matches_the_band_scan_for_every_age(editada, monkeypatch):
+    if editada:
+        monkeypatch.setitem(jera.PREMISES["saude"], "gastoAnualPorFaixa", FAIXAS_EDITADAS)
+    ranges = jera.PREMISES["saude"]["gastoAnualPorFaixa"]
+    esperado = [_health_band_scan(idade, ranges) for idade in IDADES]
+    assert [jera.health_cost_for_age(idade) for idade in IDADES] == esperado
+    assert jera.health_costs_for_ages(np.array(IDADES)).tolist() == esperado
+    assert jera.health_cost_for_age(-1) == _health_band_scan(-1, ranges)
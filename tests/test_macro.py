@@ -0,0 +1,64 @@
+"""Stochastic inflation/FX scenarios against the deterministic projection."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from profiles import random_profile
+
+import JeraOnboarding as jera
+
+ANOS = 30
+SEM_VOL = {"vol_infl_brl": 0.0, "vol_infl_usd": 0.0, "vol_cambio": 0.0}
+
+
+def test_zero_vol_paths_equal_the_macro_path():
+    modelo = jera.MacroScenarioModel(7.5, 3.2, 5.4, ANOS, SEM_VOL)
+    cenarios = modelo.scenarios(np.random.default_rng(0), 4)
+    caminho = jera.macro_path(7.5, 3.2, 5.4, ANOS)
+    for nome in jera.MacroPath.SERIES:
+        assert np.allclose(cenarios[nome], getattr(caminho, nome)[None, :], rtol=1e-12), nome
+
+
+@pytest.mark.parametrize("seed", [1, 4, 9])
+def test_zero_vol_bands_equal_the_deterministic_costs(seed):
+    perfil = random_profile(seed, ANOS)
+    proj = jera.run_projections(perfil)
+    gastos = proj["df_brl"]["Total (R$)"].to_numpy()
+    fluxo = proj["df_incomes"]["Total Renda (R$)"].to_numpy() - gastos
+    bandas = jera.simular_despesas_macro(perfil, n_sim=16, chunk_size=5, params=SEM_VOL)
+    for p in ("P10", "P50", "P90"):
+        assert np.allclose(bandas[f"Gastos {p} (R$)"], gastos, rtol=1e-9)
+        assert np.allclose(bandas[f"Fluxo Líquido {p} (R$)"], fluxo, rtol=1e-9, atol=1e-6)
+
+
+def test_first_year_shocks_follow_the_correlation():
+    params = {**jera.MACRO_SCENARIO_PARAMS, "persistencia": 0.0}
+    modelo = jera.MacroScenarioModel(6.0, 2.5, 5.0, 2, params)
+    c = modelo.scenarios(np.random.default_rng(3), 200_000)
+    infl_brl = c["fator_brl"][:, 1] - 1
+    infl_usd = c["fator_usd"][:, 1] - 1
+    # The FX shock is what the rate moved beyond the inflation differential
+    choque_fx = np.log(c["cotacoes"][:, 1] / 5.0) - np.log((1 + infl_brl) / (1 + infl_usd))
+    observada = np.corrcoef([infl_brl, infl_usd, choque_fx])
+    assert np.allclose(observada, np.array(params["correlacao"]), atol=0.01)
+    assert np.isclose(infl_brl.std(), params["vol_infl_brl"] / 100, rtol=0.02)
+    assert np.isclose(choque_fx.std(), params["vol_cambio"], rtol=0.02)
+
+
+def test_bands_are_ordered():
+    bandas = jera.simular_despesas_macro(random_profile(2, ANOS), n_sim=500, seed=5)
+    for serie in ("Gastos", "Fluxo Líquido"):
+        p10, p50, p90 = (bandas[f"{serie} {p} (R$)"].to_numpy() for p in ("P10", "P50", "P90"))
+        assert np.all(p10 <= p50) and np.all(p50 <= p90)
+    # Uncertainty compounds: the spending band widens over the horizon
+    largura = bandas["Gastos P90 (R$)"] - bandas["Gastos P10 (R$)"]
+    assert largura.iloc[-1] > largura.iloc[1]
+
+
+def test_seeded_runs_are_reproducible():
+    perfil = random_profile(6, ANOS)
+    a = jera.simular_despesas_macro(perfil, n_sim=300, seed=11, chunk_size=70)
+    b = jera.simular_despesas_macro(perfil, n_sim=300, seed=11, chunk_size=70)
+    pd.testing.assert_frame_equal(a, b, check_exact=True)
+    c = jera.simular_despesas_macro(perfil, n_sim=300, seed=12, chunk_size=70)
+    assert not np.allclose(a["Gastos P50 (R$)"], c["Gastos P50 (R$)"])
@@ -0,0 +1,167 @@
+"""Streaming patrimony Monte Carlo: bounded memory and merged shard percentiles."""
+
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import JeraOnboarding as jera
+
+ANOS = 60
+
+
+def _mc_args(patrimonio: float, gasto: float):
+    totais = gasto * 1.04 ** np.arange(ANOS)
+    rendas = np.full(ANOS, 0.3 * gasto)
+    return (
+        patrimonio, np.full(ANOS, 1e6), 11.85, ANOS, "moderado", totais, rendas, 4.5, 2.5,
+    ), {"net_cash": rendas - totais}
+
+
+def test_quantile_sketches_merge_to_the_pooled_percentiles():
+    rng = np.random.default_rng(0)
+    # Lognormal body plus a mass point, as ruined paths produce
+    amostra = np.concatenate([rng.lognormal(15, 1, size=(7000, 3)), np.full((3000, 3), 2e5)])
+    rng.shuffle(amostra)
+    partes = np.array_split(amostra, 3)
+    sketches = [np.percentile(p, jera.MC_SKETCH_PERCENTIS, axis=0) for p in partes]
+    merged = jera.merge_quantile_sketches(sketches, [len(p) for p in partes], [10, 50, 90])
+    exato = np.percentile(amostra, [10, 50, 90], axis=0)
+    escala = np.percentile(amostra, 90, axis=0) - np.percentile(amostra, 10, axis=0)
+    assert np.all(np.abs(merged - exato) <= 0.01 * escala)
+
+
+def test_memory_does_not_grow_with_paths_times_years():
+    args, kwargs = _mc_args(5e7, 2e6)
+    n_sim = 20_000
+    tracemalloc.start()
+    jera.simular_patrimonio_monte_carlo(*args, n_sim=n_sim, **kwargs)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # A (paths × years) float64 matrix alone would take n_sim * ANOS * 8 bytes
+    assert pico < n_sim * ANOS * 8 / 4
+    estimativa = jera.estimate_monte_carlo_memory("patrimonio", n_sim, ANOS, 5000)
+    assert estimativa < n_sim * ANOS * 8 / 4
+
+
+def test_sharded_run_matches_single_worker_with_ruin():
+    args, kwargs = _mc_args(1.8e7, 2e6)
+    um, prob_um = jera.simular_patrimonio_monte_carlo(*args, n_sim=20_000, seed=1, **kwargs)
+    tres, prob_tres = jera.simular_patrimonio_monte_carlo(*args, n_sim=20_000, seed=1, workers=3, **kwargs)
+    assert 0.05 < prob_um < 0.95
+    assert abs(prob_um - prob_tres) < 0.02
+    for col in ("P10 (R$)", "P50 (R$)", "P90 (R$)"):
+        escala = um["P90 (R$)"] - um["P10 (R$)"] + 1.0
+        assert np.all(np.abs(um[col] - tres[col]) <= 0.1 * escala), col
+
+
+def test_sharded_runs_are_bit_for_bit_reproducible():
+    args, kwargs = _mc_args(1.8e7, 2e6)
+    primeiro, prob_primeiro = jera.simular_patrimonio_monte_carlo(*args, n_sim=6000, seed=1, workers=3, **kwargs)
+    segundo, prob_segundo = jera.simular_patrimonio_monte_carlo(*args, n_sim=6000, seed=1, workers=3, **kwargs)
+    for col in primeiro.columns:
+        assert np.array_equal(primeiro[col].to_numpy(), segundo[col].to_numpy()), col
+    assert prob_primeiro == prob_segundo
+    outra_seed, _ = jera.simular_patrimonio_monte_carlo(*args, n_sim=6000, seed=2, workers=3, **kwargs)
+    assert not np.array_equal(primeiro["P50 (R$)"].to_numpy(), outra_seed["P50 (R$)"].to_numpy())
+
+
+def test_sharded_endowment_runs_are_bit_for_bit_reproducible():
+    primeiro = jera.simular_endowment_mensal(1e6, 0.08, 0.15, 20, n_sim=6000, seed=1, workers=3)
+    segundo = jera.simular_endowment_mensal(1e6, 0.08, 0.15, 20, n_sim=6000, seed=1, workers=3)
+    for a, b in zip(primeiro, segundo):
+        assert np.array_equal(a, b)
+
+
+@pytest.mark.parametrize(
+    "modo",
+    ["antithetic", pytest.param("sobol", marks=pytest.mark.skipif(jera.qmc is None, reason="requires scipy"))],
+)
+def test_variance_reduction_beats_plain_monte_carlo(modo):
+    # Same seeds for both modes; the variance of the final-year median across runs must shrink
+    tabela, _ = jera.monte_carlo_convergence(path_counts=(1024,), modes=("none", modo), n_reps=30, anos=5)
+    ep = tabela.set_index("Modo")["EP P50 (%)"]
+    assert (ep[modo] / ep["none"]) ** 2 < 0.25
+
+
+@pytest.mark.skipif(jera.qmc is None, reason="requires scipy")
+def test_sobol_chunks_continue_one_scrambled_sequence():
+    inteiro = jera.standard_normal_draws(np.random.default_rng(4), 1024, (3,), "sobol")
+    rng, engines = np.random.default_rng(4), {}
+    partes = [jera.standard_normal_draws(rng, 256, (3,), "sobol", engines=engines) for _ in range(4)]
+    assert np.array_equal(np.concatenate(partes), inteiro)
+    # Another block (e.g. the next year) gets its own scramble
+    outro = jera.standard_normal_draws(rng, 256, (3,), "sobol", engines=engines, bloco=1)
+    assert not np.array_equal(outro, inteiro[:256])
+
+
+# Stated tolerances: float32 rounding alone, and float32 against float64 draws (rounding plus sampling noise)
+FLOAT32_RTOL = 1e-4
+FLOAT32_SAMPLING_RTOL = 0.02
+
+
+@pytest.mark.parametrize("log_space", [False, True])
+def test_float32_quantiles_match_float64_on_the_same_draws(log_space):
+    n, anos, mu, vol = 20_000, 40, 0.08, 0.15
+    simples = jera._endowment_mensal_shard(
+        n, np.random.SeedSequence(5), 1e6, mu, vol, anos, [10, 50, 90], precision="float32", log_space=log_space
+    )
+    # The same float32 draws, compounded in float64
+    rng = np.random.default_rng(np.random.SeedSequence(5))
+    valores = np.full(n, 1e6)
+    dupla = np.empty((3, anos))
+    for ano in range(anos):
+        z = rng.standard_normal((n, 12), dtype=np.float32)
+        bloco = np.float32(mu / 12.0) + np.float32(vol / np.sqrt(12.0)) * z
+        valores *= np.prod(1 + bloco.astype(np.float64), axis=1)
+        dupla[:, ano] = np.percentile(valores, [10, 50, 90])
+    assert np.allclose(simples, dupla, rtol=FLOAT32_RTOL)
+
+
+def test_float32_and_log_space_runs_stay_close_to_float64():
+    referencia = jera.simular_endowment_mensal(1e6, 0.08, 0.15, 30, n_sim=100_000, seed=1)
+    log64 = jera.simular_endowment_mensal(1e6, 0.08, 0.15, 30, n_sim=100_000, seed=1, log_space=True)
+    for a, b in zip(log64, referencia):
+        assert np.allclose(a, b, rtol=1e-12)
+    for log_space in (False, True):
+        simples = jera.simular_endowment_mensal(
+            1e6, 0.08, 0.15, 30, n_sim=100_000, seed=1, precision="float32", log_space=log_space
+        )
+        for a, b in zip(simples, referencia):
+            assert np.allclose(a, b, rtol=FLOAT32_SAMPLING_RTOL)
+
+
+def _endowment_full_matrix(valor, mu, vol, anos, n_sim, seed):
+    """The original full (n_sim × anos*12) computation, on the draws the streaming engine makes."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+    rets = np.concatenate(
+        [rng.normal(loc=mu / 12.0, scale=vol / np.sqrt(12.0), size=(n_sim, 12)) for _ in range(anos)], axis=1
+    )
+    cum_prod = np.cumprod(1 + rets, axis=1)
+    path = valor * cum_prod[:, (np.arange(anos) + 1) * 12 - 1]
+    return np.percentile(path, [10, 50, 90], axis=0)
+
+
+def test_streaming_endowment_matches_the_full_matrix():
+    esperado = _endowment_full_matrix(1e6, 0.09, 0.14, 25, 5000, 17)
+    obtido = jera.simular_endowment_mensal(1e6, 0.09, 0.14, 25, n_sim=5000, seed=17)
+    assert np.allclose(obtido, esperado, rtol=1e-12)
+
+
+def test_endowment_memory_stays_within_the_budget():
+    n_sim, anos = 20_000, 40
+    matriz = n_sim * anos * 12 * 8
+    tracemalloc.start()
+    jera.simular_endowment_mensal(1e6, 0.09, 0.14, anos, n_sim=n_sim, seed=1)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # The full-matrix version held the draws and their cumulative product
+    assert pico < matriz / 8
+    # A tight budget shrinks the chunk and the measured peak follows the estimate
+    fixo, por_caminho = jera._mc_memory_terms("endowment_mensal", n_sim, anos, 1, "float64")
+    orcamento = fixo + 500 * por_caminho
+    tracemalloc.start()
+    jera.simular_endowment_mensal(1e6, 0.09, 0.14, anos, n_sim=n_sim, seed=1, memory_budget=orcamento)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert pico < 1.5 * orcamento
@@ -0,0 +1,52 @@
+"""PipelineTimings: stages and memory tracing shared between sessions."""
+
+import threading
+import tracemalloc
+
+import numpy as np
+
+import JeraOnboarding as jera
+
+
+def _em_thread(funcao):
+    # Each Streamlit session runs its script in its own thread
+    resultado = []
+    thread = threading.Thread(target=lambda: resultado.append(funcao()))
+    thread.start()
+    thread.join()
+    return resultado[0]
+
+
+def test_overlapping_sessions_keep_tracing_until_the_last_finishes():
+    assert not tracemalloc.is_tracing()
+    a = _em_thread(lambda: jera.PipelineTimings("a", trace_memory=True).start())
+    b = _em_thread(lambda: jera.PipelineTimings("b", trace_memory=True).start())
+    a.finish()
+    assert tracemalloc.is_tracing()
+    with b.stage("alocacao"):
+        np.ones(2**20)
+    assert b.stages[0]["pico_memoria_bytes"] >= 8 * 2**20
+    b.finish()
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracing_started_elsewhere_is_left_running():
+    tracemalloc.start()
+    try:
+        timings = jera.PipelineTimings("c", trace_memory=True).start()
+        timings.finish()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_nested_stages_without_tracing():
+    timings = jera.PipelineTimings("d").start()
+    with jera.pipeline_stage("pai"):
+        with jera.pipeline_stage("filho"):
+            pass
+    timings.finish()
+    assert [r["etapa"] for r in timings.stages] == ["pai", "pai/filho"]
+    assert timings.stages[0]["pico_memoria_bytes"] is None
+    assert list(timings.table()["Etapa"]) == ["pai", "pai/filho"]
+    assert not tracemalloc.is_tracing()
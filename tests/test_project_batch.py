@@ -0,0 +1,84 @@
+"""``project_batch`` must agree with ``run_projections`` row by row."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from profiles import random_profile
+
+import JeraOnboarding as jera
+
+ANOS = 30
+
+
+def test_batch_matches_run_projections():
+    perfis = [random_profile(seed, ANOS) for seed in range(25)]
+    assert any(p["nao_tem_conjuge"] for p in perfis)
+    out = jera.project_batch(pd.DataFrame(perfis), ANOS)
+    for i, perfil in enumerate(perfis):
+        proj = jera.run_projections(perfil)
+        df_pat = proj["df_pat"]
+        assert np.allclose(out["gastos"][i], proj["df_brl"]["Total (R$)"], rtol=1e-9)
+        assert np.allclose(out["rendas"][i], proj["df_incomes"]["Total Renda (R$)"], rtol=1e-9)
+        assert np.allclose(out["aspirational"][i], df_pat["Aspirational (R$)"], rtol=1e-9)
+        for chave, coluna in (
+            ("capital_guard", "Capital Guard (R$)"),
+            ("endowment", "Endowment (R$)"),
+            ("patrimonio_total", "Patrimônio Total (R$)"),
+        ):
+            assert np.allclose(out[chave][i], df_pat[coluna], rtol=1e-7, atol=1e-3), chave
+
+
+def test_optional_columns_use_defaults():
+    perfil = random_profile(3, ANOS)
+    obrigatorias = {k: [v] for k, v in perfil.items() if k not in jera.OPTIONAL_INPUT_DEFAULTS}
+    omitidas = jera.project_batch(obrigatorias, ANOS)
+    explicitas = jera.project_batch(
+        {**obrigatorias, **{k: [v] for k, v in jera.OPTIONAL_INPUT_DEFAULTS.items()}}, ANOS
+    )
+    for chave in omitidas:
+        assert np.array_equal(omitidas[chave], explicitas[chave]), chave
+
+
+def test_unknown_and_missing_columns_raise():
+    perfil = {k: [v] for k, v in random_profile(1, ANOS).items()}
+    with pytest.raises(ValueError, match="no_conjuge"):
+        jera.project_batch({**perfil, "no_conjuge": [True]}, ANOS)
+    del perfil["salario_anual0"]
+    with pytest.raises(ValueError, match="salario_anual0"):
+        jera.project_batch(perfil, ANOS)
+
+
+
+def test_aspirational_matches_brute_force():
+    perfis = [random_profile(seed, ANOS) for seed in range(40)]
+    out = jera.project_batch(pd.DataFrame(perfis), ANOS)
+    # Asset by asset and year by year
+    for i, perfil in enumerate(perfis):
+        ativos = [
+            (perfil["aluguel_mensal_brl"] * 12 / (0.15 - perfil["aluguel_growth_brl"] / 100), perfil["aluguel_growth_brl"]),
+            (perfil["aluguel_mensal_usd"] * 12 / (0.07 - perfil["aluguel_growth_usd"] / 100) * perfil["cotacao_usd"],
+             perfil["aluguel_growth_usd"]),
+            (perfil["dividendos_brl"] / (0.19 - perfil["divid_growth_brl"] / 100), perfil["divid_growth_brl"]),
+            (perfil["dividendos_usd"] / (0.11 - perfil["divid_growth_usd"] / 100) * perfil["cotacao_usd"],
+             perfil["divid_growth_usd"]),
+        ]
+        ativos = [(v if 100 * taxa > g else 0.0, g) for (v, g), taxa in zip(ativos, (0.15, 0.07, 0.19, 0.11))]
+        if perfil["has_iliquido"]:
+            ativos += list(zip(perfil["iliquido_vals_brl"], perfil["iliquido_growth_brl"]))
+            ativos += [(v * perfil["cotacao_usd"], g) for v, g in zip(perfil["iliquido_vals_usd"], perfil["iliquido_growth_usd"])]
+        esperado = [sum(v * (1 + g / 100) ** t for v, g in ativos) for t in range(ANOS)]
+        assert np.allclose(out["aspirational"][i], esperado, rtol=1e-9), i
+
+
+def test_large_batch_has_no_per_client_valuation(monkeypatch):
+    perfis = [random_profile(seed % 40, ANOS) for seed in range(5000)]
+    chamadas = []
+    valuations = jera.aspirational_valuations
+    monkeypatch.setattr(jera, "aspirational_valuation", lambda *a: pytest.fail("per-client valuation"))
+    monkeypatch.setattr(jera, "run_projections", lambda *a: pytest.fail("per-client projection"))
+    monkeypatch.setattr(jera, "aspirational_valuations", lambda inp: chamadas.append(1) or valuations(inp))
+    out = jera.project_batch(pd.DataFrame(perfis), ANOS)
+    assert chamadas == [1]
+    assert all(v.shape == (5000, ANOS) for k, v in out.items() if k != "capital_guard_inicial")
+    # Rows repeating a profile get identical projections
+    assert np.array_equal(out["patrimonio_total"][:40], out["patrimonio_total"][40:80])
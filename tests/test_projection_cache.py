@@ -0,0 +1,62 @@
+"""ProjectionCache: LRU eviction, key sensitivity and isolation of the returned objects."""
+
+import pandas as pd
+from profiles import random_profile
+
+import JeraOnboarding as jera
+
+
+def _contador():
+    chamadas = []
+
+    def compute(inputs):
+        chamadas.append(inputs["id"])
+        return {"df": pd.DataFrame({"v": [1.0, 2.0]}), "lista": [inputs["id"]]}
+
+    return compute, chamadas
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = jera.ProjectionCache(maxsize=2)
+    compute, chamadas = _contador()
+    cache.get_or_compute({"id": "a"}, compute)
+    cache.get_or_compute({"id": "b"}, compute)
+    cache.get_or_compute({"id": "a"}, compute)
+    cache.get_or_compute({"id": "c"}, compute)
+    # "b" was the least recently used one
+    cache.get_or_compute({"id": "a"}, compute)
+    cache.get_or_compute({"id": "b"}, compute)
+    assert chamadas == ["a", "b", "c", "b"]
+    assert cache.stats() == {"hits": 2, "misses": 4, "size": 2, "maxsize": 2}
+
+
+def test_editing_premises_or_portfolios_changes_the_key(monkeypatch):
+    perfil = {**random_profile(4, 10), "risk_profile": "moderado"}
+    cache = jera.ProjectionCache()
+    chave = jera.projection_cache_key(perfil)
+    original = cache.get_or_compute(perfil)
+    bairro = jera.PREMISES["moradia"]["bairros"][0]
+    monkeypatch.setitem(bairro, "precoM2", bairro["precoM2"] * 2)
+    assert jera.projection_cache_key(perfil) != chave
+    cache.get_or_compute(perfil)
+    moderado = jera.PORTFOLIOS["moderado"]
+    monkeypatch.setitem(moderado, "dom", {**moderado["dom"], "expected_return": moderado["dom"]["expected_return"] + 0.02})
+    editado = cache.get_or_compute(perfil)
+    assert not editado["df_pat"].equals(original["df_pat"])
+    monkeypatch.undo()
+    assert jera.projection_cache_key(perfil) == chave
+    assert cache.get_or_compute(perfil)["df_pat"].equals(original["df_pat"])
+    assert cache.stats()["misses"] == 3 and cache.stats()["hits"] == 1
+
+
+def test_returned_objects_are_not_aliases_of_the_entry():
+    cache = jera.ProjectionCache()
+    compute, chamadas = _contador()
+    primeiro = cache.get_or_compute({"id": "a"}, compute)
+    primeiro["df"].loc[0, "v"] = -1.0
+    primeiro["lista"].append("x")
+    segundo = cache.get_or_compute({"id": "a"}, compute)
+    assert segundo["df"]["v"].tolist() == [1.0, 2.0] and segundo["lista"] == ["a"]
+    segundo["df"]["v"] *= 10
+    assert cache.get_or_compute({"id": "a"}, compute)["df"]["v"].tolist() == [1.0, 2.0]
+    assert chamadas == ["a"]
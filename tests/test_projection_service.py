@@ -0,0 +1,131 @@
+"""HTTP projection service: import side effects, validation, JSON output and Monte Carlo memory estimate."""
+
+import asyncio
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import JeraOnboarding as jera
+import projection_service as service
+from profiles import random_profile
+
+IMPORTACAO = """
+import sys, threading
+import projection_service
+assert "streamlit" not in sys.modules and "plotly" not in sys.modules, "UI imported"
+assert threading.active_count() == 1, threading.enumerate()
+"""
+
+
+def test_import_has_no_side_effects(tmp_path):
+    # Run from an empty directory: nothing may be read or written there either
+    resultado = subprocess.run(
+        [sys.executable, "-c", IMPORTACAO],
+        cwd=tmp_path,
+        env={"PYTHONPATH": ":".join(sys.path)},
+        capture_output=True,
+        text=True,
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_memory_estimate_follows_the_fitted_chunk(monkeypatch):
+    perfil = service.parse_profile(random_profile(3, 30))
+    n_sim = 4000
+    sem_limite = service.monte_carlo_payload(perfil, n_sim, 7)["memoria_estimada"]
+    assert sem_limite == jera.estimate_monte_carlo_memory("patrimonio", n_sim, 30, service.MC_CHUNK_SIZE)
+
+    fixo, por_caminho = jera._mc_memory_terms("patrimonio", n_sim, 30, 1, "float64")
+    orcamento = fixo + 1000 * por_caminho
+    monkeypatch.setattr(service, "MC_MEMORY_BUDGET", orcamento)
+    limitado = service.monte_carlo_payload(perfil, n_sim, 7)["memoria_estimada"]
+    assert limitado <= orcamento
+    chunk = jera.fit_monte_carlo_chunk("patrimonio", n_sim, 30, service.MC_CHUNK_SIZE, memory_budget=orcamento)
+    assert chunk == 1000
+    assert limitado == jera.estimate_monte_carlo_memory("patrimonio", n_sim, 30, chunk)
+
+
+def test_chunk_is_fitted_once(monkeypatch):
+    chamadas = []
+    ajustar = jera.fit_monte_carlo_chunk
+    monkeypatch.setattr(jera, "fit_monte_carlo_chunk", lambda *a, **k: chamadas.append(a) or ajustar(*a, **k))
+    mc = jera.projection_monte_carlo(random_profile(8, 20), n_sim=500, seed=987_654, chunk_size=100)
+    assert len(chamadas) == 1
+    assert mc["chunk_size"] == 100 == mc["df_mc"].attrs["chunk_size"]
+
+
+def _post(caminho, corpo):
+    """Drive the ASGI app with one JSON POST; returns (status, decoded body)."""
+    mensagens = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(corpo).encode(), "more_body": False}
+
+    async def send(mensagem):
+        mensagens.append(mensagem)
+
+    scope = {
+        "type": "http", "method": "POST", "path": caminho, "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json")], "http_version": "1.1", "scheme": "http",
+        "server": ("teste", 80), "client": ("teste", 1),
+    }
+    asyncio.run(service.app(scope, receive, send))
+    return mensagens[0]["status"], json.loads(b"".join(m.get("body", b"") for m in mensagens[1:]))
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_random_profiles_are_valid(seed):
+    service.validate_profile(random_profile(seed))
+
+
+def test_valid_profile_is_projected():
+    status, corpo = _post("/projections", random_profile(4, 10))
+    assert status == 200
+    assert len(corpo["patrimonio"]) == 10
+
+
+@pytest.mark.parametrize(
+    "campo, valor",
+    [
+        ("idade_cliente", "40"),
+        ("idade_cliente", 40.5),
+        ("idade_cliente", -1),
+        ("anos_proj", 0),
+        ("anos_proj", 1000),
+        ("patrimonio_inicial", -1.0),
+        ("patrimonio_inicial", None),
+        ("infl_brl_pct", -100),
+        ("cotacao_usd", 0),
+        ("has_iliquido", "sim"),
+        ("nao_tem_conjuge", 1),
+        ("risk_profile", "alavancado"),
+        ("idades_filhos", "3"),
+        ("iliquido_vals_brl", [1.0, "x"]),
+        ("iliquido_growth_usd", [-150.0]),
+        ("scales", [1.0]),
+    ],
+)
+def test_invalid_profile_is_422(campo, valor):
+    perfil = {**random_profile(4, 10), campo: valor}
+    status, corpo = _post("/projections", perfil)
+    assert status == 422
+    assert campo in corpo["erro"]
+    status, corpo = _post("/monte-carlo", {"profile": perfil, "n_sim": 10})
+    assert status == 422
+    assert campo in corpo["erro"]
+
+
+@pytest.mark.parametrize("campo, valor", [("n_sim", "100"), ("n_sim", 0), ("n_sim", True), ("seed", -1), ("seed", 1.5)])
+def test_invalid_monte_carlo_request_is_422(campo, valor):
+    status, corpo = _post("/monte-carlo", {"profile": random_profile(4, 10), campo: valor})
+    assert status == 422
+    assert campo in corpo["erro"]
+
+
+def test_non_finite_values_render_as_null():
+    conteudo = {"salario": float("nan"), "serie": np.array([1.0, np.inf]), "escalar": np.float64("-inf"), "n": np.int64(3)}
+    assert json.loads(service.NumpyJSONResponse(conteudo).body) == {"salario": None, "serie": [1.0, None], "escalar": None, "n": 3}
@@ -0,0 +1,128 @@
+"""SalaryEstimator against a stub of the n8n salary webhook."""
+
+import json
+import logging
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import JeraOnboarding as jera
+
+
+class _Webhook(BaseHTTPRequestHandler):
+    atraso = 0.2
+    status = 200
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.chamadas += 1
+        time.sleep(self.atraso)
+        corpo = b'<iframe srcdoc="123.45"></iframe>'
+        self.send_response(self.status)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhook():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Webhook)
+    server.chamadas = 0
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/webhook"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_equivalent_triples_share_one_call(webhook):
+    estimator = jera.SalaryEstimator(url=webhook.url, cache_path=None)
+    try:
+        primeiro = estimator.submit("Diretor", "Varejo", "Acme")
+        segundo = estimator.submit(" diretor ", "VAREJO", "acme ")
+        assert segundo is primeiro
+        assert primeiro.result(timeout=5) == 123.45
+        # Answered from the cache afterwards, whatever the spelling
+        assert estimator.estimate("DIRETOR", "varejo", " Acme") == 123.45
+        assert webhook.chamadas == 1
+    finally:
+        estimator.close()
+
+
+def test_bulk_estimate_writes_the_cache_once(webhook, tmp_path, monkeypatch):
+    monkeypatch.setattr(_Webhook, "atraso", 0.0)
+    caminho = tmp_path / "salarios.json"
+    estimator = jera.SalaryEstimator(url=webhook.url, cache_path=str(caminho))
+    gravacoes = []
+    salvar = estimator._save_cache
+    monkeypatch.setattr(estimator, "_save_cache", lambda: gravacoes.append(1) or salvar())
+    triples = [(f"Cargo {i % 25}", "Varejo", "Acme") for i in range(100)]
+    try:
+        salarios = estimator.estimate_many(triples, max_concurrency=8)
+    finally:
+        estimator.close()
+    assert (salarios == 123.45).all()
+    assert webhook.chamadas == 25
+    assert gravacoes == [1]
+    with open(caminho, encoding="utf-8") as fh:
+        assert len(json.load(fh)) == 25
+    assert not (tmp_path / "salarios.json.tmp").exists()
+
+
+def test_salary_estimator_is_reused_across_calls():
+    assert jera.salary_estimator() is jera.salary_estimator()
+
+
+def test_failures_are_not_retried_on_every_rerun(webhook, monkeypatch):
+    monkeypatch.setattr(_Webhook, "atraso", 0.0)
+    monkeypatch.setattr(_Webhook, "status", 503)
+    estimator = jera.SalaryEstimator(url=webhook.url, cache_path=None, failure_ttl_seconds=60)
+    try:
+        # Each Streamlit rerun submits the same triple again
+        for _ in range(5):
+            assert math.isnan(estimator.submit("Diretor", "Varejo", "Acme").result(timeout=5))
+        assert webhook.chamadas == 1
+        # Once the failure expires the webhook is asked again
+        estimator.failure_ttl_seconds = 0.0
+        monkeypatch.setattr(_Webhook, "status", 200)
+        assert estimator.submit("Diretor", "Varejo", "Acme").result(timeout=5) == 123.45
+        assert webhook.chamadas == 2
+    finally:
+        estimator.close()
+
+
+def test_default_cache_path_does_not_depend_on_the_cwd(tmp_path):
+    assert os.path.dirname(jera.SALARY_CACHE_PATH) == os.path.dirname(os.path.abspath(jera.__file__))
+    caminho = tmp_path / "salarios.json"
+    resultado = subprocess.run(
+        [sys.executable, "-c", "import JeraOnboarding as j; print(j.SalaryEstimator(max_workers=1).cache_path)"],
+        cwd=tmp_path,
+        env={"PYTHONPATH": ":".join(sys.path), "JERA_SALARY_CACHE": str(caminho)},
+        capture_output=True,
+        text=True,
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    assert resultado.stdout.strip() == str(caminho)
+
+
+def test_failed_cache_write_is_logged(tmp_path, caplog):
+    estimator = jera.SalaryEstimator(cache_path=str(tmp_path / "nao_existe" / "salarios.json"))
+    try:
+        estimator._store(("Diretor", "Varejo", "Acme"), 1.0)
+        with caplog.at_level(logging.WARNING, logger="jera.salary"):
+            estimator._save_cache()
+    finally:
+        estimator.close()
+    assert "salary cache" in caplog.text
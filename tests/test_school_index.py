@@ -0,0 +1,50 @@
+"""Shared school price index against the per-call range scan it replaced."""
+
+import pytest
+from profiles import random_costs_args
+
+import JeraOnboarding as jera
+
+
+def _school_scan(nome, idade, escolas):
+    """The original first-matching-range scan over PREMISES["educacao"]["escolas"]."""
+    for esc in escolas:
+        if esc["nome"] == nome and esc["idadeMin"] <= idade <= esc["idadeMax"]:
+            return float(esc["precoAnual"])
+    return 0.0
+
+
+def test_school_index_matches_the_range_scan():
+    escolas = jera.PREMISES["educacao"]["escolas"]
+    indice = jera.school_price_index()
+    for nome in {e["nome"] for e in escolas} | {"", "Escola inexistente"}:
+        for idade in range(-1, jera.SCHOOL_MAX_AGE + 2):
+            assert indice.price(nome, idade) == _school_scan(nome, idade, escolas), (nome, idade)
+
+
+def test_school_index_is_immutable_and_shared(monkeypatch):
+    indice = jera.school_price_index()
+    assert jera.school_price_index() is indice
+    with pytest.raises(ValueError):
+        indice.prices[1, 5] = 0.0
+    with pytest.raises(TypeError):
+        indice._ids["Escola Nova"] = 1
+    # Projections reuse the shared index instead of building their own
+    construidos = []
+    original = jera.SchoolPriceIndex
+    monkeypatch.setattr(jera, "SchoolPriceIndex", lambda escolas: construidos.append(1) or original(escolas))
+    args = {**random_costs_args(3), "idades_filhos": [3, 9, 15], "estudam_fora": [False, True, False]}
+    args["escolas_filhos"] = sorted({e["nome"] for e in jera.PREMISES["educacao"]["escolas"]})[:3]
+    jera.compute_costs_and_incomes(**args)
+    jera.compute_costs_and_incomes_vectorized(**args)
+    assert construidos == []
+    assert jera.school_price_index() is indice
+    # Editing the escolas premises builds a new index
+    escolas = jera.PREMISES["educacao"]["escolas"]
+    monkeypatch.setitem(jera.PREMISES["educacao"], "escolas", escolas + [
+        {"nome": "Escola Nova", "idadeMin": 4, "idadeMax": 10, "precoAnual": 1.0}
+    ])
+    novo = jera.school_price_index()
+    assert novo is not indice and construidos == [1] and novo.price("Escola Nova", 4) == 1.0
+    monkeypatch.setitem(jera.PREMISES["educacao"], "escolas", escolas)
+    assert jera.school_price_index().price("Escola Nova", 4) == 0.0
@@ -0,0 +1,81 @@
+"""Process-wide resources must survive Streamlit reruns."""
+
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import JeraOnboarding as jera
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECURSOS = (
+    "_ASSET_CLASS_MODELS",
+    "_GROWTH_QUANTILE_TABLE",
+    "_HEALTH_TABLE",
+    "_SCHOOL_INDEX",
+    "_MACRO_PATHS",
+    "_MACRO_PATHS_LOCK",
+    "PROJECTION_CACHE",
+    "EXPENSE_BASE_CACHE",
+    "MONTE_CARLO_CACHE",
+    "EXCEL_CACHE",
+    "_PIPELINE_ACTIVE",
+)
+
+# Executes the module body the way ``streamlit run`` does on every rerun
+SCRIPT = f"""
+import runpy, sys
+import streamlit as st
+sys.path.insert(0, {RAIZ!r})
+g = runpy.run_path({os.path.join(RAIZ, "JeraOnboarding.py")!r}, run_name="jera")
+ids = [id(g[nome]) for nome in {RECURSOS!r}] + [id(g["monte_carlo_pools"]()), id(g["salary_estimator"]()), id(g["tracemalloc_users"]())]
+st.session_state.setdefault("ids", []).append(ids)
+"""
+
+# Clearing st.cache_resource must shut the pools down instead of leaking their processes
+LIMPEZA = f"""
+import sys
+import streamlit as st
+sys.path.insert(0, {RAIZ!r})
+import JeraOnboarding as jera
+pool = jera._monte_carlo_pool(1)
+pool.submit(int).result()
+st.cache_resource.clear()
+st.session_state["encerrado"] = pool._shutdown_thread
+st.session_state["novo"] = jera._monte_carlo_pool(1) is not pool
+"""
+
+
+def test_resources_survive_reruns():
+    at = AppTest.from_string(SCRIPT, default_timeout=60)
+    for _ in range(3):
+        at.run()
+        assert not at.exception
+    ids = at.session_state["ids"]
+    assert len(ids) == 3 and ids[0] == ids[1] == ids[2]
+
+
+def test_cache_clear_shuts_the_pools_down():
+    at = AppTest.from_string(LIMPEZA, default_timeout=60)
+    at.run()
+    assert not at.exception
+    assert at.session_state["encerrado"] and at.session_state["novo"]
+
+
+def test_monte_carlo_pools_close():
+    pools = jera.MonteCarloPools()
+    pool = pools.get(1)
+    assert pools.get(1) is pool
+    assert pool.submit(int, "7").result() == 7
+    pools.close()
+    with pytest.raises(RuntimeError):
+        pool.submit(int, "7")
+    assert pools.get(1) is not pool
+    pools.close()
+
+
+def test_shared_resource_outside_streamlit_builds_once():
+    chamadas = []
+    primeiro = jera.shared_resource("teste/uma_vez", lambda: chamadas.append(1) or object())
+    assert jera.shared_resource("teste/uma_vez", object) is primeiro
+    assert chamadas == [1]